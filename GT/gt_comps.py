@@ -0,0 +1,96 @@
+"""Comparable listings: the listings nearest to a point, of the same type, # of bedrooms and similar surface.
+
+The coordinates are projected to meters (equirectangular around the center of the data, precise enough
+within a metropolitan area) and indexed by a KD-tree per (Tipo, Bedrooms), built once per version of
+the data. A query only searches the trees of the Tipo/Bedrooms it asks for, the Surface range is checked
+on the candidates: the k nearest are fetched, then 4x as many until k of them are in the range.
+
+    comps = CompsIndex(data)
+    df, median = comps.nearest(14.6, -90.51, k=10, tipo=42020, bedrooms=3, surface=(80, 120))
+    df, median = comps.within(14.6, -90.51, 500, tipo=42020)
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+EARTH_RADIUS_M = 6371000.0
+GROUP_KEYS = ['Tipo', 'Bedrooms']
+
+
+class CompsIndex:
+    def __init__(self, df, leafsize=32):
+        self.data = df
+        located = df['latitude'].notna().values & df['longitude'].notna().values
+        self.origin = (float(df['latitude'][located].mean()), float(df['longitude'][located].mean())) if located.any() else (0.0, 0.0)
+        xy = self.project(df['latitude'].values, df['longitude'].values)
+        self.surface = df['Surface'].values
+        self.trees = {}  # (Tipo, Bedrooms) -> (KD-tree, positions in df of its points)
+        located_rows = np.flatnonzero(located)
+        for key, rows in df.loc[located, GROUP_KEYS].groupby(GROUP_KEYS, sort=True).indices.items():
+            rows = located_rows[rows]
+            self.trees[key] = (cKDTree(xy[rows], leafsize=leafsize), rows)
+        # Size for the LRU of the data cache (the frame is shared, only the trees count)
+        self.nbytes = sum(tree.data.nbytes + tree.indices.nbytes + rows.nbytes + tree.size * 64
+                          for tree, rows in self.trees.values())
+
+    def project(self, latitude, longitude):
+        """Coordinates in meters from the origin, as an (n, 2) array."""
+        lat0, lon0 = np.radians(self.origin[0]), np.radians(self.origin[1])
+        x = EARTH_RADIUS_M * np.cos(lat0) * (np.radians(np.asarray(longitude, dtype='float64')) - lon0)
+        y = EARTH_RADIUS_M * (np.radians(np.asarray(latitude, dtype='float64')) - lat0)
+        return np.column_stack([np.atleast_1d(x), np.atleast_1d(y)])
+
+    def groups(self, tipo=None, bedrooms=None):
+        return [key for key in self.trees if (tipo is None or key[0] == tipo) and (bedrooms is None or key[1] == bedrooms)]
+
+    def in_range(self, rows, surface):
+        keep = np.ones(len(rows), dtype=bool)
+        if surface is not None:
+            low, high = surface
+            if low is not None:
+                keep &= self.surface[rows] >= low
+            if high is not None:
+                keep &= self.surface[rows] <= high
+        return keep
+
+    def result(self, distance, rows):
+        """Comps sorted by distance (with a distance_m column) and their median price per m²."""
+        order = np.argsort(distance, kind='mergesort')
+        comps = self.data.iloc[rows[order]].copy()
+        comps['distance_m'] = distance[order]
+        return comps, comps['Price_m2_USD'].median()
+
+    def nearest(self, latitude, longitude, k=10, tipo=None, bedrooms=None, surface=None):
+        """The k listings nearest to the point.
+        in:  point (degrees), # of comps, Tipo, # of Bedrooms and (min, max) Surface to filter by (None: any)
+        out: (dataframe of the comps with distance_m, nearest first; their median Price_m2_USD, NaN if none)
+        """
+        point = self.project(latitude, longitude)[0]
+        distances, positions = [], []
+        for key in self.groups(tipo, bedrooms):
+            tree, rows = self.trees[key]
+            fetch = min(k, len(rows))
+            while True:
+                distance, found = tree.query(point, k=fetch)
+                distance, found = np.atleast_1d(distance), rows[np.atleast_1d(found)]
+                keep = self.in_range(found, surface)
+                if keep.sum() >= k or fetch == len(rows):
+                    break
+                fetch = min(fetch * 4, len(rows))
+            distances.append(distance[keep][:k])
+            positions.append(found[keep][:k])
+        distance, rows = np.concatenate(distances or [np.empty(0)]), np.concatenate(positions or [np.empty(0, dtype=np.intp)])
+        order = np.argsort(distance, kind='mergesort')[:k]
+        return self.result(distance[order], rows[order])
+
+    def within(self, latitude, longitude, radius_m, tipo=None, bedrooms=None, surface=None):
+        """Every listing within radius_m meters of the point, see nearest."""
+        point = self.project(latitude, longitude)[0]
+        distances, positions = [], []
+        for key in self.groups(tipo, bedrooms):
+            tree, rows = self.trees[key]
+            found = np.asarray(tree.query_ball_point(point, radius_m), dtype=np.intp)
+            found = found[self.in_range(rows[found], surface)]
+            distances.append(np.hypot(*(tree.data[found] - point).T))
+            positions.append(rows[found])
+        return self.result(np.concatenate(distances or [np.empty(0)]), np.concatenate(positions or [np.empty(0, dtype=np.intp)]))
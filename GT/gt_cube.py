@@ -0,0 +1,190 @@
+"""Precomputed aggregate cube for the GT dashboard.
+
+The cube holds counts, medians, means and fixed-bin histograms for the groupings the app needs, down to
+(Tipo, City, Zone, Bedrooms). It's built once when the dataset is loaded (or after the preprocessing)
+and saved next to the dataset, so the sections of the app become lookups instead of groupbys over
+the full frame on every rerun.
+
+Usage: python gt_cube.py Scrape_Sale.parquet
+"""
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:  # Windows, builds aren't serialized across processes
+    fcntl = None
+
+
+# Grouping sets stored in the cube, the rolled up dimensions are left empty
+GROUPING_SETS = {
+    'cell': ['Tipo', 'City', 'Zone', 'Bedrooms'],
+    'zone': ['Tipo', 'Zone'],
+    'zone_bedrooms': ['Tipo', 'Zone', 'Bedrooms'],
+    'city_zone': ['Tipo', 'City', 'Zone'],
+}
+MEDIAN_COLUMNS = ['Bedrooms', 'Bathrooms', 'Surface', 'Price_USD', 'Price_m2_USD']
+MEAN_COLUMNS = ['Price_USD', 'Price_m2_USD']
+HIST_COLUMNS = ['Price_USD', 'Price_m2_USD']
+# Fine bins over the whole range of each variable, merged into wider bins when the histogram is drawn
+N_BINS = 200
+
+
+def cube_path(data_path):
+    return os.path.splitext(data_path)[0] + '_cube.parquet'
+
+
+class AggregateCube:
+    def __init__(self, cells, edges, rows=None):
+        self.cells = cells
+        self.edges = edges
+        self.rows = rows  # of the frame it was built from, a truncated load (GT_MAX_ROWS) gets another cube
+
+    @classmethod
+    def build(cls, df):
+        """Cube of the rows of df. The cells are in the order their groups first appear in df, which is the
+        order of the zone lists of the app, so it's built from the rows in the order of the dataset file.
+        """
+        df = df.astype({'City': str, 'Zone': str})
+        edges = {col: np.linspace(df[col].min(), df[col].max(), N_BINS + 1) for col in HIST_COLUMNS}
+        frames = []
+        for name, keys in GROUPING_SETS.items():
+            grouped = df.groupby(keys, sort=False)
+            cells = grouped.size().rename('Count').to_frame()
+            cells = cells.join(grouped[MEDIAN_COLUMNS].median().add_prefix('median_'))
+            cells = cells.join(grouped[MEAN_COLUMNS].mean().add_prefix('mean_'))
+            # Histograms of all the groups at once: bincount over (group, bin) pairs
+            codes = grouped.ngroup().values
+            for col in HIST_COLUMNS:
+                bins = np.clip(np.searchsorted(edges[col], df[col].values, side='right') - 1, 0, N_BINS - 1)
+                hist = np.bincount(codes*N_BINS + bins, minlength=len(cells)*N_BINS).reshape(len(cells), N_BINS)
+                cells['hist_' + col] = list(hist.astype('int32'))
+            cells = cells.reset_index()
+            cells.insert(0, 'grouping', name)
+            frames.append(cells)
+        return cls(pd.concat(frames, ignore_index=True, sort=False), edges, len(df))
+
+    def save(self, path):
+        table = pa.Table.from_pandas(self.cells, preserve_index=False)
+        # The bin edges and the # of rows go in the file metadata
+        metadata = dict(table.schema.metadata)
+        metadata[b'bin_edges'] = json.dumps({col: list(edges) for col, edges in self.edges.items()}).encode()
+        metadata[b'rows'] = str(self.rows).encode()
+        # Written to a temporary file, then renamed, so another process never reads a half-written cube
+        pq.write_table(table.replace_schema_metadata(metadata), path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        table = pq.read_table(path)
+        edges = json.loads(table.schema.metadata[b'bin_edges'])
+        rows = table.schema.metadata.get(b'rows', b'None').decode()
+        return cls(table.to_pandas(), {col: np.array(values) for col, values in edges.items()},
+                   int(rows) if rows.isdigit() else None)
+
+    def lookup(self, grouping, **keys):
+        """Returns the cells of a grouping set matching the given keys, in order of first appearance."""
+        cells = self.cells[self.cells['grouping'] == grouping]
+        for key, value in keys.items():
+            cells = cells[cells[key] == value]
+        return cells
+
+    def cell(self, grouping, **keys):
+        """Returns the single cell matching the keys, an empty cell (Count 0) if there isn't one."""
+        cells = self.lookup(grouping, **keys)
+        if len(cells) == 0:
+            return pd.Series({'Count': 0}).reindex(self.cells.columns)
+        return cells.iloc[0]
+
+    def zone_summary(self, tipo, cities, index=None):
+        """Medians and counts by Zone for the selected cities ("Precios Medios por Zona").
+        Read from the zone cell for zones whose listings are all in the selected cities, and from the
+        city_zone cell for zones in a single selected city. The medians of a zone split across several
+        selected cities, but not all of them, are computed from its rows in index (a ListingIndex of
+        the same data), they're NaN without one.
+        """
+        zones = self.lookup('zone', Tipo=tipo).set_index('Zone')
+        city_zones = self.lookup('city_zone', Tipo=tipo)
+        city_zones = city_zones[city_zones['City'].isin(cities)]
+        columns = ['median_' + col for col in MEDIAN_COLUMNS]
+
+        rows = {}
+        for zone, cells in city_zones.groupby('Zone', sort=False):
+            if cells['Count'].sum() == zones.loc[zone, 'Count']:
+                rows[zone] = zones.loc[zone, columns + ['Count']].tolist()
+            elif len(cells) == 1:
+                rows[zone] = cells.iloc[0][columns + ['Count']].tolist()
+            elif index is not None:
+                listings = index.select(tipo, zone)
+                listings = listings[listings['City'].isin(cities).values]
+                rows[zone] = listings[MEDIAN_COLUMNS].median().tolist() + [len(listings)]
+            else:
+                rows[zone] = [np.nan] * len(columns) + [cells['Count'].sum()]
+        summary = pd.DataFrame.from_dict(rows, orient='index', columns=MEDIAN_COLUMNS + ['Count']).astype('float64')
+        summary.index.name = 'Zone'
+        return summary
+
+    def histogram(self, column, selections, target_bins=30):
+        """Merges the fine bins of each selection of cells into about target_bins bins over the range
+        covered by all the selections, so several histograms can be overlaid.
+        in:  variable, dict with the cells of each selection (e.g. {zone: cells}), approximate # of bins
+        out: dataframe with the bin start, end and center and the counts of each selection
+        """
+        counts = {name: np.sum(list(cells['hist_' + column]), axis=0) for name, cells in selections.items()}
+        occupied = np.flatnonzero(np.sum(list(counts.values()), axis=0))
+        lo, hi = occupied[0], occupied[-1] + 1
+        step = max(1, int(np.ceil((hi - lo) / target_bins)))
+        starts = np.arange(lo, hi, step)
+        edges = self.edges[column]
+        result = pd.DataFrame({'start': edges[starts], 'end': edges[np.minimum(starts + step, N_BINS)]})
+        result['center'] = (result['start'] + result['end']) / 2
+        for name, count in counts.items():
+            result[name] = np.add.reduceat(count[lo:hi], starts - lo)
+        return result
+
+
+@contextmanager
+def build_lock(path):
+    """Exclusive lock between processes while the cube at path is checked and built (none if it can't be created)."""
+    try:
+        lock = open(path + '.lock', 'w')
+    except OSError:  # Read-only directory, the cube isn't saved either
+        yield
+        return
+    with lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def load_or_build(data, data_path, rows=None):
+    """Loads the cube saved next to the dataset, or builds it (and tries to save it) if it's missing, older,
+    or was built from another # of rows of the dataset. Processes starting at the same time take turns,
+    the first one builds the cube and the others load it.
+    data: the rows, or a function that loads them (only called if the cube is built, rows is then their #)
+    """
+    path = cube_path(data_path)
+    rows = len(data) if rows is None else rows
+    with build_lock(path):
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(data_path):
+            cube = AggregateCube.load(path)
+            if cube.rows == rows:
+                return cube
+        cube = AggregateCube.build(data() if callable(data) else data)
+        try:
+            cube.save(path)
+        except OSError:
+            pass
+        return cube
+
+
+if __name__ == '__main__':
+    import gt_data
+    AggregateCube.build(gt_data.load_dataset(sys.argv[1], columns=gt_data.APP_COLUMNS)).save(cube_path(sys.argv[1]))
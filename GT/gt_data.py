@@ -0,0 +1,90 @@
+"""Typed columnar storage for the preprocessed GT dataset.
+
+The output of the preprocessing is stored as Parquet (or Arrow IPC/Feather for memory mapping) with
+compact dtypes, so the app can load it from local disk reading only the columns it needs. The
+preprocessing scripts (Processing Scripts/) write it through write_dataset_chunks when their output
+ends with .parquet/.arrow/.feather.
+
+GT/Scrape_Sale.parquet, the dataset of the app, is generated from GT/Scrape_Sale.csv with
+    python GT/gt_data.py GT/Scrape_Sale.csv GT/Scrape_Sale.parquet
+(or written directly by the preprocessing), run it again whenever Scrape_Sale.csv changes.
+
+Usage: python gt_data.py Scrape_Sale.csv Scrape_Sale.parquet
+"""
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import feather
+
+
+# Compact dtypes for the preprocessed dataset (prices and surface stay float64)
+DTYPES = {'City': 'category', 'Zone': 'category', 'Tipo': 'int32', 'Bedrooms': 'int8', 'Bathrooms': 'int8',
+          'Zone_Val': 'int8', 'latitude': 'float32', 'longitude': 'float32', 'Surface': 'float64',
+          'Price_USD': 'float64', 'Price_m2_USD': 'float64'}
+# Columns used by the dashboard
+APP_COLUMNS = ['City', 'latitude', 'longitude', 'Tipo', 'Bedrooms', 'Bathrooms', 'Surface', 'Zone',
+               'Price_USD', 'Price_m2_USD']
+# GT_DATA_PATH points the app to another dataset (e.g. the synthetic ones of the benchmarks)
+DATA_PATH = os.environ.get('GT_DATA_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Scrape_Sale.parquet'))
+
+
+def to_compact(df):
+    """Drops the index column written by to_csv and the rows without coordinates, and applies DTYPES."""
+    df = df.drop([col for col in df.columns if col.startswith('Unnamed')], axis=1)
+    df = df.dropna(subset=['latitude', 'longitude'])
+    return df.astype({col: dtype for col, dtype in DTYPES.items() if col in df.columns}).reset_index(drop=True)
+
+
+def write_dataset(df, path):
+    """Writes the dataset with compact dtypes, as Arrow IPC if path ends with .arrow/.feather, otherwise as Parquet."""
+    df = to_compact(df)
+    if path.endswith(('.arrow', '.feather')):
+        # Uncompressed, so the file can be memory mapped without decoding
+        feather.write_feather(df, path, compression='uncompressed')
+    else:
+        df.to_parquet(path, index=False)
+
+
+def write_dataset_chunks(chunks, path):
+    """Writes the dataset from an iterable of dataframes (e.g. the chunks of the streaming preprocessing), see
+    write_dataset. Parquet is written chunk by chunk, Arrow IPC in one go (the app maps the whole file anyway).
+    out: # of rows written
+    """
+    if path.endswith(('.arrow', '.feather')):
+        df = to_compact(pd.concat(list(chunks), ignore_index=True))
+        write_dataset(df, path)
+        return len(df)
+    rows, writer = 0, None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(to_compact(chunk), preserve_index=False)
+            if writer is None:
+                # The categories of each chunk are their own, the indices are int32 in all of them
+                fields = [pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type))
+                          if pa.types.is_dictionary(field.type) else field for field in table.schema]
+                writer = pq.ParquetWriter(path, pa.schema(fields, metadata=table.schema.metadata))
+            writer.write_table(table.cast(writer.schema))
+            rows += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def load_dataset(path=DATA_PATH, columns=None, memory_map=False):
+    """Loads the dataset reading only the given columns.
+    With memory_map the file is mapped instead of read, for Arrow IPC files the numeric columns
+    then point straight to the mapped pages.
+    """
+    if path.endswith(('.arrow', '.feather')):
+        table = feather.read_table(path, columns=columns, memory_map=memory_map)
+    else:
+        table = pq.read_table(path, columns=columns, memory_map=memory_map)
+    return table.to_pandas(split_blocks=memory_map)
+
+
+if __name__ == '__main__':
+    write_dataset(pd.read_csv(sys.argv[1]), sys.argv[2])
@@ -0,0 +1,82 @@
+"""Export of a selection of the GT listings as CSV, gzip'd CSV or Parquet.
+
+The file is generated only when it's requested, in chunks of rows: export_chunks yields the bytes
+of the file piece by piece, so the whole file never has to exist as one string (let alone a base64
+copy embedded in the page).
+
+    for chunk in export_chunks(df, 'csv.gz'):
+        out.write(chunk)
+"""
+import io
+import zlib
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# format (file extension) -> MIME type
+FORMATS = {'csv': 'text/csv', 'csv.gz': 'application/gzip', 'parquet': 'application/octet-stream'}
+CHUNK_ROWS = 50000
+
+
+def csv_chunks(df, chunk_rows=CHUNK_ROWS):
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=start == 0).encode()
+
+
+def gzip_chunks(chunks, level=6):
+    """Compresses a stream of bytes into a gzip stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # wbits + 16: gzip header
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class DrainedSink(io.RawIOBase):
+    """Write-only file that keeps the bytes written since the last drain()."""
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_chunks(df, chunk_rows=CHUNK_ROWS):
+    """One row group per chunk of rows, each yielded as soon as it's written."""
+    sink = DrainedSink()
+    writer = None
+    for start in range(0, max(len(df), 1), chunk_rows):
+        table = pa.Table.from_pandas(df.iloc[start:start + chunk_rows], preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def export_chunks(df, fmt='csv', chunk_rows=CHUNK_ROWS):
+    """Bytes of the file with the rows of df in the given format (a key of FORMATS), in chunks."""
+    if fmt == 'csv':
+        return csv_chunks(df, chunk_rows)
+    if fmt == 'csv.gz':
+        return gzip_chunks(csv_chunks(df, chunk_rows))
+    if fmt == 'parquet':
+        return parquet_chunks(df, chunk_rows)
+    raise ValueError('Unknown format %r, expected one of %s' % (fmt, ', '.join(FORMATS)))
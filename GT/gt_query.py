@@ -0,0 +1,52 @@
+"""Indexed, copy-free access to the GT listings.
+
+The listings are sorted once by (Tipo, Zone, Bedrooms), so every selection the app makes is a contiguous
+range of rows. select() returns a positional slice of the sorted frame, which pandas gives back as a
+view, so a rerun doesn't copy or scan the whole dataset.
+"""
+import numpy as np
+import pandas as pd
+
+
+INDEX_KEYS = ['Tipo', 'Zone', 'Bedrooms']
+
+
+def key_values(col):
+    return col.cat.codes.values if hasattr(col, 'cat') else col.values
+
+
+def is_sorted(df, keys):
+    """Whether the rows are sorted by the keys (categories in their order), without sorting or copying."""
+    ties = np.ones(max(len(df) - 1, 0), dtype=bool)  # consecutive rows equal on the previous keys
+    for key in keys:
+        values = key_values(df[key])
+        if (ties & (values[1:] < values[:-1])).any():
+            return False
+        ties &= values[1:] == values[:-1]
+    return True
+
+
+class ListingIndex:
+    def __init__(self, df):
+        if is_sorted(df, INDEX_KEYS) and df.index.equals(pd.RangeIndex(len(df))):
+            self.data = df  # Already sorted (e.g. the shared copy of the cache), used as is
+        else:
+            self.data = df.sort_values(INDEX_KEYS, kind='mergesort').reset_index(drop=True)
+        self.ranges = {}
+        # For each prefix of the keys, find where the value changes between consecutive rows
+        change = np.zeros(max(len(self.data) - 1, 0), dtype=bool)
+        for depth, key in enumerate(INDEX_KEYS, 1):
+            col = self.data[key]
+            values = key_values(col)
+            change |= values[1:] != values[:-1]
+            starts = np.r_[0, np.flatnonzero(change) + 1] if len(self.data) else np.array([], dtype=int)
+            stops = np.r_[starts[1:], len(self.data)]
+            labels = self.data[INDEX_KEYS[:depth]].iloc[starts].itertuples(index=False, name=None)
+            for label, start, stop in zip(labels, starts, stops):
+                self.ranges[label] = (start, stop)
+
+    def select(self, tipo, zone=None, bedrooms=None):
+        """Rows with the given Tipo (and Zone, and # of Bedrooms), as a view of the sorted frame."""
+        key = tuple(value for value in (tipo, zone, bedrooms) if value is not None)
+        start, stop = self.ranges.get(key, (0, 0))
+        return self.data.iloc[start:stop]
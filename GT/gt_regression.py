@@ -0,0 +1,35 @@
+"""Closed-form simple linear regression (OLS) for every group of a frame at once.
+
+For each group the slope, intercept and R² of y ~ x come from the centered sums
+    Sxx = sum((x - mean_x)²), Sxy = sum((x - mean_x)(y - mean_y)), Syy = sum((y - mean_y)²)
+as slope = Sxy/Sxx, intercept = mean_y - slope*mean_x and R² = Sxy²/(Sxx*Syy), each sum being a
+bincount over the group codes. Same coefficients as statsmodels' OLS with a constant.
+"""
+import numpy as np
+import pandas as pd
+
+
+def fit_lines(df, by, x='Surface', y='Price_USD'):
+    """Fits y ~ x in every group of df.
+    in:  dataframe, grouping column(s), names of the x and y columns
+    out: dataframe indexed by the group with the n, slope, intercept and r_squared of each fit
+         (NaN where the fit is undefined: fewer than 2 rows, or x or y constant)
+    """
+    grouped = df.groupby(by, sort=False, observed=True)
+    codes = grouped.ngroup().values
+    n = np.bincount(codes).astype('float64')
+    xs = df[x].values.astype('float64')
+    ys = df[y].values.astype('float64')
+    dx = xs - (np.bincount(codes, xs) / n)[codes]
+    dy = ys - (np.bincount(codes, ys) / n)[codes]
+    sxx = np.bincount(codes, dx*dx, minlength=len(n))
+    sxy = np.bincount(codes, dx*dy, minlength=len(n))
+    syy = np.bincount(codes, dy*dy, minlength=len(n))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+        intercept = np.bincount(codes, ys) / n - slope * np.bincount(codes, xs) / n
+        r_squared = np.where((sxx > 0) & (syy > 0), sxy*sxy / (sxx*syy), np.nan)
+
+    index = grouped.size().index  # groups in order of first appearance, like ngroup with sort=False
+    return pd.DataFrame({'n': n.astype('int64'), 'slope': slope, 'intercept': intercept, 'r_squared': r_squared},
+                        index=index, columns=['n', 'slope', 'intercept', 'r_squared'])
@@ -0,0 +1,323 @@
+"""Store of the GT scrape snapshots and the monthly price series computed from them.
+
+Every scrape file has its own shape (Scrape_2020.csv: price_usd, zona, m2, number_of_bedrooms...;
+Scrape_Sale_01-01-2021.csv: the app columns without dates; Scrape_Sale.csv: the app columns with
+created_at). Each one is normalized into SCHEMA and written as one partition of a Parquet dataset
+partitioned by the date of the snapshot (listings/snapshot=YYYY-MM-DD/part-0.parquet).
+
+Relisted properties are deduplicated across snapshots: a listing is identified by its location,
+surface, bedrooms and bathrooms (listing_id), and an observation of a listing at its latest stored
+price isn't stored again, only new listings and price changes are. The snapshots are ingested
+oldest first, so every observation keeps the first date it was seen. latest.arrow holds the prices
+of every listing in the last snapshot it was seen in (one row per listing, more if different properties
+share its id, e.g. identical apartments of a building), new snapshots are compared against it instead
+of against all the stored observations. It's uncompressed Arrow IPC, rewritten on every snapshot.
+
+series.parquet holds the median price per m² of every (Tipo, Zone, month). It's updated incrementally:
+a new snapshot only recomputes the months it has rows for, reading just those rows and columns. The
+listings of Scrape_2020.csv have no Tipo, so they aren't in the series.
+
+Usage: python gt_snapshots.py [--store DIR] [Scrape_2020.csv Scrape_Sale.csv ...]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import feather
+
+try:
+    import fcntl
+except ImportError:  # Windows, ingestions aren't serialized across processes
+    fcntl = None
+
+
+GT_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_PATH = os.path.join(GT_DIR, 'snapshots')
+SNAPSHOT_FILES = os.path.join(GT_DIR, 'Scrape_*.csv')
+# Normalized listings, snapshot is the partition key (it's not stored in the files)
+SCHEMA = pa.schema([
+    ('listing_id', pa.uint64()), ('listed_at', pa.date32()), ('month', pa.date32()), ('City', pa.string()),
+    ('Zone', pa.string()), ('Tipo', pa.int32()), ('Bedrooms', pa.int8()), ('Bathrooms', pa.int8()),
+    ('Surface', pa.float64()), ('latitude', pa.float32()), ('longitude', pa.float32()),
+    ('Price_USD', pa.float64()), ('Price_m2_USD', pa.float64()),
+])
+PARTITIONING = ds.partitioning(pa.schema([('snapshot', pa.date32())]), flavor='hive')
+# Columns that identify a property across snapshots (the coordinates are rounded to 3 decimals by the site)
+LISTING_COLUMNS = ['latitude', 'longitude', 'Surface', 'Bedrooms', 'Bathrooms']
+# Prices of every listing in the last snapshot it was seen in
+LATEST_SCHEMA = pa.schema([('listing_id', pa.uint64()), ('Price_USD', pa.float64())])
+# Keys of the monthly series
+SERIES_KEYS = ['Tipo', 'Zone', 'month']
+MIN_SURFACE = 30
+
+
+def city_of_zone(zone):
+    """Zones of Mixco are named 'Zona N de Mixco', the rest are in Ciudad de Guatemala."""
+    return np.where(zone.str.endswith('de Mixco'), 'Mixco', 'Ciudad de Guatemala')
+
+
+def normalize_2020(raw):
+    """Scrape_2020.csv: no Tipo or City, surfaces as text (some are broken ranges like ' 145]')."""
+    listed_at = pd.to_datetime(raw['created_at'], format='%m/%d/%y')
+    df = pd.DataFrame({
+        'listed_at': listed_at,
+        'Zone': raw['zona'],
+        'Tipo': np.nan,
+        'Bedrooms': raw['number_of_bedrooms'],
+        'Bathrooms': raw['number_of_bathrooms'],
+        'Surface': pd.to_numeric(raw['m2'], errors='coerce'),
+        'latitude': raw['latitude'],
+        'longitude': raw['longitude'],
+        'Price_USD': raw['price_usd'],
+    }).dropna(subset=['Zone', 'Surface'])
+    df['City'] = city_of_zone(df['Zone'])
+    return listed_at.max(), df
+
+
+def normalize_sale(raw, snapshot=None):
+    """Scrape_Sale*.csv: the app columns, with created_at (local time) in the newer snapshots."""
+    df = raw[['City', 'Zone', 'Tipo', 'Bedrooms', 'Bathrooms', 'Surface', 'latitude', 'longitude', 'Price_USD']].copy()
+    if 'created_at' in raw.columns:
+        df['listed_at'] = pd.to_datetime(raw['created_at'].str[:10])  # local date, without the offset
+        snapshot = df['listed_at'].max() if snapshot is None else snapshot
+    else:
+        df['listed_at'] = pd.NaT
+    return snapshot, df
+
+
+def snapshot_of_name(path):
+    """Date in the name of a scrape file (Scrape_Sale_01-01-2021.csv), None if it has none."""
+    match = re.search(r'(\d{2})-(\d{2})-(\d{4})', os.path.basename(path))
+    return pd.Timestamp('%s-%s-%s' % (match.group(3), match.group(1), match.group(2))) if match else None
+
+
+def normalize(raw, snapshot=None):
+    """Normalizes a raw scrape frame (any of the known shapes).
+    in:  raw dataframe, date of the snapshot if it can't be taken from the data
+    out: (date of the snapshot, dataframe with the columns of SCHEMA)
+    """
+    if 'price_usd' in raw.columns:
+        found, df = normalize_2020(raw)
+    else:
+        found, df = normalize_sale(raw, snapshot)
+    snapshot = snapshot if snapshot is not None else found
+    if snapshot is None:
+        raise ValueError('The snapshot has no dates, its date has to be given')
+    df = df[(df['Surface'] >= MIN_SURFACE) & (df['Price_USD'] > 0)].copy()
+    df['latitude'] = df['latitude'].round(3)
+    df['longitude'] = df['longitude'].round(3)
+    df['Price_m2_USD'] = (df['Price_USD'] / df['Surface']).round(2)
+    # Month of the observation: when it was listed, or the snapshot date if the file has no dates
+    observed = df['listed_at'].fillna(pd.Timestamp(snapshot))
+    df['month'] = observed.values.astype('datetime64[M]').astype('datetime64[ns]')
+    # Hashed as float64: the hash depends on the dtype, and Bedrooms/Bathrooms are float64 in Scrape_2020.csv
+    # but int64 in the Sale files, a listing has to get the same id in every snapshot
+    df['listing_id'] = pd.util.hash_pandas_object(df[LISTING_COLUMNS].astype('float64'), index=False).values
+    return pd.Timestamp(snapshot).normalize(), df[SCHEMA.names].reset_index(drop=True)
+
+
+def observation_keys(listing_id, price):
+    """64-bit hash of (listing, price), equal for a relisting at the same price."""
+    return pd.util.hash_pandas_object(pd.DataFrame({'listing_id': listing_id, 'Price_USD': price}), index=False).values
+
+
+def listings_path(store):
+    return os.path.join(store, 'listings')
+
+
+def series_path(store):
+    return os.path.join(store, 'series.parquet')
+
+
+def latest_path(store):
+    return os.path.join(store, 'latest.arrow')
+
+
+def partition_path(store, snapshot):
+    return os.path.join(listings_path(store), 'snapshot=%s' % snapshot.strftime('%Y-%m-%d'))
+
+
+def snapshots(store=STORE_PATH):
+    """Dates of the snapshots in the store, oldest first."""
+    paths = glob.glob(os.path.join(listings_path(store), 'snapshot=*'))
+    return sorted(pd.Timestamp(os.path.basename(path)[9:]) for path in paths)
+
+
+def dataset(store=STORE_PATH):
+    return ds.dataset(listings_path(store), format='parquet', partitioning=PARTITIONING, schema=SCHEMA.append(
+        pa.field('snapshot', pa.date32())))
+
+
+def read_listings(store=STORE_PATH, columns=None, filter=None):
+    """Listings of all the snapshots (with a snapshot column), reading only the given columns and rows."""
+    if not snapshots(store):
+        return pd.DataFrame({name: pd.Series(dtype='object') for name in columns or SCHEMA.names + ['snapshot']})
+    return dataset(store).to_table(columns=columns, filter=filter).to_pandas()
+
+
+def monthly_series(df):
+    """Median price per m² (and # of listings) of every (Tipo, Zone, month) in the rows, without the rows of unknown Tipo."""
+    df = df.dropna(subset=['Tipo']).astype({'Tipo': 'int32'})
+    groups = df.groupby(SERIES_KEYS, sort=True, observed=True)['Price_m2_USD']
+    return pd.DataFrame({'n': groups.size(), 'median_Price_m2_USD': groups.median()}).reset_index()
+
+
+def read_series(store=STORE_PATH):
+    path = series_path(store)
+    if not os.path.exists(path):
+        return pd.DataFrame({'Tipo': pd.Series(dtype='int32'), 'Zone': pd.Series(dtype='object'),
+                             'month': pd.Series(dtype='datetime64[ns]'),
+                             'n': pd.Series(dtype='int64'), 'median_Price_m2_USD': pd.Series(dtype='float64')})
+    series = pq.read_table(path).to_pandas()
+    series['month'] = pd.to_datetime(series['month'])
+    return series
+
+
+def series_version(store=STORE_PATH):
+    """Changes whenever the series are updated, to key the caches of the dashboard."""
+    path = series_path(store)
+    return os.path.getmtime(path) if os.path.exists(path) else 0
+
+
+def series_outdated(store=STORE_PATH):
+    """True if the store has no series yet, or series written before they were per Tipo."""
+    path = series_path(store)
+    return not os.path.exists(path) or 'Tipo' not in pq.read_schema(path).names
+
+
+def update_series(store, months=None):
+    """Recomputes the series of the given months from the store (only their rows are read), or of every
+    month if months is None or the stored series aren't per Tipo (written by an older version).
+    """
+    columns = ['Tipo', 'Zone', 'month', 'Price_m2_USD']
+    if months is None or series_outdated(store):
+        rows = read_listings(store, columns=columns)
+        rows['month'] = pd.to_datetime(rows['month'])
+        series = monthly_series(rows)
+    else:
+        months = sorted(set(pd.to_datetime(months)))
+        rows = read_listings(store, columns=columns,
+                             filter=ds.field('month').isin(pa.array([month.date() for month in months], pa.date32())))
+        rows['month'] = pd.to_datetime(rows['month'])
+        series = read_series(store)
+        series = pd.concat([series[~series['month'].isin(months)], monthly_series(rows)], ignore_index=True)
+    series = series.sort_values(SERIES_KEYS, kind='mergesort').reset_index(drop=True)
+    path = series_path(store)
+    pq.write_table(pa.Table.from_pandas(series, preserve_index=False), path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return series
+
+
+def write_latest(store, latest):
+    """Writes the latest prices of every listing, with the # of snapshots it covers (to detect a stale file)."""
+    table = pa.Table.from_pandas(latest, schema=LATEST_SCHEMA, preserve_index=False)
+    table = table.replace_schema_metadata({b'snapshots': str(len(snapshots(store))).encode()})
+    os.makedirs(store, exist_ok=True)
+    path = latest_path(store)
+    feather.write_feather(table, path + '.tmp', compression='uncompressed')
+    os.replace(path + '.tmp', path)
+
+
+def read_latest(store):
+    """Latest prices of every listing. If the file is missing, or stale because an ingestion stopped between
+    writing its partition and the file, it's rebuilt with every (listing, price) stored.
+    """
+    path = latest_path(store)
+    if os.path.exists(path):
+        table = feather.read_table(path)
+        if table.schema.metadata.get(b'snapshots') == str(len(snapshots(store))).encode():
+            return table.to_pandas()
+    stored = read_listings(store, columns=LATEST_SCHEMA.names).drop_duplicates()
+    latest = stored.astype({'listing_id': 'uint64', 'Price_USD': 'float64'}).reset_index(drop=True)
+    write_latest(store, latest)
+    return latest
+
+
+def read_snapshot(path, snapshot=None):
+    """Reads and normalizes a scrape file, see normalize (the date can come from the name of the file)."""
+    return normalize(pd.read_csv(path), snapshot if snapshot is not None else snapshot_of_name(path))
+
+
+def add_snapshot(store, snapshot, df):
+    """Adds the normalized listings of a snapshot to the store and updates the series of the months they touch.
+    out: dict with the date of the snapshot, the # of rows and the # of new observations stored
+    A snapshot already in the store isn't added again.
+    """
+    partition = partition_path(store, snapshot)
+    if os.path.exists(partition):
+        return {'snapshot': snapshot, 'rows': len(df), 'added': 0}
+
+    # Observations at a latest price of their listing, or repeated in this one
+    latest = read_latest(store)
+    keys = observation_keys(df['listing_id'].values, df['Price_USD'].values)
+    new = ~np.isin(keys, observation_keys(latest['listing_id'].values, latest['Price_USD'].values))
+    new &= ~pd.Series(keys).duplicated().values
+    added = df[new]
+
+    # Written to a temporary directory, then renamed
+    os.makedirs(listings_path(store), exist_ok=True)
+    tmp = partition + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    pq.write_table(pa.Table.from_pandas(added, schema=SCHEMA, preserve_index=False), os.path.join(tmp, 'part-0.parquet'))
+    os.replace(tmp, partition)
+    # The prices of the listings in this snapshot replace their previous ones
+    current = df[LATEST_SCHEMA.names].drop_duplicates()
+    write_latest(store, pd.concat([latest[~latest['listing_id'].isin(current['listing_id'])], current], ignore_index=True))
+    if len(added):
+        update_series(store, added['month'].unique())
+    return {'snapshot': snapshot, 'rows': len(df), 'added': len(added)}
+
+
+def ingest_snapshot(path, store=STORE_PATH, snapshot=None):
+    """Adds a scrape file to the store (the date of the snapshot is taken from the data or the file name if None)."""
+    return add_snapshot(store, *read_snapshot(path, snapshot))
+
+
+@contextmanager
+def store_lock(store):
+    """Exclusive lock of the store between processes, held while snapshots are added."""
+    os.makedirs(store, exist_ok=True)
+    with open(os.path.join(store, '.lock'), 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def ingest_all(paths=None, store=STORE_PATH, if_empty=False):
+    """Ingests the scrape files (all the Scrape_*.csv in GT/ by default), oldest snapshot first.
+    The store is locked meanwhile, processes ingesting at the same time take turns. With if_empty nothing
+    is ingested if the store already has series (first start of the app: one process builds it, the
+    others wait for it and then read it). Series that aren't per Tipo yet are recomputed.
+    """
+    paths = sorted(glob.glob(SNAPSHOT_FILES)) if paths is None else paths
+    with store_lock(store):
+        if if_empty and not series_outdated(store):
+            return []
+        ingested = sorted((read_snapshot(path) for path in paths), key=lambda snapshot: snapshot[0])
+        results = [add_snapshot(store, snapshot, df) for snapshot, df in ingested]
+        if series_outdated(store) and snapshots(store):
+            update_series(store)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*', help='scrape files (default: GT/Scrape_*.csv)')
+    parser.add_argument('--store', default=STORE_PATH)
+    args = parser.parse_args()
+    for result in ingest_all(args.files or None, args.store):
+        print(json.dumps(dict(result, snapshot=result['snapshot'].strftime('%Y-%m-%d'))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""Batch valuation of properties with per-zone price per m² models fitted on the GT dataset.
+
+In every (Tipo, Zone) the price per m² is modeled as the mean of the zone adjusted by the # of bedrooms
+and bathrooms:
+    Price_m2_USD = intercept + slope_Bedrooms*(Bedrooms - mean_Bedrooms) + slope_Bathrooms*(Bathrooms - mean_Bathrooms)
+and the price as Price_m2_USD * Surface. The slopes are the OLS of the deviations from the means of the
+zone, from the centered sums of every zone at once (bincounts, as in gt_regression.py). Zones with
+fewer than MIN_ROWS listings, or where bedrooms and bathrooms don't vary independently, use the
+slopes of their Tipo, fitted on the deviations from the means of each zone of the Tipo. Zones that
+aren't in the data get the model of their Tipo.
+
+The coefficients are fitted once per version of the dataset and saved next to it (like the cube),
+scoring a batch is a lookup of the coefficients of every row and a few array operations.
+
+Usage: python gt_valuation.py portfolio.csv valued.csv [--data Scrape_Sale.parquet] [--chunk-rows 100000]
+       (CSV, also compressed, or Parquet, by the extension of the files)
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import gt_data
+
+
+INPUT_COLUMNS = ['Tipo', 'Zone', 'Bedrooms', 'Bathrooms', 'Surface']
+FIT_COLUMNS = INPUT_COLUMNS + ['Price_m2_USD']
+ADJUSTMENTS = ['Bedrooms', 'Bathrooms']
+# Read as float64 from CSV, so a chunk with a missing value has the same types as the others
+NUMERIC_INPUTS = {'Tipo': 'float64', 'Bedrooms': 'float64', 'Bathrooms': 'float64', 'Surface': 'float64'}
+MIN_ROWS = 20
+CHUNK_ROWS = 100000
+
+
+def model_path(data_path):
+    return os.path.splitext(data_path)[0] + '_valuation.parquet'
+
+
+def centered_sums(codes, n_groups, columns, y):
+    """Means of the columns and y per group, and the centered sums of squares and cross products."""
+    n = np.bincount(codes, minlength=n_groups).astype('float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = [np.bincount(codes, col, minlength=n_groups) / n for col in columns + [y]]
+    deviations = [col - mean[codes] for col, mean in zip(columns + [y], means)]
+    return n, means, deviations
+
+
+def solve_slopes(codes, n_groups, deviations):
+    """OLS slopes of y on two regressors per group from the deviations of each row (NaN if singular)."""
+    d1, d2, dy = deviations
+    s11, s22, s12 = (np.bincount(codes, a*b, minlength=n_groups) for a, b in ((d1, d1), (d2, d2), (d1, d2)))
+    s1y, s2y = (np.bincount(codes, a*dy, minlength=n_groups) for a in (d1, d2))
+    det = s11*s22 - s12*s12
+    with np.errstate(divide='ignore', invalid='ignore'):
+        valid = det > 1e-9 * s11 * s22
+        return np.where(valid, (s1y*s22 - s2y*s12) / det, np.nan), np.where(valid, (s2y*s11 - s1y*s12) / det, np.nan)
+
+
+class ValuationModel:
+    def __init__(self, coefficients):
+        """coefficients: one row per (Tipo, Zone), Zone null for the model of the whole Tipo."""
+        self.coefficients = coefficients
+        is_tipo = coefficients['Zone'].isnull().values
+        self.tipos = np.sort(coefficients['Tipo'].values[is_tipo])
+        self.zones = pd.Index(coefficients['Zone'][~is_tipo].unique())
+        # Row of the coefficients of every (Tipo, Zone): the model of the Tipo where the zone has none
+        self.rows = np.repeat(np.flatnonzero(is_tipo)[np.argsort(coefficients['Tipo'].values[is_tipo])][:, None],
+                              len(self.zones) + 1, axis=1)
+        zone_rows = np.flatnonzero(~is_tipo)
+        self.rows[np.searchsorted(self.tipos, coefficients['Tipo'].values[zone_rows]),
+                  self.zones.get_indexer(coefficients['Zone'].values[zone_rows])] = zone_rows
+        self.params = {col: coefficients[col].values.astype('float64') for col in coefficients.columns
+                       if col.startswith(('intercept', 'mean_', 'slope_'))}
+
+    @classmethod
+    def fit(cls, df, min_rows=MIN_ROWS):
+        df = df[FIT_COLUMNS].dropna()
+        df = df[df['Price_m2_USD'] > 0]
+        zone = df['Zone'].astype(str)
+        tipo_codes, tipos = pd.factorize(df['Tipo'], sort=True)
+        zone_codes, zones = pd.factorize(pd.MultiIndex.from_arrays([df['Tipo'].values, zone.values]), sort=True)
+        columns = [df[col].values.astype('float64') for col in ADJUSTMENTS]
+        y = df['Price_m2_USD'].values.astype('float64')
+
+        # Zones: their means and the slopes of the deviations from them
+        n, means, deviations = centered_sums(zone_codes, len(zones), columns, y)
+        slopes = solve_slopes(zone_codes, len(zones), deviations)
+        # Tipos: their means, and the slopes of the deviations from the means of each zone (pooled within zones)
+        tipo_n, tipo_means, _ = centered_sums(tipo_codes, len(tipos), columns, y)
+        tipo_slopes = [np.nan_to_num(slope) for slope in solve_slopes(tipo_codes, len(tipos), deviations)]
+        # Small or degenerate zones use the slopes of their Tipo
+        zone_tipo = np.searchsorted(tipos.values, zones.get_level_values(0))
+        fallback = (n < min_rows) | np.isnan(slopes[0])
+        slopes = [np.where(fallback, tipo_slope[zone_tipo], slope) for slope, tipo_slope in zip(slopes, tipo_slopes)]
+
+        coefficients = pd.DataFrame({
+            'Tipo': np.r_[tipos.values, zones.get_level_values(0)].astype('int32'),
+            'Zone': np.r_[[None] * len(tipos), zones.get_level_values(1)],
+            'n': np.r_[tipo_n, n].astype('int64'),
+            'intercept': np.r_[tipo_means[-1], means[-1]],
+        })
+        for col, tipo_mean, mean, tipo_slope, slope in zip(ADJUSTMENTS, tipo_means, means, tipo_slopes, slopes):
+            coefficients['mean_' + col] = np.r_[tipo_mean, mean]
+            coefficients['slope_' + col] = np.r_[tipo_slope, slope]
+        return cls(coefficients)
+
+    def save(self, path):
+        pq.write_table(pa.Table.from_pandas(self.coefficients, preserve_index=False), path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        return cls(pq.read_table(path).to_pandas())
+
+    def value(self, df):
+        """Estimates of the rows of df (columns INPUT_COLUMNS).
+        out: dataframe with est_Price_m2_USD and est_Price_USD, aligned with df (NaN for unknown Tipos or missing inputs)
+        """
+        missing = [col for col in INPUT_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError('Missing columns: %s' % ', '.join(missing))
+        tipo = df['Tipo'].values
+        tipo_index = np.clip(np.searchsorted(self.tipos, tipo), 0, max(len(self.tipos) - 1, 0))
+        known = (self.tipos[tipo_index] == tipo) if len(self.tipos) else np.zeros(len(df), dtype=bool)
+        zone_index = self.zones.get_indexer(df['Zone'].astype(str).values)  # -1 (the last column): the Tipo's model
+        rows = self.rows[tipo_index, zone_index] if len(self.tipos) else np.zeros(len(df), dtype=np.intp)
+        p = self.params
+        price_m2 = p['intercept'][rows]
+        for col in ADJUSTMENTS:
+            price_m2 = price_m2 + p['slope_' + col][rows] * (df[col].values.astype('float64') - p['mean_' + col][rows])
+        price_m2 = np.where(known, price_m2, np.nan)
+        return pd.DataFrame({'est_Price_m2_USD': price_m2, 'est_Price_USD': price_m2 * df['Surface'].values},
+                            index=df.index)
+
+
+def load_or_fit(data=None, data_path=gt_data.DATA_PATH):
+    """Loads the model saved next to the dataset, or fits it (and tries to save it) if it's missing or older."""
+    path = model_path(data_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(data_path):
+        return ValuationModel.load(path)
+    model = ValuationModel.fit(data if data is not None else gt_data.load_dataset(data_path, columns=FIT_COLUMNS))
+    try:
+        model.save(path)
+    except OSError:
+        pass
+    return model
+
+
+def value(df, model=None):
+    """Values a batch of properties (columns INPUT_COLUMNS) with the model of the dataset, see ValuationModel.value.
+    out: df with the est_Price_m2_USD and est_Price_USD columns added
+    """
+    model = model if model is not None else load_or_fit()
+    return pd.concat([df, model.value(df)], axis=1)
+
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    if path.endswith('.parquet'):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=NUMERIC_INPUTS):
+            yield chunk
+
+
+def value_file(input_path, output_path, model=None, chunk_rows=CHUNK_ROWS):
+    """Values the properties of input_path chunk by chunk into output_path (CSV or Parquet), returns the # of rows."""
+    model = model if model is not None else load_or_fit()
+    rows, writer = 0, None
+    try:
+        for i, chunk in enumerate(read_chunks(input_path, chunk_rows)):
+            valued = value(chunk, model)
+            if output_path.endswith('.parquet'):
+                table = pa.Table.from_pandas(valued, preserve_index=False)
+                writer = writer or pq.ParquetWriter(output_path, table.schema)
+                # The schema is the first chunk's (other columns can still be int in it and float in the next one)
+                writer.write_table(table.cast(writer.schema))
+            else:
+                valued.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            rows += len(valued)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--data', default=gt_data.DATA_PATH, help='dataset the models are fitted on')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    rows = value_file(args.input, args.output, load_or_fit(data_path=args.data), args.chunk_rows)
+    print('%i rows valued' % rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Adds the Google Tag Manager container to the index.html served by the installed Streamlit.
+
+The app used to do this on every start. Run it once after installing the requirements (e.g. in the
+build step of the deployment), running it again doesn't change the file. The app only checks that the
+container is there and logs a warning if it isn't (see warn_if_missing), it doesn't modify the file.
+
+Usage: python install_gtm.py [GTM-XXXXXX]
+"""
+import logging
+import os
+import sys
+
+import streamlit
+
+GTM_SNIPPET = """<!-- Google Tag Manager -->
+<script>(function(w,d,s,l,i){w[l]=w[l]||[];w[l].push({'gtm.start':
+new Date().getTime(),event:'gtm.js'});var f=d.getElementsByTagName(s)[0],
+j=d.createElement(s),dl=l!='dataLayer'?'&l='+l:'';j.async=true;j.src=
+'https://www.googletagmanager.com/gtm.js?id='+i+dl;f.parentNode.insertBefore(j,f);
+})(window,document,'script','dataLayer','%s');</script>
+<!-- End Google Tag Manager -->"""
+INDEX_PATH = os.path.join(os.path.dirname(streamlit.__file__), 'static', 'index.html')
+_checked = False
+
+
+def install_gtm(container_id='GTM-XXXXXX', index_path=None):
+    """Inserts the container snippet after <head>, unless the page already has one.
+    Returns True if the file was modified.
+    """
+    index_path = index_path or INDEX_PATH
+    if gtm_installed(index_path):
+        return False
+    with open(index_path) as f:
+        page = f.read()
+    with open(index_path, 'w') as f:
+        f.write(page.replace('<head>', '<head>' + GTM_SNIPPET % container_id, 1))
+    return True
+
+
+def gtm_installed(index_path=None):
+    """True if the index.html served by Streamlit already has a GTM container."""
+    with open(index_path or INDEX_PATH) as f:
+        return 'GTM-' in f.read()
+
+
+def warn_if_missing(index_path=None):
+    """Logs a warning (once per process, the app calls it on every rerun) if the container isn't installed,
+    e.g. after a deploy that skipped this script. Analytics are off until it runs, the app works the same.
+    """
+    global _checked
+    if _checked:
+        return
+    _checked = True
+    try:
+        installed = gtm_installed(index_path)
+    except OSError:
+        installed = False
+    if not installed:
+        logging.getLogger(__name__).warning('The GTM container is missing from %s, analytics are off. '
+                                            'Run python GT/install_gtm.py GTM-XXXXXX to install it.',
+                                            index_path or INDEX_PATH)
+
+
+if __name__ == '__main__':
+    print('GTM container installed' if install_gtm(*sys.argv[1:2]) else 'GTM container already installed')
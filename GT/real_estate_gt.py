@@ -1,39 +1,32 @@
-#Load libraries
-import plotly.express as px
+#Load libraries (plotly and pydeck are imported by the sections that use them, so the first elements render sooner)
 import streamlit as st
-import pydeck as pdk
-import pandas as pd
 import numpy as np
-import base64
 import os
-import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) #Modules shared by the apps
+from common.datacache import shared_cache, version_key
+from common.hexbin import column_layer_props, hex_cells
+from common.tracing import start_rerun
+from gt_cube import load_or_build
+from gt_data import APP_COLUMNS, DATA_PATH, load_dataset
+from gt_export import FORMATS, export_chunks
+from gt_query import INDEX_KEYS, ListingIndex
+from gt_regression import fit_lines
+from gt_snapshots import STORE_PATH as SNAPSHOT_STORE, ingest_all, read_series, series_outdated, series_version
+from install_gtm import warn_if_missing
+
+rerun = start_rerun('gt') #Times every section of the rerun when APP_TRACE is set, see common/tracing.py
 
 #Set title and favicon
 st.set_page_config(page_title='Precios de Apartamentos y Casas en la Cuidad Guatemala.', page_icon = "https://emojipedia-us.s3.dualstack.us-west-1.amazonaws.com/thumbs/120/lg/57/flag-for-guatemala_1f1ec-1f1f9.png")
 st.markdown('<html lang="es"><html translate="no">', unsafe_allow_html=True)
 
 
-#Code to automatically include GTM Container
-code = """<!-- Google Tag Manager -->
-<script>(function(w,d,s,l,i){w[l]=w[l]||[];w[l].push({'gtm.start':
-new Date().getTime(),event:'gtm.js'});var f=d.getElementsByTagName(s)[0],
-j=d.createElement(s),dl=l!='dataLayer'?'&l='+l:'';j.async=true;j.src=
-'https://www.googletagmanager.com/gtm.js?id='+i+dl;f.parentNode.insertBefore(j,f);
-})(window,document,'script','dataLayer','GTM-XXXXXX');</script>
-<!-- End Google Tag Manager -->"""
-
-a=os.path.dirname(st.__file__)+'/static/index.html'
-with open(a, 'r') as f:
-    data=f.read()
-    if len(re.findall('GTM-', data))==0:
-        with open(a, 'w') as ff:
-            newdata=re.sub('<head>','<head>'+code,data)
-            ff.write(newdata)
+#The GTM container is added to Streamlit's index.html once at install time, see install_gtm.py (only warns here if it's missing)
+warn_if_missing()
 
 
-#Load dataset
-DATA_URL = ("https://raw.githubusercontent.com/omartinez182/web-apps/master/GT/Scrape_Sale.csv")
-
 #Create initial titles/subtitles
 st.title("Guatemalaviva")
 st.write('<html lang="es"><html translate="no">', '<h2> Análisis Inmobiliario </h2>', unsafe_allow_html=True)
@@ -42,69 +35,89 @@ st.write('<html lang="es"><html translate="no">', 'De momento, esta es la única
 st.text("")
 st.markdown("<small> Datos recolectados de la Web </br> **Ultima Actualización:** 04/05/2021 </small>", unsafe_allow_html=True)
 
-@st.cache(persist=True) #We use this to cache the info and not load the data every time we scroll up/down
+rerun.section('load')
+#The data and what's computed from it are shared by all the sessions (and processes) of the host, see common/datacache.py
 def load_data(nrows):
-    data = pd.read_csv(DATA_URL, nrows=nrows) #Function to perform some transformation in the dataframe
-    data.dropna(subset=['latitude', 'longitude'], inplace=True)
-    data = data.drop(['Unnamed: 0'], axis=1)
-    return data
-
-#Load 10,000 rows of data
-data = load_data(10000)
+    cache = shared_cache()
+    version = version_key(DATA_PATH, os.path.getmtime(DATA_PATH), nrows) #Changes when the dataset is updated
+    def sorted_listings(): #Only read the columns used in the app, sorted by Tipo/Zone/Bedrooms for ListingIndex
+        data = load_dataset(DATA_PATH, columns=APP_COLUMNS, memory_map=True)[:nrows]
+        return data.sort_values(INDEX_KEYS, kind='mergesort').reset_index(drop=True)
+    data = cache.dataset('gt_listings', version, sorted_listings) #Memory mapped, a single copy for every session
+    index = cache.view('gt_index', version, lambda: ListingIndex(data)) #Each selection is a view (no copies)
+    file_order = lambda: load_dataset(DATA_PATH, columns=APP_COLUMNS, memory_map=True)[:nrows] #Zones listed in order of first appearance, as before the sort
+    cube = cache.view('gt_cube', version, lambda: load_or_build(file_order, DATA_PATH, len(data))) #Counts, medians, means & histograms by Tipo/City/Zone/Bedrooms
+    lines = cache.view('gt_lines', version, lambda: fit_lines(data, ['Tipo', 'Zone'])) #Price_USD ~ Surface regression of every zone
+    def comps_index(): #Imported here, scipy.spatial takes longer to import than the first elements take to render
+        from gt_comps import CompsIndex
+        return CompsIndex(data)
+    load_comps = lambda: cache.view('gt_comps', version, comps_index) #KD-trees of the coordinates by Tipo/Bedrooms, built by the comps section
+    return index, cube, lines, load_comps
+
+#Load 10,000 rows of data (GT_MAX_ROWS changes the limit)
+index, cube, lines, load_comps = load_data(int(os.environ.get('GT_MAX_ROWS', 10000)))
+
+#Monthly median price per m² of every type and zone over all the scrape snapshots, kept up to date by gt_snapshots.py,
+#if the store is empty (first start) it's built from the Scrape_*.csv files, by one process (the others wait for it)
+if series_outdated(SNAPSHOT_STORE):
+    ingest_all(store=SNAPSHOT_STORE, if_empty=True)
+trends = shared_cache().view('gt_trends', version_key(SNAPSHOT_STORE, series_version(SNAPSHOT_STORE)), lambda: read_series(SNAPSHOT_STORE))
 #Create a dropdown to select the type of property
 selected_type = st.selectbox("Seleccionar Tipo de Propiedad", ['Casas','Apartamentos'], key='property_type_box', index=0) #Add a dropdown element
 #Filter depending on the selection
 if (selected_type == 'Casas'):
-    data = data[data['Tipo'] == 42021]
+    tipo = 42021
 else:
-    data = data[data['Tipo'] == 42020]
-#Create copies for other the diffferent sections
-data_tot = data.copy()
-data_stat = data.copy()
-data_stat2 = data.copy()
+    tipo = 42020
 
 
+rerun.section('zone')
 st.header("Análisis de Zona")
 #Create a dropdown to select the zone
-selected_zone = st.selectbox("Seleccionar Zona", data['Zone'].unique(), key='zone_box', index=2) #Add a dropdown element
-data = data[data['Zone'] == selected_zone]
-tot_median = round(data['Price_USD'].median(),2) #Calculate total price median
-m2_median = round(data['Price_m2_USD'].median(),2) #Calculate price per sqmt median
+selected_zone = st.selectbox("Seleccionar Zona", list(cube.lookup('zone', Tipo=tipo)['Zone']), key='zone_box', index=2) #Add a dropdown element
+data = index.select(tipo, selected_zone)
+zone_cell = cube.cell('zone', Tipo=tipo, Zone=selected_zone)
+tot_median = round(zone_cell['median_Price_USD'],2) #Total price median
+m2_median = round(zone_cell['median_Price_m2_USD'],2) #Price per sqmt median
 #Print the average price for the selection & the number of observations available
-st.write('<html lang="es"><html translate="no">', 'El precio medio por m² en', selected_zone, 'es de ', "$"+str("{:,}".format(m2_median)+"."), 'Este calculo fue realizado en base a', str("{:,}".format(data.shape[0])), 'propiedades. El precio medio total es de', "$"+str("{:,}".format(tot_median)+"."), unsafe_allow_html=True)
+st.write('<html lang="es"><html translate="no">', 'El precio medio por m² en', selected_zone, 'es de ', "$"+str("{:,}".format(m2_median)+"."), 'Este calculo fue realizado en base a', str("{:,}".format(int(zone_cell['Count']))), 'propiedades. El precio medio total es de', "$"+str("{:,}".format(tot_median)+"."), unsafe_allow_html=True)
 
 
 st.text("")
+rerun.section('bedrooms')
 st.subheader("Filtra Propiedades dependiendo del # de habitaciones")
+bedroom_cells = cube.lookup('zone_bedrooms', Tipo=tipo, Zone=selected_zone)
 #Catch instances in which all properties have the same number of bedrooms
-if (data['Bedrooms'].nunique() == 1):
-    how_many_bedrooms =  min(data['Bedrooms'])
+if (len(bedroom_cells) == 1):
+    how_many_bedrooms = int(bedroom_cells['Bedrooms'].iloc[0])
 else:
     #Create a slider to select the number of bedrooms
-    how_many_bedrooms = st.slider("Selecciona el # de habitaciones", min(data['Bedrooms']), max(data['Bedrooms']), value=3) #Add a slider element
-#Filter by the selected number of bedrooms
-data_bedrooms = data[data['Bedrooms'] == how_many_bedrooms]
+    how_many_bedrooms = st.slider("Selecciona el # de habitaciones", int(bedroom_cells['Bedrooms'].min()), int(bedroom_cells['Bedrooms'].max()), value=3) #Add a slider element
+#Look up the selected number of bedrooms
+bedrooms_cell = cube.cell('zone_bedrooms', Tipo=tipo, Zone=selected_zone, Bedrooms=how_many_bedrooms)
 #Try and except, for the cases in which there aren't any properties with the selected # of bedrooms
-if (data_bedrooms.shape[0] == 0):
+if (bedrooms_cell['Count'] == 0):
     how_many_bedrooms_2 = 3
+    selected_bedrooms = how_many_bedrooms_2 #The sections below use the # of bedrooms shown here
     st.write('<html lang="es"><html translate="no">', "No pudimos encontrar propiedades con",  str("{:,}".format(how_many_bedrooms)), "habitaciones, en", selected_zone, ". Por lo tanto, hemos decidido mostrar los resultados para propiedades de",  str("{:,}".format(how_many_bedrooms_2)), "habitaciones.", unsafe_allow_html=True)
     st.text("")
-    data_bedrooms = data[data['Bedrooms'] == how_many_bedrooms_2]
-    tot_median_bdr = round(data_bedrooms['Price_USD'].median(),2) #Calculate total price median
-    m2_median_bdr = round(data_bedrooms['Price_m2_USD'].median(),2) #Calculate price per sqmt median
+    bedrooms_cell = cube.cell('zone_bedrooms', Tipo=tipo, Zone=selected_zone, Bedrooms=how_many_bedrooms_2)
+    tot_median_bdr = round(bedrooms_cell['median_Price_USD'],2) #Total price median
+    m2_median_bdr = round(bedrooms_cell['median_Price_m2_USD'],2) #Price per sqmt median
     #Print the average price for the selection of both zone and # of bedrooms
-    st.write('<html lang="es"><html translate="no">', "El precio medio por m² para", selected_zone, ", en propiedades con", str("{:,}".format(how_many_bedrooms_2)), "habitaciones, es de ", "$"+str("{:,}".format(m2_median_bdr)+"."), "Este calculo fue realizado en base a", str("{:,}".format(data_bedrooms.shape[0])),"propiedades. El precio medio total es de", "$"+str("{:,}".format(tot_median_bdr)+"."), unsafe_allow_html=True)
+    st.write('<html lang="es"><html translate="no">', "El precio medio por m² para", selected_zone, ", en propiedades con", str("{:,}".format(how_many_bedrooms_2)), "habitaciones, es de ", "$"+str("{:,}".format(m2_median_bdr)+"."), "Este calculo fue realizado en base a", str("{:,}".format(int(bedrooms_cell['Count']))),"propiedades. El precio medio total es de", "$"+str("{:,}".format(tot_median_bdr)+"."), unsafe_allow_html=True)
     st.text("")
     #Create a map based on a query to the dataframe
-    st.map(data.query("Bedrooms == @how_many_bedrooms_2")[['latitude', 'longitude']].dropna(how = 'any')) #We use the @ to query the variable created for the slider
+    st.map(index.select(tipo, selected_zone, how_many_bedrooms_2)[['latitude', 'longitude']].dropna(how = 'any'))
 else:
-    tot_median_bdr = round(data_bedrooms['Price_USD'].median(),2) #Calculate total price median
-    m2_median_bdr = round(data_bedrooms['Price_m2_USD'].median(),2) #Calculate price per sqmt median
+    selected_bedrooms = how_many_bedrooms
+    tot_median_bdr = round(bedrooms_cell['median_Price_USD'],2) #Total price median
+    m2_median_bdr = round(bedrooms_cell['median_Price_m2_USD'],2) #Price per sqmt median
     #Print the average price for the selection of both zone and # of bedrooms
-    st.write('<html lang="es"><html translate="no">', "El precio medio por m² para", selected_zone, ", en propiedades con", str("{:,}".format(how_many_bedrooms)), "habitaciones, es de ", "$"+str("{:,}".format(m2_median_bdr)+"."), "Este calculo fue realizado en base a", str("{:,}".format(data_bedrooms.shape[0])),"propiedades. El precio medio total es de", "$"+str("{:,}".format(tot_median_bdr)+"."), unsafe_allow_html=True)
+    st.write('<html lang="es"><html translate="no">', "El precio medio por m² para", selected_zone, ", en propiedades con", str("{:,}".format(how_many_bedrooms)), "habitaciones, es de ", "$"+str("{:,}".format(m2_median_bdr)+"."), "Este calculo fue realizado en base a", str("{:,}".format(int(bedrooms_cell['Count']))),"propiedades. El precio medio total es de", "$"+str("{:,}".format(tot_median_bdr)+"."), unsafe_allow_html=True)
     #Create a map based on a query to the dataframe
     st.text("")
-    st.map(data.query("Bedrooms == @how_many_bedrooms")[['latitude', 'longitude']].dropna(how = 'any')) #We use the @ to query the variable created for the slider
+    st.map(index.select(tipo, selected_zone, how_many_bedrooms)[['latitude', 'longitude']].dropna(how = 'any'))
 
 #Disclaimer
 st.markdown(
@@ -115,6 +128,7 @@ st.write('<html lang="es"><html translate="no">', "<small> *No todas las propied
 
 
 st.text("")
+rerun.section('map_3d')
 st.subheader("Propiedades por Precio por m²")
 #Explanation
 st.write('<html lang="es"><html translate="no">', "Este mapa representa la distribución de las propiedades disponibles en", selected_zone, ". La altura y el color de las barras representan el precio en US$ por m².", unsafe_allow_html=True)
@@ -122,6 +136,7 @@ st.text("")
 
 midpoint = (np.average(data['latitude']), np.average(data['longitude']))
 #Create a 3D map with pydeck
+import pydeck as pdk
 st.write(pdk.Deck(
     map_style="mapbox://styles/mapbox/light-v9",
     initial_view_state={
@@ -132,16 +147,13 @@ st.write(pdk.Deck(
     },
     layers=[
         pdk.Layer(
-        "HexagonLayer",
-        data = data[['Price_m2_USD', 'latitude', 'longitude']],
-        get_position = ['longitude', 'latitude'],
-        radius = 50,
-        extruded = True,
+        "ColumnLayer",
         pickable = False,
         elevation_scale = 1,
-        elevation_range = [min(data['Price_m2_USD']),max(data['Price_m2_USD'])],
         auto_highlight = True,
-        coverage=1
+        coverage=1,
+        **column_layer_props(hex_cells(data['latitude'], data['longitude'], radius=50), radius=50, #The hexagons are binned here, only the cells are sent
+                             elevation_range=[min(data['Price_m2_USD']),max(data['Price_m2_USD'])])
         ),
     ],
 ))
@@ -151,16 +163,53 @@ st.write('<html lang="es"><html translate="no">', "<small> *Debido a la forma en
 
 
 st.text("")
+rerun.section('comps')
+st.subheader("Propiedades Comparables")
+st.write('<html lang="es"><html translate="no">', "Propiedades del mismo tipo, con", str(selected_bedrooms), "habitaciones y una superficie similar, más cercanas a un punto (por defecto el centro de", selected_zone, "), en todas las zonas.", unsafe_allow_html=True)
 st.text("")
+comps_latitude = st.number_input("Latitud", value=round(float(midpoint[0]), 4), step=0.001, format="%.4f", key='comps_latitude')
+comps_longitude = st.number_input("Longitud", value=round(float(midpoint[1]), 4), step=0.001, format="%.4f", key='comps_longitude')
+comps_surface = st.number_input("Superficie (m²)", min_value=30, value=150, step=10, key='comps_surface') #Comps within ±25% of the surface
+comps_surface_range = (0.75 * comps_surface, 1.25 * comps_surface)
+comps_search = st.radio("Buscar", ('Las más cercanas', 'Dentro de un radio'), key='comps_search_radio', horizontal=True)
+#Searched in the KD-trees of the selected type and # of bedrooms, see gt_comps.py
+comps = load_comps()
+if comps_search == 'Las más cercanas':
+    comps_k = st.slider("# de propiedades", 5, 50, value=10, key='comps_k_slider')
+    comps_data, comps_median = comps.nearest(comps_latitude, comps_longitude, comps_k, tipo=tipo, bedrooms=selected_bedrooms, surface=comps_surface_range)
+else:
+    comps_radius = st.slider("Radio (m)", 100, 5000, value=1000, step=100, key='comps_radius_slider')
+    comps_data, comps_median = comps.within(comps_latitude, comps_longitude, comps_radius, tipo=tipo, bedrooms=selected_bedrooms, surface=comps_surface_range)
+if len(comps_data) == 0:
+    st.write('<html lang="es"><html translate="no">', "No pudimos encontrar propiedades comparables con estos criterios.", unsafe_allow_html=True)
+else:
+    st.write('<html lang="es"><html translate="no">', "El precio medio por m² de las", str(len(comps_data)), "propiedades comparables es de", "$"+str("{:,}".format(round(comps_median,2))+"."), "La más lejana se encuentra a", str("{:,}".format(int(comps_data['distance_m'].max()))), "m.", unsafe_allow_html=True)
+    st.map(comps_data[['latitude', 'longitude']])
+    st.write(comps_data[['Zone', 'Bedrooms', 'Bathrooms', 'Surface', 'Price_USD', 'Price_m2_USD', 'distance_m']].round(2))
+
+
+st.text("")
+rerun.section('trend')
+st.subheader("Tendencia de Precios")
+zone_trend = trends[(trends['Tipo'] == tipo) & (trends['Zone'] == selected_zone)] #Precomputed when the snapshots are ingested, no snapshot is read here
+st.write('<html lang="es"><html translate="no">', "Precio medio por m² de las", selected_type.lower(), "publicadas cada mes en", selected_zone, ", en todas las bases de datos recolectadas que incluyen el tipo de propiedad (las propiedades publicadas de nuevo al mismo precio se cuentan una vez).", unsafe_allow_html=True)
+import plotly.express as px
+fig_trend = px.line(zone_trend, x='month', y='median_Price_m2_USD', hover_data=['n'],
+                    labels={'month': 'Mes', 'median_Price_m2_USD': 'Precio medio por m² (US$)', 'n': 'Propiedades'})
+fig_trend.update_traces(mode='lines+markers')
+st.plotly_chart(fig_trend, use_container_width=True) #write the figure in the web app and make it responsive
+
+
+st.text("")
+st.text("")
+rerun.section('zone_medians')
 st.header("Precios Medios por Zona")
 #Explanation
 st.write('<html lang="es"><html translate="no">', "El gráfico de barras se encuentra ordenado por el precio medio (mediana). El color de cada barra representa la cantidad de propiedades utilizadas para calcular el precio medio. Por lo general, se puede confiar más en el precio medio muestral cuanto más grande es la cantidad de observaciones utilizadas para su calculo.", unsafe_allow_html=True)
 st.text("")
 
 #Create a multi-select to select the zone
-selected_city = st.multiselect("Seleccionar Ciudad", list(data_tot['City'].unique()), key='city_box', default=["Ciudad de Guatemala"]) #Add a dropdown element
-mask_city = data_tot['City'].isin(selected_city) # Mask to filter dataframe
-data_tot = data_tot[mask_city]
+selected_city = st.multiselect("Seleccionar Ciudad", list(cube.lookup('city_zone', Tipo=tipo)['City'].unique()), key='city_box', default=["Ciudad de Guatemala"]) #Add a dropdown element
 
 #Create a radio button to select the type of price to analyze
 bar_var = st.radio("¿Deseas analizar precios totales (precio de lista) o precios por m²?",('Precios Totales', 'Precios por m²'), key='bar_plot_radio')
@@ -171,10 +220,8 @@ else:
     bar_x = "Price_m2_USD"
 
 
-#Average prices by zone
-df_median = data_tot.groupby('Zone').median() #Group by zone and calculate averages
-df_median = df_median[['Bedrooms','Bathrooms','Surface','Price_USD','Price_m2_USD']]
-df_median['Count'] = data_tot.groupby('Zone').count()['Price_USD']
+#Average prices by zone (for the selected cities)
+df_median = cube.zone_summary(tipo, selected_city, index) #Zones split across the selected cities are read from the index
 df_median = df_median.round()
 df_median = df_median.sort_values(by=bar_x)
 
@@ -194,13 +241,15 @@ st.plotly_chart(fig_bar, use_container_width=True) #write the figure in the web
 st.text("")
 st.text("")
 #Create a scatter plot with the relationship between zone and price
+rerun.section('histogram')
 st.header("Análisis Estadístico")
 st.write('<html lang="es"><html translate="no">', "Esta sección contiene diferentes análisis estadísticos para la zona seleccionada. La idea es entender mejor la distribución de precios de las propiedades, y a un nivel macro, poder tener una idea de que tan importante es el tamaño de los bienes para predecir su precio total.", unsafe_allow_html=True)
 st.text("")
 
 #Create a slider to select the zone
-selected_zone_stat = st.selectbox("Seleccionar Zona", data_stat['Zone'].unique(), key='zone_box_stat', index=2) #Add a dropdown element
-data_stat = data_stat[data_stat['Zone'] == selected_zone_stat]
+selected_zone_stat = st.selectbox("Seleccionar Zona", list(cube.lookup('zone', Tipo=tipo)['Zone']), key='zone_box_stat', index=2) #Add a dropdown element
+data_stat = index.select(tipo, selected_zone_stat)
+stat_cell = cube.cell('zone', Tipo=tipo, Zone=selected_zone_stat)
 
 st.write('<html lang="es"><html translate="no">', "Distribución de precios para propiedades en", selected_zone_stat, ".", unsafe_allow_html=True)
 st.text("")
@@ -213,29 +262,29 @@ if hist_var == 'Precios Totales':
 else:
     hist_x = "Price_m2_USD"
 
-#Create histogram for price by m2 (filtered by zone)
-fig_hist = px.histogram(data_stat, x=hist_x, labels=dict(Price_USD="Precio en US$", Price_m2_USD="Precio por m² (US$)"))
+#Create histogram for price by m2 (filtered by zone), the bins come precomputed in the cube
+hist = cube.histogram(hist_x, {selected_zone_stat: cube.lookup('zone', Tipo=tipo, Zone=selected_zone_stat)})
+fig_hist = px.bar(hist, x='center', y=selected_zone_stat, labels=dict(center="Precio en US$" if hist_x == 'Price_USD' else "Precio por m² (US$)"))
+fig_hist.update_layout(bargap=0)
 fig_hist.layout.yaxis.title.text = 'Número de Propiedades' #Rename y-axis label
 st.plotly_chart(fig_hist, use_container_width=True) #write the figure in the web app and make it responsive
 #Explanation on distinction between mean and median
-st.write('<html lang="es"><html translate="no">', "Nótese que el centro de masa no es el precio medio (mediana) de", "$"+str("{:,}".format(round(data_stat[hist_x].median(),2))), "que se reporta en la sección de Análisis de Zona, sino el precio promedio, el cual es de", "$"+str("{:,}".format(round(data_stat[hist_x].mean(),2))), "para", selected_zone_stat, ".", unsafe_allow_html=True)
+st.write('<html lang="es"><html translate="no">', "Nótese que el centro de masa no es el precio medio (mediana) de", "$"+str("{:,}".format(round(stat_cell['median_' + hist_x],2))), "que se reporta en la sección de Análisis de Zona, sino el precio promedio, el cual es de", "$"+str("{:,}".format(round(stat_cell['mean_' + hist_x],2))), "para", selected_zone_stat, ".", unsafe_allow_html=True)
 st.text("")
 
+rerun.section('scatter')
 st.subheader("Relación entre Precio (US$) y Superficie (m²)")
 #Create scatter plot (filtered by zone)
-fig_scatter = px.scatter(data_stat, x='Surface', y='Price_USD', trendline="ols", color='Price_m2_USD',
+fig_scatter = px.scatter(data_stat, x='Surface', y='Price_USD', color='Price_m2_USD',
                 labels=dict(Surface="Superficie en m²", Price_USD="Precio en US$", Price_m2_USD="Precio por m² (US$)"))
+#Draw the regression line from the precomputed coefficients of the zone
+line = lines.loc[(tipo, selected_zone_stat)]
+r_squared = line['r_squared']
+line_x = np.array([data_stat['Surface'].min(), data_stat['Surface'].max()])
+fig_scatter.add_scatter(x=line_x, y=line['intercept'] + line['slope']*line_x, mode='lines', showlegend=False,
+                        name='OLS', hovertemplate='Precio = %.2f * Superficie + %.2f<br>R² = %.3f<extra></extra>' % (line['slope'], line['intercept'], r_squared))
 st.plotly_chart(fig_scatter, use_container_width=True) #write the figure in the web app and make it responsive
 
-#Get results from the linear regression
-results = px.get_trendline_results(fig_scatter)
-results_summary = results.px_fit_results.iloc[0].summary()
-
-#Note that tables is a list. The table at index 1 is the "core" table. Additionally, read_html puts dfs in a list, so we want index 0
-#Credit to: https://stackoverflow.com/questions/51734180/converting-statsmodels-summary-object-to-pandas-dataframe/52976810
-results_as_html = results_summary.tables[0].as_html()
-reg_results = pd.read_html(results_as_html, header=None, index_col=0)[0] #Read as df
-r_squared = reg_results.loc['Dep. Variable:'][3] #Extract R-Squared
 st.write('<html lang="es"><html translate="no">' ,"En función del modelo desplegado en el gráfico de dispersión, se puede notar que para la", selected_zone_stat, ", el", "{:.0%}".format(r_squared), "de la varianza en el precio puede ser predicha basándose en la cantidad de m² de la propiedad.", unsafe_allow_html=True)
 st.text("")
 st.write('<html lang="es"><html translate="no">', "Cuanto más alto este porcentaje, mayor es la dependencia del precio en función de la superficie. Esto podría indicar que otras variables son menos significativas. Por otra parte, si el porcentaje es bajo, puede ser que otras variables que no están siendo consideradas en este análisis tengan un mayor efecto en el precio, por ejemplo, la plusvalía de la zona, seguridad, proximidad a puntos de interés, etc.", unsafe_allow_html=True)
@@ -245,9 +294,10 @@ st.markdown("""Por último, también se sugiere considerar la cantidad de observ
 
 st.text("")
 #Comparison between Zones
+rerun.section('comparison')
 st.subheader("Comparación de distribución de precios entre Zonas")
-selected_zone_stat2 = st.selectbox("Seleccionar una segunda Zona para realizar la comparación.", data_stat2['Zone'].unique(), key='zone_box_2',index=3) #Add a dropdown element
-data_stat2 = data_stat2[data_stat2['Zone'] == selected_zone_stat2]
+selected_zone_stat2 = st.selectbox("Seleccionar una segunda Zona para realizar la comparación.", list(cube.lookup('zone', Tipo=tipo)['Zone']), key='zone_box_2',index=3) #Add a dropdown element
+stat_cell2 = cube.cell('zone', Tipo=tipo, Zone=selected_zone_stat2)
 
 #Create a radio button to select the type of price to analyze
 comp_hist_var = st.radio("¿Deseas analizar precios totales (precio de lista) o precios por m²?",('Precios Totales', 'Precios por m²'), key='comparison_histogram_radio')
@@ -259,45 +309,41 @@ else:
     comp_hist_x = "Price_m2_USD"
     comp_label = "Precio por m² (US$)"
 
-# Overlay histogram
-compare_hist_df = pd.DataFrame(dict(
-    Zonas=np.concatenate(([selected_zone_stat]*len(data_stat[comp_hist_x]), [selected_zone_stat2]*len(data_stat2[comp_hist_x]))), 
-    data  =np.concatenate((data_stat[comp_hist_x],data_stat2[comp_hist_x]))
-))
+# Overlay histogram (both zones share the same bins)
+compare_hist = cube.histogram(comp_hist_x, {selected_zone_stat: cube.lookup('zone', Tipo=tipo, Zone=selected_zone_stat),
+                                            selected_zone_stat2: cube.lookup('zone', Tipo=tipo, Zone=selected_zone_stat2)})
+compare_hist_df = compare_hist.melt(id_vars=['center'], value_vars=list(dict.fromkeys([selected_zone_stat, selected_zone_stat2])),
+                                    var_name='Zonas', value_name='count')
 
-fig_compare_hist = px.histogram(compare_hist_df, x="data", color="Zonas", barmode="overlay",
-                                labels=dict(data=comp_label))
+fig_compare_hist = px.bar(compare_hist_df, x="center", y="count", color="Zonas", barmode="overlay",
+                          labels=dict(center=comp_label))
+fig_compare_hist.update_layout(bargap=0)
 fig_compare_hist.layout.yaxis.title.text = 'Número de Propiedades'
 st.plotly_chart(fig_compare_hist, use_container_width=True) #write the figure in the web app and make it responsive
 #Summary
-st.write('<html lang="es"><html translate="no">', "El precio promedio para", selected_zone_stat, "es de", "$"+str("{:,}".format(round(data_stat[comp_hist_x].mean(),2))), ", mientras que el precio promedio para", selected_zone_stat2, "es de", "$"+str("{:,}".format(round(data_stat2[comp_hist_x].mean(),2)))+".", unsafe_allow_html=True)
+st.write('<html lang="es"><html translate="no">', "El precio promedio para", selected_zone_stat, "es de", "$"+str("{:,}".format(round(stat_cell['mean_' + comp_hist_x],2))), ", mientras que el precio promedio para", selected_zone_stat2, "es de", "$"+str("{:,}".format(round(stat_cell2['mean_' + comp_hist_x],2)))+".", unsafe_allow_html=True)
 st.text("")
-st.write('<html lang="es"><html translate="no">', "Se recomienda también tomar en cuenta el precio medio debido a que es menos sensible a valores atípicos. El precio medio para", selected_zone_stat, "es de", "$"+str("{:,}".format(round(data_stat[comp_hist_x].median(),2))), ", y para", selected_zone_stat2, "es de", "$"+str("{:,}".format(round(data_stat2[comp_hist_x].median(),2)))+".", unsafe_allow_html=True)
+st.write('<html lang="es"><html translate="no">', "Se recomienda también tomar en cuenta el precio medio debido a que es menos sensible a valores atípicos. El precio medio para", selected_zone_stat, "es de", "$"+str("{:,}".format(round(stat_cell['median_' + comp_hist_x],2))), ", y para", selected_zone_stat2, "es de", "$"+str("{:,}".format(round(stat_cell2['median_' + comp_hist_x],2)))+".", unsafe_allow_html=True)
 
 
 st.text("")
 st.text("")
+rerun.section('raw_data')
 st.subheader("Datos Crudos")
-st.write('<html lang="es"><html translate="no">', 'Al hacer clic en la caja "Mostrar datos", se desplegará la tabla con los datos para la zona seleccionada. Además, es posible descargar la tabla en formato CSV haciendo clic en el enlace que se encuentra debajo de la tabla.', unsafe_allow_html=True)
+st.write('<html lang="es"><html translate="no">', 'Al hacer clic en la caja "Mostrar datos", se desplegará la tabla con los datos para la zona seleccionada. Además, es posible descargar la tabla en formato CSV, CSV comprimido (gzip) o Parquet haciendo clic en el botón que se encuentra debajo de la tabla.', unsafe_allow_html=True)
 st.text("")
 #Review the raw data (dataframe) in the app
 if st.checkbox('Mostrar datos', False): #Creates a checkbox to show/hide the data
     st.write(data)
 
-#Allow users to download the data
-#Credit to: https://discuss.streamlit.io/t/how-to-set-file-download-function/2141
-def get_table_download_link(df):
-    """Generates a link allowing the data in a given panda dataframe to be downloaded
-    in:  dataframe
-    out: href string
-    """
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(
-        csv.encode()
-    ).decode()  # some strings <-> bytes conversions necessary here
-    return f'<a href="data:file/csv;base64,{b64}" download="real_estate_data.csv">Descargar CSV</a>'
-
-st.markdown(get_table_download_link(data), unsafe_allow_html=True)
+#Allow users to download the data, the file is only generated (in chunks) when it's requested, see gt_export.py
+export_formats = {'CSV': 'csv', 'CSV (gzip)': 'csv.gz', 'Parquet': 'parquet'}
+selected_export = st.radio("Formato", list(export_formats), key='export_format_radio', horizontal=True)
+export_format = export_formats[selected_export]
+if st.button('Preparar descarga', key='export_button'):
+    with st.spinner('Generando archivo...'):
+        export = b''.join(export_chunks(data, export_format))
+    st.download_button('Descargar ' + selected_export, export, file_name='real_estate_data.' + export_format, mime=FORMATS[export_format], key='download_button')
 
 
 st.text("")
@@ -315,4 +361,5 @@ hide_streamlit_style = """
             footer {visibility: hidden;}
             </style>
             """
-st.markdown(hide_streamlit_style, unsafe_allow_html=True) 
\ No newline at end of file
+st.markdown(hide_streamlit_style, unsafe_allow_html=True)
+rerun.finish()
@@ -0,0 +1,56 @@
+"""Runs of the dashboard (Streamlit's AppTest, streamlit >= 1.28, see benchmarks/requirements-dev.txt) on
+the first 10,000 rows of Scrape_Sale.parquet, through the comps and export sections.
+
+Run with: python -m pytest GT
+"""
+import os
+import shutil
+
+import pytest
+
+AppTest = pytest.importorskip('streamlit.testing.v1').AppTest
+
+import gt_data  # noqa: E402
+import gt_snapshots  # noqa: E402
+from common import datacache  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'real_estate_gt.py')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app with its data, cube, snapshot store and data cache in tmp_path."""
+    data_path = str(tmp_path / 'Scrape_Sale.parquet')
+    shutil.copy(gt_data.DATA_PATH, data_path)
+    monkeypatch.setattr(gt_data, 'DATA_PATH', data_path)
+    monkeypatch.setattr(gt_snapshots, 'STORE_PATH', str(tmp_path / 'snapshots'))
+    monkeypatch.setenv('DATA_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(datacache, '_shared', None)
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.run()
+    assert not at.exception
+    return at
+
+
+def markdown_with(at, text):
+    return [element.value for element in at.markdown if text in element.value]
+
+
+def test_comps_use_the_bedrooms_shown(app):
+    # Casas in Zona 10 (the defaults) have no listings with 9 bedrooms, the page falls back to 3
+    bedrooms = next(slider for slider in app.slider if slider.label == 'Selecciona el # de habitaciones')
+    bedrooms.set_value(9).run()
+    assert not app.exception
+    assert markdown_with(app, 'No pudimos encontrar propiedades con')
+    assert markdown_with(app, 'Propiedades del mismo tipo, con 3 habitaciones')
+    for search in ('Las más cercanas', 'Dentro de un radio'):
+        app.radio(key='comps_search_radio').set_value(search).run()
+        comps = next(element.value for element in app.dataframe if 'distance_m' in element.value.columns)
+        assert not app.exception and len(comps) and (comps['Bedrooms'] == 3).all()
+
+
+def test_export(app):
+    app.radio(key='export_format_radio').set_value('Parquet').run()
+    app.button(key='export_button').click().run()
+    assert not app.exception
+    assert [element for element in app.get('download_button') if element.proto.label == 'Descargar Parquet']
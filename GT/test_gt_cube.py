@@ -0,0 +1,46 @@
+"""AggregateCube.zone_summary against a groupby of the listings of the selected cities, and the order of its lookups.
+
+Run with: python -m pytest GT
+"""
+import numpy as np
+import pandas as pd
+
+from gt_cube import MEDIAN_COLUMNS, AggregateCube, load_or_build
+from gt_query import INDEX_KEYS, ListingIndex
+
+
+def listings(n=400, seed=0):
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({'Tipo': 42020, 'City': rng.choice(['Ciudad de Guatemala', 'Mixco', 'Villa Nueva'], n),
+                       'Zone': rng.choice(['Zona 1', 'Zona 10', 'Zona 15'], n), 'Bedrooms': rng.randint(1, 5, n),
+                       'Bathrooms': rng.randint(1, 4, n), 'Surface': rng.uniform(60, 300, n).round()})
+    df.loc[df['Zone'] == 'Zona 15', 'City'] = 'Mixco'  # A zone in a single city
+    df['Price_m2_USD'] = rng.uniform(800, 2500, n)
+    df['Price_USD'] = df['Price_m2_USD'] * df['Surface']
+    return df.astype({'City': 'category', 'Zone': 'category'})
+
+
+def test_zone_summary_medians_of_split_zones():
+    df = listings()
+    cube = AggregateCube.build(df)
+    index = ListingIndex(df.sort_values(INDEX_KEYS, kind='mergesort').reset_index(drop=True))
+    for cities in [['Ciudad de Guatemala', 'Mixco'], ['Mixco'], ['Ciudad de Guatemala', 'Mixco', 'Villa Nueva']]:
+        selected = df[df['City'].isin(cities)]
+        expected = selected.groupby(selected['Zone'].astype(str))[MEDIAN_COLUMNS].median()
+        summary = cube.zone_summary(42020, cities, index)
+        pd.testing.assert_frame_equal(summary[MEDIAN_COLUMNS].sort_index(), expected.sort_index(), check_names=False)
+        assert (summary['Count'].sort_index().values == selected['Zone'].astype(str).value_counts().sort_index().values).all()
+    # Without the index the split zones have no medians
+    summary = cube.zone_summary(42020, ['Ciudad de Guatemala', 'Mixco'])
+    assert summary.loc['Zona 1', MEDIAN_COLUMNS].isnull().all() and summary.loc['Zona 15', MEDIAN_COLUMNS].notnull().all()
+
+
+def test_lookup_in_order_of_first_appearance(tmp_path):
+    df = listings()
+    data_path = str(tmp_path / 'listings.parquet')
+    df.to_parquet(data_path)
+    first_seen = list(pd.unique(df['Zone'].astype(str)))
+    # Built from the rows in the order of the file, even when the app only has them sorted
+    cube = load_or_build(lambda: df, data_path, rows=len(df))
+    assert list(cube.lookup('zone', Tipo=42020)['Zone']) == first_seen
+    assert list(load_or_build(lambda: None, data_path, rows=len(df)).lookup('zone', Tipo=42020)['Zone']) == first_seen
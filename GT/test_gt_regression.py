@@ -0,0 +1,29 @@
+"""fit_lines against a per-group np.polyfit, and the groups where the fit is undefined.
+
+Run with: python -m pytest GT
+"""
+import numpy as np
+import pandas as pd
+
+from gt_regression import fit_lines
+
+
+def test_fit_lines_matches_polyfit():
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame({'Zone': rng.choice(['Zona 10', 'Zona 14', 'Zona 15'], 300), 'Surface': rng.uniform(40, 400, 300)})
+    df['Price_USD'] = 1500 * df['Surface'] + rng.normal(0, 20000, 300)
+    fits = fit_lines(df, 'Zone')
+    for zone, rows in df.groupby('Zone'):
+        slope, intercept = np.polyfit(rows['Surface'], rows['Price_USD'], 1)
+        r = np.corrcoef(rows['Surface'], rows['Price_USD'])[0, 1]
+        assert fits.loc[zone, 'n'] == len(rows)
+        np.testing.assert_allclose(fits.loc[zone, ['slope', 'intercept', 'r_squared']].values.astype(float),
+                                   [slope, intercept, r * r], rtol=1e-9)
+
+
+def test_fit_lines_undefined_fits_are_nan():
+    df = pd.DataFrame({'Zone': ['a', 'b', 'b', 'c', 'c'], 'Surface': [50.0, 80, 80, 60, 90],
+                       'Price_USD': [1e5, 1e5, 2e5, 1.5e5, 1.5e5]})
+    fits = fit_lines(df, 'Zone')
+    assert np.isnan(fits.loc['a', 'slope']) and np.isnan(fits.loc['b', 'slope'])  # 1 row, constant Surface
+    assert fits.loc['c', 'slope'] == 0 and np.isnan(fits.loc['c', 'r_squared'])  # constant Price_USD
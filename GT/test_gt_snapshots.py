@@ -0,0 +1,65 @@
+"""The monthly series of the snapshot store, per Tipo and Zone, and the observations it stores.
+
+Run with: python -m pytest GT
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import gt_snapshots
+
+
+def sale_snapshot(tipos, prices, created_at='2021-01-05T18:58:16-06:00'):
+    """Raw Scrape_Sale.csv rows in Zona 10, one listing per price."""
+    n = len(prices)
+    return pd.DataFrame({
+        'City': 'Ciudad de Guatemala', 'Zone': 'Zona 10', 'Tipo': tipos, 'Bedrooms': 3, 'Bathrooms': 2,
+        'Surface': 100.0, 'latitude': 14.6 + np.arange(n) * 0.001, 'longitude': -90.5, 'Price_USD': prices,
+        'created_at': created_at,
+    })
+
+
+def test_series_are_per_tipo(tmp_path):
+    store = str(tmp_path)
+    gt_snapshots.add_snapshot(store, *gt_snapshots.normalize(sale_snapshot(
+        [42021, 42021, 42020, np.nan], [100000.0, 300000.0, 150000.0, 900000.0])))
+    series = gt_snapshots.read_series(store).set_index(['Tipo', 'Zone'])
+    # The listing of unknown Tipo isn't in any of them
+    assert series['median_Price_m2_USD'].to_dict() == {(42021, 'Zona 10'): 2000.0, (42020, 'Zona 10'): 1500.0}
+    assert series['n'].to_dict() == {(42021, 'Zona 10'): 2, (42020, 'Zona 10'): 1}
+
+
+def test_series_without_tipo_are_recomputed(tmp_path):
+    store = str(tmp_path)
+    gt_snapshots.add_snapshot(store, *gt_snapshots.normalize(sale_snapshot([42021, 42020], [100000.0, 150000.0])))
+    # Series written before they were per Tipo
+    old = gt_snapshots.read_series(store).drop(columns='Tipo')
+    pq.write_table(pa.Table.from_pandas(old, preserve_index=False), gt_snapshots.series_path(store))
+    assert gt_snapshots.series_outdated(store)
+    assert gt_snapshots.ingest_all([], store, if_empty=True) == []
+    assert not gt_snapshots.series_outdated(store)
+    assert sorted(gt_snapshots.read_series(store)['Tipo']) == [42020, 42021]
+
+
+def test_only_new_listings_and_price_changes_are_stored(tmp_path):
+    store = str(tmp_path)
+    added = []
+    # Same three listings in every snapshot: the second one changes its price and then goes back to the first one
+    for day, prices in (('01', [100000.0, 200000.0, 300000.0]), ('08', [100000.0, 250000.0, 300000.0]),
+                        ('15', [100000.0, 200000.0, 300000.0])):
+        snapshot, df = gt_snapshots.normalize(sale_snapshot(42021, prices, '2021-02-%sT12:00:00-06:00' % day))
+        added.append(gt_snapshots.add_snapshot(store, snapshot, df)['added'])
+    assert added == [3, 1, 1]
+    latest = gt_snapshots.read_latest(store)
+    assert len(latest) == 3 and sorted(latest['Price_USD']) == [100000.0, 200000.0, 300000.0]
+
+
+def test_missing_latest_prices_are_rebuilt(tmp_path):
+    store = str(tmp_path)
+    gt_snapshots.add_snapshot(store, *gt_snapshots.normalize(sale_snapshot(42021, [100000.0, 200000.0])))
+    os.remove(gt_snapshots.latest_path(store))
+    snapshot, df = gt_snapshots.normalize(sale_snapshot(42021, [100000.0, 250000.0], '2021-02-01T12:00:00-06:00'))
+    assert gt_snapshots.add_snapshot(store, snapshot, df)['added'] == 1
@@ -0,0 +1,36 @@
+"""value_file on a CSV whose later chunks have missing values in the int columns.
+
+Run with: python -m pytest GT
+"""
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from gt_valuation import ValuationModel, value_file
+
+
+def listings(n, seed=0):
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({'Tipo': 42020, 'Zone': rng.choice(['Zona 10', 'Zona 14'], n), 'Bedrooms': rng.randint(1, 5, n),
+                       'Bathrooms': rng.randint(1, 4, n), 'Surface': rng.uniform(60, 300, n), 'id': np.arange(n)})
+    df['Price_m2_USD'] = 1200 + 50 * df['Bedrooms'] + 80 * df['Bathrooms'] + rng.normal(0, 30, n)
+    return df
+
+
+def test_value_file_with_nan_in_a_later_chunk(tmp_path):
+    model = ValuationModel.fit(listings(200))
+    portfolio = listings(6, seed=1).drop(columns='Price_m2_USD')
+    # Written as ints with empty fields: the first chunks are read as int64, the third one as float64
+    csv = portfolio.astype({'Bedrooms': object, 'id': object})
+    csv.loc[4, 'Bedrooms'] = None
+    csv.loc[5, 'id'] = None  # A column that isn't an input
+    csv.to_csv(str(tmp_path / 'portfolio.csv'), index=False)
+    portfolio.loc[4, 'Bedrooms'] = np.nan
+
+    for name in ['valued.parquet', 'valued.csv']:
+        output = str(tmp_path / name)
+        assert value_file(str(tmp_path / 'portfolio.csv'), output, model, chunk_rows=2) == 6
+        valued = pq.read_table(output).to_pandas() if name.endswith('.parquet') else pd.read_csv(output)
+        expected = model.value(portfolio)['est_Price_USD'].values
+        np.testing.assert_allclose(valued['est_Price_USD'].values, expected)
+        assert np.isnan(valued['est_Price_USD'][4]) and not np.isnan(valued['est_Price_USD'][:4]).any()
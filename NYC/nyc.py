@@ -1,64 +1,65 @@
-from pandas import json_normalize
-from sodapy import Socrata
-import plotly.express as px
+#Load libraries (plotly and pydeck are imported where they're used, so the titles render sooner)
 import streamlit as st
-import pydeck as pdk
 import pandas as pd
 import numpy as np
-import requests
-import json
-
-#Query the API
-client = Socrata("data.cityofnewyork.us", None)
+import os
+import sys
 
-# dictionaries by sodapy.
-results = client.get("h9gi-nx95", limit=20000)
-
-# Convert to pandas DataFrame
-DATA_URL = pd.DataFrame.from_records(results)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) #Modules shared by the apps
+from common.datacache import shared_cache, version_key
+from common.hexbin import column_layer_props
+from common.tracing import start_rerun
+from nyc_data import RAW_COLUMNS, parse_collisions
+from nyc_ingest import STORE_PATH, read_store, store_version
+from nyc_views import CollisionViews
 
 
+rerun = start_rerun('nyc') #Times every section of the rerun when APP_TRACE is set, see common/tracing.py
 st.title("Motor Vehicle Collisions in NYC")
 st.markdown("Dashboard to Analyze Collisions in NYC 🗽")
 st.markdown("Built by Eduardo Martinez")
 st.markdown("Data: NYC Open Data API")
 
-#Function to perform some transformacion in the dataframe
-@st.cache(persist = True, allow_output_mutation = True) #We use this to cache the info and not load the data every time we scroll up/down
-def load_data(df, nrows):
-    df['crash_date'] = pd.to_datetime(df['crash_date']) #Parse dates
-    df['crash_time'] = pd.to_datetime(df['crash_time'], format = '%H:%M') #Parse time
-    data = df
-    data.dropna(subset=['latitude', 'longitude'], inplace = True) #Drop missing values (NAs)
-    data['number_of_persons_injured'] = data['number_of_persons_injured'].astype(int)
-    data['number_of_pedestrians_injured'] = data['number_of_pedestrians_injured'].astype(int)
-    data['number_of_cyclist_injured'] = data['number_of_cyclist_injured'].astype(int)
-    data['number_of_motorist_injured'] = data['number_of_motorist_injured'].astype(int)
-    data['latitude'] = data['latitude'].astype(float)
-    data['longitude'] = data['longitude'].astype(float)
-    return data
-
-#Load 100,000 rows
-data = load_data(DATA_URL,20000)
-original_data = data
+rerun.section('load')
+#The collisions are read from the local store kept up to date by nyc_ingest.py (run it on a schedule),
+#if it's empty (first start) it gets the latest 20,000 rows of the dataset, by one process (the others wait for it)
+if store_version(STORE_PATH)[0] == 0:
+    from nyc_ingest import ingest #Imports the fetcher (aiohttp), only needed here
+    ingest(STORE_PATH, max_rows=20000, if_empty=True, latest=True)
 
+#Function to perform some transformacion in the dataframe
+#The data and the views are shared by all the sessions (and processes) of the host, see common/datacache.py
+def load_data(nrows, version): #version (of the store) changes when new rows are ingested, so new data is loaded
+    cache = shared_cache()
+    key = version_key(STORE_PATH, version, nrows)
+    def parsed(): #Latest nrows collisions, compact dtypes (see nyc_data.py), sorted by minute for CollisionViews
+        data = parse_collisions(read_store(STORE_PATH, columns=RAW_COLUMNS, nrows=nrows))
+        return data.iloc[np.argsort(data['crash_minute'].values, kind='mergesort')].reset_index(drop=True)
+    data = cache.dataset('nyc_collisions', key, parsed) #Memory mapped, a single copy for every session
+    return cache.view('nyc_views', key, lambda: CollisionViews(data, radius=100)) #Hours, minute counts, hexagons and street rankings computed once
+
+#Load 100,000 rows (NYC_MAX_ROWS changes the limit)
+views = load_data(int(os.environ.get('NYC_MAX_ROWS', 100000)), store_version(STORE_PATH))
+
+rerun.section('injured_map')
 st.header("Where are the most people injured in NYC?")
 #Create a slider to select the number of people
 injured_people = st.slider("Number of Persons Injured in Vehicle Collisions", 0, 19) #Add a slider element
 #Create a map based on a query to the dataframe
-st.map(data.query("number_of_persons_injured >= @injured_people")[['latitude', 'longitude']].dropna(how = 'any')) #We use the @ to query the variable created for the slider
+st.map(views.injured_at_least(injured_people)) #Crashes sorted by # of persons injured, the selection is a prefix
 
 
+rerun.section('hour_map')
 st.header("How many collisions occur at any given time of the day?")
 #Creaate a slider to select any hour
 hour = st.slider("Select an Hour", 0, 23)
-data = data[data['crash_time'].dt.hour == hour]
-data['crash_time_hour'] = data['crash_time'].dt.hour
+data = views.hour(hour) #Rows of the hour (a view)
 
 
 st.markdown("Vehicle Collisions between %i:00 and %i:00" % (hour, (hour + 1) % 24))
-midpoint = (np.average(data['latitude']), np.average(data['longitude']))
+midpoint = views.hour_midpoints[hour]
 #Create a 3D map with pydeck
+import pydeck as pdk
 st.write(pdk.Deck(
     map_style="mapbox://styles/mapbox/light-v9",
     initial_view_state={
@@ -69,47 +70,39 @@ st.write(pdk.Deck(
     },
     layers=[
         pdk.Layer(
-        "HexagonLayer",
-        data = data[['crash_time_hour', 'latitude', 'longitude']],
-        get_position = ['longitude', 'latitude'],
-        radius = 100,
-        extruded = True,
+        "ColumnLayer",
         pickable = True,
         elevation_scale = 4,
-        elevation_range = [0,1000],
+        **column_layer_props(views.hour_cells[hour], radius=100, elevation_range=[0,1000]) #The hexagons are binned when loading, only the cells are sent
         ),
     ],
 ))
 
 
+rerun.section('minute_histogram')
 #Create a histogram with the number of crashes by minute
 st.subheader("Breakdown by Minute between %i:00 and %i:00" % (hour, (hour +1) % 24))
-filtered = data[
-    (data['crash_time_hour'] >= hour) & (data['crash_time_hour'] < (hour +1))
-]
-#Create the histogram (filtered)
-hist = np.histogram(filtered['crash_time'].dt.minute, bins = 60, range = (0, 60))[0]
+#Crashes by minute of the hour (precomputed 24x60 matrix)
+hist = views.minute_counts[hour]
 chart_data = pd.DataFrame({'minute': range(60), 'crashes': hist}) #Convert histogram data to a dataframe to pass to plotly
 #Create the plotly figure (needs to get passed a dataframe)
+import plotly.express as px
 fig = px.bar(chart_data, x='minute', y='crashes', hover_data = ['minute', 'crashes'], height = 400)
 st.write(fig) #write the figure in the web app
 
 
+rerun.section('top_streets')
 #Create dropdown filters for type of individual involved and Streets
 st.header("Top 5 Dangerous Streets by Type")
 select = st.selectbox('Affected Type of Individual', ['Pedestrians', 'Cyclists', 'Motorists'])
-#Pedestrians injured by on_street_name
-if select == 'Pedestrians':
-    st.write(original_data.query('number_of_pedestrians_injured >= 1')[['on_street_name', 'number_of_pedestrians_injured']].sort_values(by = ['number_of_pedestrians_injured'], ascending = False).dropna(how = 'any')[:5])
-#Cyclists injured by on_street_name
-elif select == 'Cyclists':
-    st.write(original_data.query('number_of_cyclist_injured >= 1')[['on_street_name', 'number_of_cyclist_injured']].sort_values(by = ['number_of_cyclist_injured'], ascending = False).dropna(how = 'any')[:5])
-#Motorist injured by on_street_name
-else:
-    st.write(original_data.query('number_of_motorist_injured >= 1')[['on_street_name', 'number_of_motorist_injured']].sort_values(by = ['number_of_motorist_injured'], ascending = False).dropna(how = 'any')[:5])
+#Streets ranked by the total # of injured of the selected type (over all the crashes in the street)
+st.write(views.top_streets[select])
 
 
+rerun.section('raw_data')
 #Review the raw data (dataframe) in the app
 if st.checkbox('Show Raw Data', False): #Creates a checkbox to show/hide the data
     st.subheader('Raw Data')
     st.write(data)
+
+rerun.finish()
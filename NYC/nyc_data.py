@@ -0,0 +1,55 @@
+"""Typed, compact schema of the collisions used by the NYC dashboard.
+
+The store keeps the values as the API returns them (strings). parse_collisions reads only the
+columns the app uses and converts each one in bulk to a compact dtype. The low-cardinality columns
+(times and injury counts) are parsed once per unique value and mapped back with the codes.
+"""
+import numpy as np
+import pandas as pd
+
+
+INJURY_COLUMNS = ['number_of_persons_injured', 'number_of_pedestrians_injured', 'number_of_cyclist_injured',
+                  'number_of_motorist_injured']
+# Raw columns read from the store
+RAW_COLUMNS = ['crash_date', 'crash_time', 'borough', 'latitude', 'longitude', 'on_street_name'] + INJURY_COLUMNS
+# Columns and dtypes of the parsed frame, crash_time becomes crash_minute (minute of the day)
+DTYPES = {'crash_date': 'datetime64[ns]', 'crash_minute': 'int16', 'borough': 'category', 'latitude': 'float32',
+          'longitude': 'float32', 'on_street_name': 'category', 'number_of_persons_injured': 'int16',
+          'number_of_pedestrians_injured': 'int8', 'number_of_cyclist_injured': 'int8',
+          'number_of_motorist_injured': 'int8'}
+
+
+def parse_unique(values, parse, dtype):
+    """Parses each unique value once and maps the results back to the rows (missing values give 0)."""
+    codes, uniques = pd.factorize(values)
+    lookup = np.array([parse(value) for value in uniques] + [0], dtype=dtype)
+    return lookup[codes]  # code -1 (missing) takes the last entry
+
+
+def minute_of_day(text):
+    hours, minutes = text.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_collisions(raw):
+    """Parses the raw collisions (strings) into DTYPES, dropping the rows without coordinates.
+    in:  dataframe with (at least) RAW_COLUMNS
+    out: dataframe with the columns of DTYPES
+    """
+    latitude = raw['latitude'].astype('float32').values  # None -> NaN
+    longitude = raw['longitude'].astype('float32').values
+    located = ~(np.isnan(latitude) | np.isnan(longitude))
+    raw = raw[located]
+
+    df = pd.DataFrame({
+        # Floating timestamps like 2021-04-05T00:00:00.000, only the date part is used
+        'crash_date': np.asarray(raw['crash_date'].str[:10], dtype='datetime64[D]').astype('datetime64[ns]'),
+        'crash_minute': parse_unique(raw['crash_time'], minute_of_day, 'int16'),
+        'borough': raw['borough'].astype('category'),
+        'latitude': latitude[located],
+        'longitude': longitude[located],
+        'on_street_name': raw['on_street_name'].astype('category'),
+    }, columns=list(DTYPES))
+    for col in INJURY_COLUMNS:
+        df[col] = parse_unique(raw[col], int, DTYPES[col])
+    return df.reset_index(drop=True)
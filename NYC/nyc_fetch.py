@@ -0,0 +1,134 @@
+"""Concurrent page fetcher for the Socrata API.
+
+The pages after a high-water mark are requested by $offset, several at a time (bounded by
+concurrency) over a pool of keep-alive connections, and handed out in order. Pages of the CSV
+endpoint (/resource/<id>.csv) are parsed by pyarrow.csv straight into the Arrow columns of the
+schema, no Python object is built per row or value. Pages of the JSON endpoint are decoded through
+json.loads (a dict per row), for the resources that are only served as JSON.
+Failed requests (connection errors, timeouts, 429 and 5xx) are retried with exponential backoff.
+
+    async for table in fetch_pages(url, params, schema, page_size=50000, concurrency=8):
+        ...
+"""
+import asyncio
+import json
+import random
+
+import aiohttp
+import pyarrow as pa
+from pyarrow import csv
+
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    pass
+
+
+def decode_csv_page(body, schema):
+    """CSV with a header row (empty values and missing columns are nulls) to a table with the schema."""
+    if not body.strip():
+        return schema.empty_table()
+    return csv.read_csv(pa.py_buffer(body), parse_options=csv.ParseOptions(newlines_in_values=True),
+                        convert_options=csv.ConvertOptions(column_types=schema, include_columns=schema.names,
+                                                           include_missing_columns=True, strings_can_be_null=True))
+
+
+def decode_json_page(body, schema):
+    """JSON array of rows (missing fields are nulls) to a table with the schema."""
+    rows = json.loads(body)
+    return pa.Table.from_arrays([pa.array([row.get(field.name) for row in rows], type=field.type) for field in schema],
+                                schema=schema)
+
+
+def decode_page(body, schema, url=''):
+    """Page of the endpoint at url to a table with the schema (CSV unless the url ends with .json)."""
+    return decode_json_page(body, schema) if url.endswith('.json') else decode_csv_page(body, schema)
+
+
+class ColumnBuffers:
+    """Tables appended page by page, taken out as one table (e.g. when enough rows are buffered)."""
+    def __init__(self, schema):
+        self.schema = schema
+        self.tables = []
+        self.num_rows = 0
+
+    def append(self, table):
+        self.tables.append(table)
+        self.num_rows += table.num_rows
+
+    def take(self):
+        table = pa.concat_tables(self.tables) if self.tables else self.schema.empty_table()
+        self.tables, self.num_rows = [], 0
+        return table
+
+
+async def get_page(session, url, params, retries=5, backoff=0.5):
+    """Body of the response, retrying with exponential backoff (and jitter) on transient errors."""
+    for attempt in range(retries + 1):
+        delay = backoff * 2**attempt * random.uniform(0.5, 1.5)
+        try:
+            async with session.get(url, params=params) as response:
+                if response.status == 200:
+                    return await response.read()
+                if response.status not in RETRY_STATUS:
+                    raise FetchError('%s returned %i' % (url, response.status))
+                retry_after = response.headers.get('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+                error = FetchError('%s returned %i' % (url, response.status))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = e
+        if attempt < retries:
+            await asyncio.sleep(delay)
+    raise FetchError('%s failed after %i retries: %s' % (url, retries, error))
+
+
+async def fetch_pages(url, params, schema, page_size, concurrency=8, max_rows=None, headers=None,
+                      retries=5, backoff=0.5, timeout=60):
+    """Yields the pages of a query in order, as tables with the schema.
+    in:  resource URL, SoQL parameters of the query (without $limit/$offset), schema of the rows,
+         rows per page, # of requests in flight, optional maximum # of rows
+    The query must have a stable order ($order on a unique key) so that pages don't overlap.
+    """
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, headers=headers, timeout=timeout) as session:
+        tasks, cancelled = {}, []
+        next_page, end = 0, None  # end: index of the first page past the last row, once known
+
+        def schedule():
+            nonlocal next_page
+            while len(tasks) < concurrency and end is None:
+                offset = next_page * page_size
+                if max_rows is not None and offset >= max_rows:
+                    break
+                limit = page_size if max_rows is None else min(page_size, max_rows - offset)
+                page_params = dict(params, **{'$limit': limit, '$offset': offset})
+                tasks[next_page] = (limit, asyncio.ensure_future(get_page(session, url, page_params, retries, backoff)))
+                next_page += 1
+
+        try:
+            schedule()
+            page = 0
+            while page in tasks:
+                limit, task = tasks[page]
+                table = decode_page(await task, schema, url)
+                del tasks[page]
+                if table.num_rows < limit:
+                    end = page + 1
+                    # Requests for pages past the end aren't needed
+                    for _, other in tasks.values():
+                        other.cancel()
+                        cancelled.append(other)
+                    tasks.clear()
+                if table.num_rows:
+                    yield table
+                page += 1
+                schedule()
+        finally:
+            for _, task in tasks.values():
+                task.cancel()
+                cancelled.append(task)
+            await asyncio.gather(*cancelled, return_exceptions=True)
@@ -0,0 +1,236 @@
+"""Incremental ingestion of the NYC Motor Vehicle Collisions dataset (h9gi-nx95) into a local store.
+
+The dataset is read from the Socrata API in pages ordered by (crash_date, collision_id). The
+high-water mark is the latest crash_date in the store. A run asks for the rows from LOOKBACK_DAYS
+before it on: collisions are often reported days after they happen, with a crash_date before the
+mark, and would be missed by a query for the rows after it. The rows of the window that are already
+stored are skipped by collision_id, so a run only adds new rows and an interrupted backfill resumes
+where it stopped. The pages are fetched concurrently (see nyc_fetch.py).
+
+The store is a directory of Parquet parts (part-000000.parquet, ...), each one sorted and written
+atomically. A run holds a lock on the store, so runs that overlap (cron and the first start of the
+app) take turns instead of writing the same rows twice. Late rows go to the part of the run that found them, so the parts are sorted but the
+store as a whole is only sorted within the lookback window. The dashboard reads the store instead
+of calling the API.
+
+Usage: python nyc_ingest.py [--store DIR] [--url URL] [--max-rows N] [--concurrency N] [--lookback-days N]
+Run it on a schedule (e.g. cron) to keep the store up to date.
+"""
+import argparse
+import asyncio
+import glob
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:  # Windows, runs aren't serialized across processes
+    fcntl = None
+
+
+# The CSV endpoint: same fields and values as the JSON one, decoded without building a dict per row
+RESOURCE_URL = 'https://data.cityofnewyork.us/resource/h9gi-nx95.csv'
+# NYC_STORE_PATH points the app to another store (e.g. the synthetic ones of the benchmarks)
+STORE_PATH = os.environ.get('NYC_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'collisions'))
+# Columns requested from the API (everything the dashboard uses)
+COLUMNS = ['crash_date', 'crash_time', 'borough', 'latitude', 'longitude', 'on_street_name',
+           'number_of_persons_injured', 'number_of_pedestrians_injured', 'number_of_cyclist_injured',
+           'number_of_motorist_injured', 'collision_id']
+# The store keeps the values as the API returns them (strings)
+SCHEMA = pa.schema([(col, pa.string()) for col in COLUMNS])
+PAGE_SIZE = 50000
+# Page requests in flight
+CONCURRENCY = 8
+# Rows buffered before a part is written
+PART_ROWS = 500000
+# Days before the high-water mark fetched again on every run, for the collisions reported late
+LOOKBACK_DAYS = 30
+# Format of crash_date in the API (floating timestamps)
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.000'
+
+
+@contextmanager
+def store_lock(store):
+    """Exclusive lock of the store between processes, held for a whole run."""
+    os.makedirs(store, exist_ok=True)
+    with open(os.path.join(store, '.lock'), 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def part_paths(store):
+    return sorted(glob.glob(os.path.join(store, 'part-*.parquet')))
+
+
+def latest_date(path):
+    """Latest crash_date of a part, from the statistics of its row groups when they have them."""
+    metadata = pq.ParquetFile(path).metadata
+    column = metadata.schema.names.index('crash_date')
+    latest = None
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(column).statistics
+        if statistics is None or not statistics.has_min_max:
+            dates = pq.read_table(path, columns=['crash_date']).column('crash_date').to_pandas()
+            return dates.max() if dates.notnull().any() else None
+        value = statistics.max.decode() if isinstance(statistics.max, bytes) else statistics.max
+        latest = value if latest is None else max(latest, value)
+    return latest
+
+
+def high_water_mark(store):
+    """Latest crash_date in the store, None if the store is empty."""
+    dates = [date for date in map(latest_date, part_paths(store)) if date is not None]
+    return max(dates) if dates else None
+
+
+def window_start(mark, lookback_days=LOOKBACK_DAYS):
+    """crash_date from which a run fetches the rows again, None (everything) if there is no mark."""
+    if mark is None:
+        return None
+    return (pd.Timestamp(mark) - pd.Timedelta(days=lookback_days)).strftime(DATE_FORMAT)
+
+
+def query_params(since, columns=COLUMNS):
+    """SoQL parameters of the query for the rows with a crash_date on or after since (None: all the rows)."""
+    params = {'$select': ','.join(columns), '$order': 'crash_date,collision_id'}
+    if since is not None:
+        params['$where'] = "crash_date >= '%s'" % since
+    return params
+
+
+def stored_ids(store, since):
+    """collision_id of the rows of the store with a crash_date on or after since, as a set."""
+    parts = part_paths(store)
+    if since is None or not parts:
+        return set()
+    # The parts are sorted, the statistics of their row groups skip the ones before the window
+    ids = ds.dataset(parts, format='parquet').to_table(columns=['collision_id'], filter=ds.field('crash_date') >= since)
+    return set(ids.column('collision_id').to_pylist())
+
+
+def write_part(store, table):
+    """Writes the rows as the next part of the store (write to a temporary file, then rename)."""
+    parts = part_paths(store)
+    index = int(os.path.basename(parts[-1])[5:11]) + 1 if parts else 0
+    path = os.path.join(store, 'part-%06i.parquet' % index)
+    pq.write_table(table, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def new_rows(table, seen):
+    """The rows of the table whose collision_id isn't in seen (the ids kept are added to it)."""
+    new = np.ones(table.num_rows, dtype=bool)
+    for row, collision_id in enumerate(table.column('collision_id').to_pylist()):
+        if collision_id in seen:
+            new[row] = False
+        seen.add(collision_id)
+    return table if new.all() else table.filter(pa.array(new))
+
+
+async def ingest_pages(store, url, since, seen, max_rows, page_size, part_rows, concurrency, headers):
+    """Writes the rows from since on that aren't in seen (collision_ids) to the store, a part every part_rows rows."""
+    from nyc_fetch import ColumnBuffers, fetch_pages  # aiohttp is only imported by the runs that fetch
+    buffers = ColumnBuffers(SCHEMA)
+    fetched, added, parts, mark = 0, 0, [], None
+    async for table in fetch_pages(url, query_params(since), SCHEMA, page_size, concurrency, max_rows, headers):
+        fetched += table.num_rows
+        mark = table.column('crash_date')[-1].as_py()
+        buffers.append(new_rows(table, seen))
+        if buffers.num_rows >= part_rows:
+            added += buffers.num_rows
+            parts.append(write_part(store, buffers.take()))
+    if buffers.num_rows:
+        added += buffers.num_rows
+        parts.append(write_part(store, buffers.take()))
+    return fetched, added, parts, mark
+
+
+async def latest_rows(url, max_rows, page_size, concurrency, headers):
+    """The latest max_rows rows of the dataset (requested newest first) as a table sorted by crash_date, collision_id."""
+    from nyc_fetch import ColumnBuffers, fetch_pages
+    params = dict(query_params(None), **{'$order': 'crash_date DESC,collision_id DESC'})
+    buffers = ColumnBuffers(SCHEMA)
+    async for table in fetch_pages(url, params, SCHEMA, page_size, concurrency, max_rows, headers):
+        buffers.append(table)
+    table = buffers.take()
+    return table.take(pa.array(np.arange(table.num_rows - 1, -1, -1)))
+
+
+def ingest(store=STORE_PATH, url=RESOURCE_URL, max_rows=None, page_size=PAGE_SIZE, part_rows=PART_ROWS,
+           concurrency=CONCURRENCY, app_token=None, lookback_days=LOOKBACK_DAYS, if_empty=False, latest=False):
+    """Appends the rows of the last lookback_days before the high-water mark of the store and after it
+    that aren't in the store yet. The store is locked meanwhile, with if_empty nothing is fetched if
+    it already has rows (first start of the app: one process fills it, the others wait for it).
+    With latest, an empty store gets the latest max_rows rows of the dataset instead of the oldest
+    ones (the next runs go on from them).
+    in:  store directory, resource URL, optional maximum # of rows to fetch in this run
+    out: dict with the # of rows added and fetched, the parts written, the seconds it took and the new high-water mark
+    """
+    app_token = app_token or os.environ.get('SOCRATA_APP_TOKEN')
+    headers = {'X-App-Token': app_token} if app_token else None
+    start = time.perf_counter()
+    with store_lock(store):
+        mark = high_water_mark(store)
+        if if_empty and mark is not None:
+            return {'rows': 0, 'fetched': 0, 'parts': [], 'seconds': time.perf_counter() - start, 'high_water_mark': mark}
+        if latest and mark is None:
+            table = asyncio.run(latest_rows(url, max_rows, page_size, concurrency, headers))
+            fetched = added = table.num_rows
+            parts = [write_part(store, table)] if table.num_rows else []
+            last = table.column('crash_date')[-1].as_py() if table.num_rows else None
+        else:
+            since = window_start(mark, lookback_days)
+            fetched, added, parts, last = asyncio.run(ingest_pages(store, url, since, stored_ids(store, since), max_rows,
+                                                                   page_size, part_rows, concurrency, headers))
+    mark = max(filter(None, [mark, last]), default=None)
+    return {'rows': added, 'fetched': fetched, 'parts': parts, 'seconds': time.perf_counter() - start,
+            'high_water_mark': mark}
+
+
+def read_store(store=STORE_PATH, columns=None, nrows=None):
+    """The rows of the store (the last nrows ingested if given) as a dataframe, in the order of the parts."""
+    tables, total = [], 0
+    for path in reversed(part_paths(store)):
+        table = pq.read_table(path, columns=columns)
+        tables.append(table)
+        total += table.num_rows
+        if nrows is not None and total >= nrows:
+            break
+    if not tables:
+        return pd.DataFrame(columns=columns or COLUMNS)
+    df = pa.concat_tables(tables[::-1]).to_pandas()
+    return df if nrows is None else df[-nrows:].reset_index(drop=True)
+
+
+def store_version(store=STORE_PATH):
+    """Changes whenever a part is added, to key the caches of the dashboard."""
+    parts = part_paths(store)
+    return (len(parts), os.path.getmtime(parts[-1])) if parts else (0, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', default=STORE_PATH)
+    parser.add_argument('--url', default=RESOURCE_URL)
+    parser.add_argument('--max-rows', type=int)
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--lookback-days', type=int, default=LOOKBACK_DAYS)
+    args = parser.parse_args()
+    result = ingest(args.store, args.url, args.max_rows, args.page_size, concurrency=args.concurrency,
+                    lookback_days=args.lookback_days)
+    print('%i rows added (%i fetched) in %.1f s (%i parts), high-water mark %s' % (result['rows'], result['fetched'],
+          result['seconds'], len(result['parts']), result['high_water_mark']))
+
+
+if __name__ == '__main__':
+    main()
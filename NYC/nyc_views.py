@@ -0,0 +1,60 @@
+"""Precomputed views of the collisions for the NYC dashboard.
+
+Built once when the data is loaded, so every slider or selectbox change is a lookup:
+  - the rows sorted by minute of the day, each hour being a contiguous range (a view, no filtering)
+  - a 24x60 matrix with the # of crashes per minute of every hour
+  - the hexagon cells and the midpoint of the 3D map for every hour
+  - the coordinates sorted by # of persons injured, so "at least k injured" is a prefix
+  - the injuries per street (totals over all the crashes) and the top streets per type of victim
+"""
+import numpy as np
+import pandas as pd
+
+from common.hexbin import hex_cells
+
+
+VICTIMS = {'Pedestrians': 'number_of_pedestrians_injured', 'Cyclists': 'number_of_cyclist_injured',
+           'Motorists': 'number_of_motorist_injured'}
+TOP_K = 5
+
+
+class CollisionViews:
+    def __init__(self, df, radius=100, top_k=TOP_K):
+        minutes = df['crash_minute'].values
+        if (minutes[1:] >= minutes[:-1]).all() and df.index.equals(pd.RangeIndex(len(df))):
+            self.data = df  # Already sorted by minute (e.g. the shared copy of the cache), used as is
+        else:
+            self.data = df.iloc[np.argsort(minutes, kind='mergesort')].reset_index(drop=True)
+        self.minute_counts = np.bincount(minutes, minlength=24*60).reshape(24, 60)
+        self.hour_starts = np.r_[0, np.cumsum(self.minute_counts.sum(axis=1))]
+
+        # 3D map of every hour, binned over the same origin
+        origin = (df['latitude'].mean(), df['longitude'].mean())
+        self.hour_cells, self.hour_midpoints = [], []
+        for hour in range(24):
+            rows = self.hour(hour)
+            self.hour_cells.append(hex_cells(rows['latitude'], rows['longitude'], radius, origin=origin))
+            self.hour_midpoints.append((rows['latitude'].mean(), rows['longitude'].mean()) if len(rows) else origin)
+
+        # Coordinates by # of persons injured (descending), injured_counts[k]: # of crashes with at least k
+        injured = df['number_of_persons_injured'].values
+        order = np.argsort(-injured.astype('int32'), kind='mergesort')
+        self.injured_points = df[['latitude', 'longitude']].iloc[order].reset_index(drop=True)
+        self.injured_counts = np.cumsum(np.bincount(injured, minlength=1)[::-1])[::-1]
+
+        # Injuries per street, summed over all the crashes on it
+        totals = df.groupby('on_street_name', observed=True)[list(VICTIMS.values())].sum()
+        self.street_totals = totals
+        self.top_streets = {}
+        for victim, col in VICTIMS.items():
+            top = totals[totals[col] >= 1][col].sort_values(ascending=False, kind='mergesort')[:top_k]
+            self.top_streets[victim] = pd.DataFrame({'on_street_name': top.index.astype(str), col: top.values})
+
+    def hour(self, hour):
+        """Crashes between hour:00 and hour+1:00, as a view of the sorted frame."""
+        return self.data.iloc[self.hour_starts[hour]:self.hour_starts[hour + 1]]
+
+    def injured_at_least(self, k):
+        """Coordinates of the crashes with at least k persons injured."""
+        count = self.injured_counts[k] if k < len(self.injured_counts) else 0
+        return self.injured_points.iloc[:count]
@@ -1,63 +1,85 @@
-def process_dataset(df):
-    df['location_new'] = df.locations 
-    df['location_new'] = df.location_new.map(lambda x: x.strip('[]')) #Remove brackets
-    
-    # Define function to convert strings into Dict
-    def string_to_dict(dict_string):
-        # Convert to proper json format
-        dict_string = dict_string.replace("'", '"')
-        return json.loads(dict_string)
-
-    # Apply the function to the whole column & convert strings to Dict
-    df.location_new = df.location_new.apply(string_to_dict)
-    
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import QuantileSketch
+# GT/gt_data.py writes the typed output (Parquet/Arrow IPC with compact dtypes) the GT app loads
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'GT'))
+import gt_data  # noqa: E402
+
+
+# Patterns used to pull the values out of the raw scrape strings in a single compiled pass per column
+LOCATION_PATTERN = r"'lat':\s*([-+0-9.eE]+),\s*'lon':\s*([-+0-9.eE]+)"
+# "parameters" holds several dicts, the first four are (in order) Tipo, Bedrooms, Bathrooms and Surface.
+# Only the body of those four is captured, the rest of the dicts are never materialized.
+PARAMETERS_PATTERN = r"\{([^{}]*)\},\s\{([^{}]*)\},\s\{([^{}]*)\},\s\{([^{}]*)\}"
+VALUE_PATTERN = r"'value':\s*('[^']*'|[^,\s]+)"
+PARAMETERS = ['Tipo', 'Bedrooms', 'Bathrooms', 'Surface']
+# Columns that identify a listing when dropping duplicates
+DEDUP_COLUMNS = ['latitude','longitude','Price_USD']
+# Quantiles needed for the outlier fences: 2% for the left tail of Price_m2_USD, Q1 & Q3 for the IQR fences
+FENCE_QUANTILES = [0.02, 0.25, 0.75]
+
+# Post-2021 set
+OUTPUT_COLUMNS = ['id','created_at','title','images','display_date','user_id',
+                  'created_at_first','City','latitude', 'longitude', 'Tipo', 'Bedrooms','Bathrooms', 'Surface',
+                  'Zone', 'Zone_Val','Price_USD', 'Price_m2_USD']
+# Outputs written typed through gt_data, any other extension is written as csv
+TYPED_EXTENSIONS = ('.parquet', '.arrow', '.feather')
+
+
+def decode_values(tokens):
+    """Decodes the raw value tokens (e.g. '3' or 42020) the same way json.loads would.
+    Only the unique tokens are decoded, which is cheap since these columns have very low cardinality.
+    in:  series of str tokens
+    out: series of decoded values
+    """
+    lookup = {token: json.loads(token.replace("'", '"')) for token in tokens.dropna().unique()}
+    return tokens.map(lookup)
+
+
+def parse_listings(df):
+    """Row-local part of the preprocessing: parses the raw scrape columns, converts prices to USD
+    and computes the price per m². Every step only looks at one row, so it can run per chunk.
+    in:  raw scrape dataframe
+    out: parsed dataframe (not deduplicated and without outliers removed)
+    """
     # Create new lat & longitude columns
-    df['latitude'] = df.location_new.map(lambda x: x['lat'])
-    df['longitude'] = df.location_new.map(lambda x: x['lon'])
-    
-    # Split text to columns we do this because there are several "dicts" inside the string
-    df[['1','2','3','4','5','6','7','8','9']] = df['parameters'].str.split('(?<=},)\s', expand=True)
-    
-    # Rename columns
-    df = df.rename(columns={"locations_resolved.ADMIN_LEVEL_3_name":"City","1": "Tipo", "2": "Bedrooms", 
-                            "3":"Bathrooms", "4":"Surface"})
-    df = df.drop(['5','6','7','8','9'], axis=1)
-    
+    location = df['locations'].str.extract(LOCATION_PATTERN)
+    df['latitude'] = pd.to_numeric(location[0])
+    df['longitude'] = pd.to_numeric(location[1])
+
+    # Extract the body of the first four dicts, rows with less than four dicts get NaN
+    params = df['parameters'].str.extract(PARAMETERS_PATTERN)
+    params.columns = PARAMETERS
+    df = df.rename(columns={"locations_resolved.ADMIN_LEVEL_3_name":"City"})
+
     # Drop rows with missing values
-    df = df.dropna(subset=["Bedrooms","Bathrooms","Surface"])
-    
-    #Remove brackets and comma at the end
-    df.Tipo = df.Tipo.map(lambda x: x.strip('[],')) 
-    df.Bedrooms = df.Bedrooms.map(lambda x: x.strip('[],')) 
-    df.Bathrooms = df.Bathrooms.map(lambda x: x.strip('[],'))
-    df.Surface = df.Surface.map(lambda x: x.strip('[],'))
-    
-    # Apply the function to the whole column & convert strings to Dict
-    df.Tipo = df.Tipo.apply(string_to_dict)
-    df.Bedrooms = df.Bedrooms.apply(string_to_dict)
-    df.Bathrooms = df.Bathrooms.apply(string_to_dict)
-    df.Surface = df.Surface.apply(string_to_dict)
-    
+    params = params.dropna(subset=["Bedrooms","Bathrooms","Surface"])
+    df = df.loc[params.index]
+
     # Assign only the values to the columns (values from the dict)
-    df['Tipo'] = [d.get('value') for d in df["Tipo"]]
-    df['Bedrooms'] = [d.get('value') for d in df["Bedrooms"]]
-    df['Bathrooms'] = [d.get('value') for d in df["Bathrooms"]]
-    df['Surface'] = [d.get('value') for d in df["Surface"]]
-    
+    for var in PARAMETERS:
+        df[var] = decode_values(params[var].str.extract(VALUE_PATTERN, expand=False))
+
     # Define list of variables to be converted from str to int
     var_obs = ['Bedrooms','Bathrooms']
 
     # Loop through the list to change the variable type
     for var in var_obs:
         df[var] = df[var].astype('int64')
-    
+
     # Create a new column with the zone, which is the same as the one we already have (it might be useful to have a copy later)
     df['Zone'] = df['locations_resolved.SUBLOCALITY_LEVEL_1_name']
     # Drop rows in which the Zone value is missing
     df = df.dropna(subset=['Zone'])
     # Create a new column with only the int value of each Zone
-    df['Zone_Val'] = df['Zone'].str.extract('(\d+)').astype(int)
-    
+    df['Zone_Val'] = df['Zone'].str.extract(r'(\d+)', expand=False).astype(int)
+
     # Create a new column price, which is exactly the same as the one we have already but we'll use this one to
     #transform values in Q to USD, so we have a single column with all of the prices in USD.
     df['Price_USD'] = df['price.value.raw']
@@ -65,42 +87,168 @@ def process_dataset(df):
     # Select all of the rows that have the price in Q and then we apply a transformation to have everything in USD
     df.loc[df['price.value.currency.pre'] == 'Q', 'Price_USD'] = df['Price_USD']/7.65
     df['Price_USD'] = round(df['Price_USD'],2) #Round to only two digits
-    
+
     # Exclude the rows in which "Surface" contains "hasta"
     df = df[~df.Surface.str.contains("hasta")]
-    
+
     # Create a new column for price per square meter
     df['Surface'] = df['Surface'].astype('float64') # Convert surface from str to int
     df['Price_m2_USD'] = round(df['Price_USD']/df['Surface'],2)
-    
+    return df
+
+
+def process_dataset(df):
+    df = parse_listings(df)
+
     # Drop duplicates based on specific columns
-    df = df.drop_duplicates(subset=['latitude','longitude','Price_USD'])
-    
+    df = df.drop_duplicates(subset=DEDUP_COLUMNS)
+
     # Drop properties with less than 30 sqmts (surface)
     df = df[df['Surface'] >= 30]
-    
+
     # REMOVE OUTLIERS
-    # set up the capper (right) 
-    capper_right = outr.OutlierTrimmer(distribution='skewed', tail='right', fold=2, variables=['Surface','Price_m2_USD'])
-    # fit the capper (right)
-    capper_right.fit(df)
-    # transform the data
-    df2 = capper_right.transform(df)
-    
-    # set up the capper (left) 
-    capper_left = outr.OutlierTrimmer(distribution='quantiles', tail='left', fold=0.02, variables=['Price_m2_USD'])
-    # fit the capper (left)
-    capper_left.fit(df)
-    # transform the data
-    df3 = capper_left.transform(df2)
-    
+    # Both fences are fitted on the same rows (the left one is not fitted on the right-trimmed set),
+    # so they're taken from a single quantile pass and applied in a single filtering pass.
+    fences = compute_fences(np.quantile(df['Surface'], FENCE_QUANTILES),
+                            np.quantile(df['Price_m2_USD'], FENCE_QUANTILES))
+    df3 = trim_outliers(df, fences)
+
     # Pre-2021 set
     '''columns = ['id','republish_date','created_at','title','valid_to','images','revision','display_date','user_id',
-           'created_at_first','City','latitude', 'longitude', 'Tipo', 'Bedrooms','Bathrooms', 'Surface', 
+           'created_at_first','City','latitude', 'longitude', 'Tipo', 'Bedrooms','Bathrooms', 'Surface',
            'Zone', 'Zone_Val','Price_USD', 'Price_m2_USD']'''
-    # Post-2021 set
-    columns = ['id','created_at','title','images','display_date','user_id',
-           'created_at_first','City','latitude', 'longitude', 'Tipo', 'Bedrooms','Bathrooms', 'Surface', 
-           'Zone', 'Zone_Val','Price_USD', 'Price_m2_USD']
-    df3 = df3[columns]
-    return df3
\ No newline at end of file
+    df3 = df3[OUTPUT_COLUMNS]
+    return df3
+
+
+# STREAMING MODE
+# The functions below process raw scrape files chunk by chunk, so peak memory scales with the chunk size
+# instead of the dataset size. The row-local steps run per chunk and only the state needed for the global
+# steps (hashes of the deduplication keys and the quantile sketches for the outlier fences) is kept.
+
+class Deduplicator:
+    """Drops listings whose (latitude, longitude, Price_USD) key was already seen in a previous chunk.
+    Only a sorted array with the 64-bit hash of each key is kept in memory.
+    """
+    def __init__(self):
+        self.seen = np.array([], dtype='uint64')
+
+    def keep(self, keys):
+        """Returns a mask with the keys that weren't seen before and marks them as seen."""
+        # Look up the keys in the sorted array of keys seen so far
+        pos = np.minimum(np.searchsorted(self.seen, keys), max(len(self.seen) - 1, 0))
+        seen_before = self.seen[pos] == keys if len(self.seen) else np.zeros(len(keys), dtype=bool)
+        # Keep the first occurrence inside the chunk, same as drop_duplicates
+        keep = ~seen_before & ~pd.Series(keys).duplicated().values
+        self.seen = np.union1d(self.seen, keys[keep])
+        return keep
+
+    def drop_duplicates(self, df):
+        return df[self.keep(dedup_keys(df))]
+
+
+def dedup_keys(df):
+    """64-bit hash of the (latitude, longitude, Price_USD) key of each listing.
+    The hash depends on the dtype (Price_USD is int64 in chunks with only integer prices in US$), so
+    the key columns are hashed as float64, the same listing gets the same key in every chunk.
+    """
+    return pd.util.hash_pandas_object(df[DEDUP_COLUMNS].astype('float64'), index=False).values
+
+
+def compute_fences(surface_quantiles, price_m2_quantiles):
+    """Computes the outlier fences used by process_dataset: IQR fences (fold=2) on the right tail of
+    Surface and Price_m2_USD, and the 2% quantile on the left tail of Price_m2_USD.
+    in:  FENCE_QUANTILES of Surface and Price_m2_USD
+    out: dict with the (lower, upper) fence of each variable, None if the tail isn't trimmed
+    """
+    fences = {}
+    for var, (q02, q1, q3) in (('Surface', surface_quantiles), ('Price_m2_USD', price_m2_quantiles)):
+        fences[var] = [None, q3 + (q3 - q1)*2]
+    fences['Price_m2_USD'][0] = price_m2_quantiles[0]
+    return fences
+
+
+class FenceSketch:
+    """Quantile sketches of Surface and Price_m2_USD, used to compute the outlier fences without
+    holding the columns in memory. Sketches built per chunk or per process can be merged.
+    """
+    def __init__(self, k=2000):
+        self.surface = QuantileSketch(k)
+        self.price_m2 = QuantileSketch(k)
+
+    def update(self, df):
+        self.surface.update(df['Surface'].values)
+        self.price_m2.update(df['Price_m2_USD'].values)
+        return self
+
+    def merge(self, other):
+        self.surface.merge(other.surface)
+        self.price_m2.merge(other.price_m2)
+        return self
+
+    def fences(self):
+        return compute_fences(self.surface.quantile(FENCE_QUANTILES), self.price_m2.quantile(FENCE_QUANTILES))
+
+
+def trim_outliers(df, fences):
+    """Removes the rows outside the fences in a single filtering pass."""
+    mask = np.ones(len(df), dtype=bool)
+    for var, (lower, upper) in fences.items():
+        if lower is not None:
+            mask &= ~(df[var] < lower).values
+        if upper is not None:
+            mask &= ~(df[var] > upper).values
+    return df[mask]
+
+
+def read_raw_chunks(paths, chunksize):
+    """Reads the raw scrape csv files one chunk at a time."""
+    for path in paths:
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            yield chunk
+
+
+def process_chunk(df, deduplicator):
+    """Runs the row-local steps and the deduplication on a chunk of the raw scrape."""
+    df = parse_listings(df)
+    df = deduplicator.drop_duplicates(df)
+    # Drop properties with less than 30 sqmts (surface)
+    df = df[df['Surface'] >= 30]
+    return df[OUTPUT_COLUMNS]
+
+
+def write_output(chunks, output_path):
+    """Writes the output chunks to output_path, typed (see gt_data.write_dataset_chunks) if its extension is
+    one of TYPED_EXTENSIONS, otherwise as csv. Returns the # of rows written.
+    """
+    if output_path.endswith(TYPED_EXTENSIONS):
+        return gt_data.write_dataset_chunks(chunks, output_path)
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(output_path, mode='w' if i == 0 else 'a', header=(i == 0))
+        rows += len(chunk)
+    return rows
+
+
+def process_files(paths, output_path, chunksize=100000, sketch_k=2000):
+    """Streaming version of process_dataset over one or more raw scrape files.
+    The first pass processes each chunk, adds it to the fence sketches and spools it to a temporary
+    directory, the second pass removes the outliers from each spooled chunk and appends it to output_path.
+    The fences are exact while the number of listings is below sketch_k, approximate above it.
+    in:  list of raw scrape csv files, output file (.parquet/.arrow/.feather: typed, see write_output, else csv),
+         # of rows per chunk, size of the quantile sketches
+    out: dict with the outlier fences that were applied
+    """
+    deduplicator = Deduplicator()
+    sketch = FenceSketch(sketch_k)
+    with tempfile.TemporaryDirectory() as spool_dir:
+        spooled = []
+        for i, chunk in enumerate(read_raw_chunks(paths, chunksize)):
+            chunk = process_chunk(chunk, deduplicator)
+            sketch.update(chunk)
+            spooled.append(os.path.join(spool_dir, '%i.pkl' % i))
+            chunk.to_pickle(spooled[-1])
+
+        fences = sketch.fences()
+        write_output((trim_outliers(pd.read_pickle(path), fences) for path in spooled), output_path)
+    return fences
@@ -0,0 +1,118 @@
+"""Batch driver to preprocess many raw scrape files (one per collection date) in parallel.
+
+The row-local parsing runs in a pool of processes, one file per task. The workers spool their chunks
+to disk and only send back what the global steps need: the deduplication keys and the Surface and
+Price_m2_USD columns. The parent deduplicates in file order and builds the outlier fences, the
+trimming runs in the pool again and the parts are consolidated into one file: typed Parquet (or
+Arrow IPC) through GT/gt_data.py for a .parquet (.arrow/.feather) output, csv otherwise.
+
+Usage: python batch_process.py "raw/*.csv" -o ../GT/Scrape_Sale.parquet [--workers 8] [--chunksize 100000]
+"""
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import Preprocessing
+
+
+def parse_file(path, file_index, chunksize, spool_dir):
+    """Worker: runs the row-local steps on each chunk of a raw scrape file and spools the result.
+    out: list of (spooled chunk, dedup keys, fence columns) and the time spent
+    """
+    start = time.perf_counter()
+    chunks = []
+    for i, chunk in enumerate(Preprocessing.read_raw_chunks([path], chunksize)):
+        chunk = Preprocessing.parse_listings(chunk)[Preprocessing.OUTPUT_COLUMNS]
+        spool_path = os.path.join(spool_dir, '%i-%i.pkl' % (file_index, i))
+        chunk.to_pickle(spool_path)
+        chunks.append((spool_path, Preprocessing.dedup_keys(chunk), chunk[['Surface', 'Price_m2_USD']]))
+    return chunks, time.perf_counter() - start
+
+
+def trim_chunk(spool_path, keep, fences, part_path):
+    """Worker: applies the deduplication mask and the outlier fences to a spooled chunk (part as csv rows or pickle)."""
+    chunk = Preprocessing.trim_outliers(pd.read_pickle(spool_path)[keep], fences)
+    if part_path.endswith('.pkl'):
+        chunk.to_pickle(part_path)
+    else:
+        chunk.to_csv(part_path, header=False)
+    return len(chunk)
+
+
+def process_batch(paths, output_path, workers=None, chunksize=100000, sketch_k=2000):
+    """Parallel version of Preprocessing.process_files.
+    in:  list of raw scrape csv files, output file (typed or csv, see Preprocessing.write_output), # of processes,
+         # of rows per chunk, size of the quantile sketches
+    out: dict with the outlier fences and dict with the wall time of each stage
+    """
+    timings = {}
+    with tempfile.TemporaryDirectory() as spool_dir, ProcessPoolExecutor(workers) as pool:
+        # Row-local parsing, one task per file
+        start = time.perf_counter()
+        futures = [pool.submit(parse_file, path, i, chunksize, spool_dir) for i, path in enumerate(paths)]
+        results = [future.result() for future in futures]
+        timings['parse'] = time.perf_counter() - start
+        timings['parse (cpu)'] = sum(elapsed for _, elapsed in results)
+
+        # Global deduplication (in file order, so the first listing is kept like in process_dataset) and fences
+        start = time.perf_counter()
+        deduplicator = Preprocessing.Deduplicator()
+        sketch = Preprocessing.FenceSketch(sketch_k)
+        masks = []
+        for chunks, _ in results:
+            for spool_path, keys, values in chunks:
+                # Drop duplicates, then properties with less than 30 sqmts (surface)
+                keep = deduplicator.keep(keys) & (values['Surface'] >= 30).values
+                sketch.update(values[keep])
+                masks.append((spool_path, keep))
+        fences = sketch.fences()
+        timings['dedup & fences'] = time.perf_counter() - start
+
+        # Outlier trimming of every chunk
+        start = time.perf_counter()
+        typed = output_path.endswith(Preprocessing.TYPED_EXTENSIONS)
+        parts = [os.path.join(spool_dir, 'part-%i.%s' % (i, 'pkl' if typed else 'csv')) for i in range(len(masks))]
+        futures = [pool.submit(trim_chunk, spool_path, keep, fences, part)
+                   for (spool_path, keep), part in zip(masks, parts)]
+        rows = sum(future.result() for future in futures)
+        timings['trim'] = time.perf_counter() - start
+
+        # Consolidated output
+        start = time.perf_counter()
+        if typed:
+            rows = Preprocessing.write_output((pd.read_pickle(part) for part in parts), output_path)
+        else:
+            pd.DataFrame(columns=Preprocessing.OUTPUT_COLUMNS).to_csv(output_path)
+            with open(output_path, 'ab') as output:
+                for part in parts:
+                    with open(part, 'rb') as f:
+                        shutil.copyfileobj(f, output)
+        timings['write'] = time.perf_counter() - start
+    timings['rows'] = rows
+    return fences, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='Raw scrape csv files or glob patterns')
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('-w', '--workers', type=int, default=None, help='# of processes (default: # of cpus)')
+    parser.add_argument('--chunksize', type=int, default=100000)
+    parser.add_argument('--sketch-k', type=int, default=2000)
+    args = parser.parse_args()
+
+    paths = sorted(path for pattern in args.inputs for path in glob.glob(pattern))
+    fences, timings = process_batch(paths, args.output, args.workers, args.chunksize, args.sketch_k)
+    print('Processed %i files into %s (%i rows)' % (len(paths), args.output, timings.pop('rows')))
+    for stage, elapsed in timings.items():
+        print('%16s: %8.3f s' % (stage, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import numpy as np
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch (KLL style) to estimate quantiles of a column without holding it in memory.
+
+    Values are kept in levels, an item in level h stands for 2**h values. When a level grows past its
+    capacity it's sorted and every other item (random offset) is promoted to the next level. Sketches
+    built on different chunks or processes can be merged, the rank error is roughly 1.7/k.
+    As long as no level has been compacted the quantiles are exact.
+    """
+    def __init__(self, k=2000, seed=None):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.RandomState(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype='float64')
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self._compress()
+        return self
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _capacity(self, level):
+        # Lower levels get geometrically smaller capacities, the top level holds k items
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2/3)**depth)), 8)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            # An odd item stays in the level so the total weight is preserved
+            leftover, items = items[:len(items) % 2], items[len(items) % 2:]
+            self.levels[level] = leftover
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[self.rng.randint(2)::2]])
+            # Adding a level shrinks the capacity of the lower ones, so check again from the bottom
+            level = 0
+
+    def quantile(self, q):
+        """Estimates the quantile(s) q, with linear interpolation like pandas/numpy."""
+        if len(self.levels) == 1:
+            return np.quantile(self.levels[0], q)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(x), 2.0**h) for h, x in enumerate(self.levels)])
+        order = np.argsort(items)
+        items, weights = items[order], weights[order]
+        # Each item sits at the middle of the ranks it represents
+        ranks = (np.cumsum(weights) - weights/2) / weights.sum()
+        return np.interp(q, ranks, items)
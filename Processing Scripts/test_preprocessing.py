@@ -0,0 +1,116 @@
+"""Streaming preprocessing vs process_dataset (chunks whose prices have different dtypes), its typed output,
+and the accuracy of the sketched outlier fences.
+
+Run with: python -m pytest "Processing Scripts"
+"""
+import numpy as np
+import pandas as pd
+
+import Preprocessing  # also puts GT/ on sys.path
+import gt_data
+
+
+def raw_listings(prices, currencies, seed=0):
+    """Raw scrape rows (the columns parse_listings reads) with the given prices."""
+    rng = np.random.RandomState(seed)
+    n = len(prices)
+    return pd.DataFrame({
+        'id': np.arange(n), 'created_at': '2021-01-05T18:58:16-06:00', 'title': 'Listing', 'images': '[]',
+        'display_date': '2021-01-06T00:58:14+0000', 'user_id': np.arange(n),
+        'created_at_first': '2021-01-05T18:58:14-06:00',
+        'locations': ["[{'lat': %r, 'lon': %r}]" % (14.6 + i * 0.001, -90.5 - i * 0.001) for i in range(n)],
+        'parameters': ["[{'id': 'type', 'value': 42020}, {'id': 'rooms', 'value': '%i'}, {'id': 'bathrooms', 'value': '2'}, "
+                       "{'id': 'surface', 'value': '%i'}]" % (rng.randint(1, 5), rng.randint(60, 200)) for _ in range(n)],
+        'locations_resolved.ADMIN_LEVEL_3_name': 'Ciudad de Guatemala',
+        'locations_resolved.SUBLOCALITY_LEVEL_1_name': 'Zona 10',
+        'price.value.raw': prices,
+        'price.value.currency.pre': currencies,
+    })
+
+
+def test_duplicates_across_chunks_with_int_and_float_prices(tmp_path):
+    # First file: only integer prices in US$ (Price_USD is int64), second file: a price in Q (float64)
+    first = raw_listings(np.arange(150000, 160000, 1000), ['US$'] * 10)
+    second = pd.concat([first.iloc[:6], raw_listings([765000.0], ['Q'], seed=1).assign(
+        locations="[{'lat': 15.0, 'lon': -91.0}]")], ignore_index=True)
+    assert Preprocessing.parse_listings(first.copy())['Price_USD'].dtype == 'int64'
+    assert Preprocessing.parse_listings(second.copy())['Price_USD'].dtype == 'float64'
+
+    paths = [str(tmp_path / 'first.csv'), str(tmp_path / 'second.csv')]
+    first.to_csv(paths[0], index=False)
+    second.to_csv(paths[1], index=False)
+    output = str(tmp_path / 'output.csv')
+    Preprocessing.process_files(paths, output, chunksize=4)
+
+    streamed = pd.read_csv(output, index_col=0)
+    expected = Preprocessing.process_dataset(pd.concat([first, second], ignore_index=True))
+    assert not streamed.duplicated(subset=Preprocessing.DEDUP_COLUMNS).any()
+    assert len(streamed) == len(expected)
+
+
+def test_dedup_keys_ignore_the_dtype():
+    keys = pd.DataFrame({'latitude': [14.6], 'longitude': [-90.5], 'Price_USD': [150000]})
+    assert Preprocessing.dedup_keys(keys) == Preprocessing.dedup_keys(keys.astype({'Price_USD': 'float64'}))
+
+
+def test_typed_output_matches_the_csv(tmp_path):
+    # Integer prices in the first chunk, float prices from the second chunk on
+    prices = np.array(list(range(150000, 190000, 1000)) + [price + 0.5 for price in range(190000, 250000, 1000)], dtype=object)
+    raw = raw_listings(prices, ['US$'] * 100)
+    path = str(tmp_path / 'raw.csv')
+    raw.to_csv(path, index=False)
+    Preprocessing.process_files([path], str(tmp_path / 'output.csv'), chunksize=40)
+    Preprocessing.process_files([path], str(tmp_path / 'output.parquet'), chunksize=40)
+
+    typed = gt_data.load_dataset(str(tmp_path / 'output.parquet'))
+    expected = gt_data.to_compact(pd.read_csv(str(tmp_path / 'output.csv')))
+    assert typed.dtypes.astype(str).to_dict() == {col: str(dtype) for col, dtype in expected.dtypes.items()}
+    assert {col: str(typed[col].dtype) for col in gt_data.DTYPES} == gt_data.DTYPES
+    pd.testing.assert_frame_equal(typed.astype({'City': str, 'Zone': str}), expected.astype({'City': str, 'Zone': str}))
+
+
+def fence_columns(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({'Surface': rng.lognormal(5, 0.6, n).round(), 'Price_m2_USD': rng.lognormal(7, 0.4, n)})
+
+
+def exact_fences(df):
+    return Preprocessing.compute_fences(np.quantile(df['Surface'], Preprocessing.FENCE_QUANTILES),
+                                        np.quantile(df['Price_m2_USD'], Preprocessing.FENCE_QUANTILES))
+
+
+def rank_errors(df, fences):
+    """Fraction of the rows on the wrong side of each sketched fence."""
+    exact = exact_fences(df)
+    return [abs((df[var] <= fence).mean() - (df[var] <= exact_fence).mean())
+            for var in exact for exact_fence, fence in zip(exact[var], fences[var]) if exact_fence is not None]
+
+
+def sketch_chunks(df, k, chunksize):
+    return [Preprocessing.FenceSketch(k).update(df[i:i + chunksize]) for i in range(0, len(df), chunksize)]
+
+
+def test_fences_are_exact_below_sketch_k():
+    df = fence_columns(1500)
+    sketch = Preprocessing.FenceSketch(2000)
+    for i in range(0, len(df), 400):
+        sketch.update(df[i:i + 400])
+    assert sketch.fences() == exact_fences(df)
+
+
+def test_fence_rank_error_above_sketch_k():
+    df = fence_columns(200000, seed=1)
+    sketch = Preprocessing.FenceSketch(2000)
+    for i in range(0, len(df), 25000):
+        sketch.update(df[i:i + 25000])
+    assert max(rank_errors(df, sketch.fences())) <= 0.01
+
+
+def test_merged_sketches():
+    df = fence_columns(200000, seed=2)
+    first, second = sketch_chunks(df, 2000, 100000)
+    assert max(rank_errors(df, first.merge(second).fences())) <= 0.01
+    # Merging two sketches whose items all fit in one keeps the fences exact
+    small = fence_columns(1800, seed=3)
+    first, second = sketch_chunks(small, 2000, 900)
+    assert first.merge(second).fences() == exact_fences(small)
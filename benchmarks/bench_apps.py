@@ -0,0 +1,302 @@
+"""Load test of the Streamlit dashboards on synthetic data.
+
+For every app and scale, synthetic data is written to a temporary directory (GT listings as Parquet,
+NYC collisions as a store of Parquet parts) and the app is pointed to it (GT_DATA_PATH, NYC_STORE_PATH,
+GT_MAX_ROWS, NYC_MAX_ROWS, and a new DATA_CACHE_DIR so the first run builds everything). Then, in a
+fresh process per number of sessions, N sessions run the script concurrently, in threads as the
+Streamlit server runs them: a first run, then reruns that each change a widget at random.
+
+Reported per scenario (app, rows, sessions):
+  first run:  latency of the first run of the sessions (the first one loads and builds the data)
+  reruns:     p50/p99/mean latency of the reruns after an interaction, over all the sessions
+  sections:   p50 time of each section of the script in the reruns, from its header to the next one
+              (the part before the first header is "start", numbers in the headers become N)
+  memory:     peak RSS of the process, and its RSS before the first session started
+  errors:     exceptions raised by the script
+
+Results are saved as JSON (--output) with the versions of the libraries and the git revision.
+--compare checks them against a previous file: the exit code is 1 if the p50 or p99 of the reruns,
+or the peak RSS, of a scenario grew more than --tolerance.
+
+The sessions use Streamlit's AppTest (streamlit >= 1.28) and some of its internals, without a server:
+latencies don't include sending the elements to a browser. GT/requirements.txt pins an older streamlit
+(the deployed one), install benchmarks/requirements-dev.txt in a separate environment to run it. The NYC scales need ~1 GB of memory per million rows.
+
+Usage: python benchmarks/bench_apps.py [--apps gt nyc] [--rows 10000 100000 1000000] [--sessions 1 8]
+                                       [--reruns 20] [--output results.json] [--compare previous.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APPS = {'gt': os.path.join(ROOT, 'GT', 'real_estate_gt.py'), 'nyc': os.path.join(ROOT, 'NYC', 'nyc.py')}
+CHUNK_ROWS = 500000
+# First version with streamlit.testing.v1.AppTest
+MIN_STREAMLIT = (1, 28)
+
+
+def write_gt(directory, nrows):
+    import synthetic
+    path = os.path.join(directory, 'listings.parquet')
+    synthetic.make_listings(nrows).to_parquet(path, index=False)
+    return {'GT_DATA_PATH': path, 'GT_MAX_ROWS': str(nrows)}
+
+
+def write_nyc(directory, nrows):
+    import pyarrow as pa
+    import synthetic
+    sys.path.insert(0, os.path.join(ROOT, 'NYC'))
+    import nyc_ingest
+    store = os.path.join(directory, 'collisions')
+    os.makedirs(store)
+    for start in range(0, nrows, CHUNK_ROWS):
+        df = synthetic.make_collisions(min(CHUNK_ROWS, nrows - start), seed=start, start_id=4000000 + start)
+        nyc_ingest.write_part(store, pa.Table.from_pandas(df[nyc_ingest.COLUMNS], schema=nyc_ingest.SCHEMA,
+                                                          preserve_index=False))
+    return {'NYC_STORE_PATH': store, 'NYC_MAX_ROWS': str(nrows)}
+
+
+WRITERS = {'gt': write_gt, 'nyc': write_nyc}
+
+
+# Interactions of a session: each one changes a widget (chosen at random) before a rerun
+def choose(rng, widget):
+    return widget.set_value(rng.choice(list(widget.options)))
+
+
+GT_INTERACTIONS = [
+    lambda at, rng: at.selectbox(key='zone_box').select_index(rng.randrange(len(at.selectbox(key='zone_box').options))),
+    lambda at, rng: choose(rng, at.selectbox(key='property_type_box')),
+    lambda at, rng: at.slider[0].set_value(rng.randint(at.slider[0].min, at.slider[0].max)) if len(at.slider) else None,
+    lambda at, rng: choose(rng, at.radio(key='bar_plot_radio')),
+    lambda at, rng: at.selectbox(key='zone_box_stat').select_index(rng.randrange(len(at.selectbox(key='zone_box_stat').options))),
+    lambda at, rng: choose(rng, at.radio(key='histogram_radio')),
+]
+NYC_INTERACTIONS = [
+    lambda at, rng: at.slider[0].set_value(rng.randint(0, 19)),
+    lambda at, rng: at.slider[1].set_value(rng.randint(0, 23)),
+    lambda at, rng: choose(rng, at.selectbox[0]),
+]
+INTERACTIONS = {'gt': GT_INTERACTIONS, 'nyc': NYC_INTERACTIONS}
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+
+def run_sessions(app, sessions, reruns, seed=0):
+    """Runs in the child process: the sessions of one scenario, returns their measurements."""
+    import streamlit as st
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import AppTest
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+    from unittest.mock import MagicMock
+
+    sys.path.insert(0, os.path.dirname(APPS[app]))  # as `streamlit run` does
+
+    # One runtime for all the sessions (AppTest sets and clears a global one around every run)
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage('/mock/media'))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+
+    # Sections start at every header/subheader, recorded per script thread
+    marks = {}
+    for name in ('header', 'subheader'):
+        def marked(body, *args, _element=getattr(st, name), **kwargs):
+            label = re.sub(r'\d+', 'N', str(body))  # e.g. the hour in the NYC headers
+            marks.setdefault(threading.get_ident(), []).append((time.perf_counter(), label))
+            return _element(body, *args, **kwargs)
+        setattr(st, name, marked)
+
+    class Session(AppTest):
+        def _run(self, widget_state=None, timeout=None):
+            runner = LocalScriptRunner(self._script_path, self.session_state)
+            start = time.perf_counter()
+            self._tree = runner.run(widget_state, self.query_params, timeout or self.default_timeout)
+            end = time.perf_counter()
+            self._tree._runner = self
+            points = [(start, 'start')] + marks.pop(runner._script_thread.ident, []) + [(end, None)]
+            self.last_run = (end - start, {label: points[i + 1][0] - t for i, (t, label) in enumerate(points[:-1])})
+            return self
+
+    results = {'first': [], 'reruns': [], 'sections': {}, 'errors': []}
+    lock = threading.Lock()
+    barrier = threading.Barrier(sessions)
+
+    def session(number):
+        rng = random.Random(seed + number)
+        at = Session(APPS[app], default_timeout=3600)
+        barrier.wait()
+        runs = []
+        try:
+            at.run()
+            first = at.last_run[0]
+            for i in range(reruns):
+                INTERACTIONS[app][i % len(INTERACTIONS[app])](at, rng)
+                at.run()
+                runs.append(at.last_run)
+            errors = [e.message for e in at.exception]
+        except Exception as e:
+            first, errors = None, ['%s: %s' % (type(e).__name__, e)]
+        with lock:
+            if first is not None:
+                results['first'].append(first)
+            for latency, sections in runs:
+                results['reruns'].append(latency)
+                for label, seconds in sections.items():
+                    results['sections'].setdefault(label, []).append(seconds)
+            results['errors'].extend(errors)
+
+    rss_before = rss_mb()
+    threads = [threading.Thread(target=session, args=(number,)) for number in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'first_run_s': {'p50': percentile(results['first'], 50), 'max': max(results['first'], default=None)},
+        'rerun_ms': {'p50': percentile(results['reruns'], 50) * 1000 if results['reruns'] else None,
+                     'p99': percentile(results['reruns'], 99) * 1000 if results['reruns'] else None,
+                     'mean': statistics.mean(results['reruns']) * 1000 if results['reruns'] else None,
+                     'count': len(results['reruns'])},
+        'section_p50_ms': {label: percentile(values, 50) * 1000 for label, values in results['sections'].items()},
+        'rss_before_mb': rss_before,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'errors': sorted(set(results['errors']))[:5],
+    }
+
+
+def run_scenario(app, env, sessions, reruns, cache_dir):
+    """Runs the sessions in a fresh process with the environment of the scenario."""
+    env = dict(os.environ, DATA_CACHE_DIR=cache_dir, **env)
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', app, str(sessions), str(reruns)],
+                         env=env, cwd=os.path.dirname(APPS[app]), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                         universal_newlines=True).stdout
+    lines = out.strip().splitlines()
+    return json.loads(lines[-1]) if lines else {'errors': ['the process failed']}
+
+
+def metadata():
+    import pandas
+    import pyarrow
+    import streamlit
+    revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'git': revision or None, 'python': platform.python_version(),
+            'streamlit': streamlit.__version__, 'pandas': pandas.__version__, 'pyarrow': pyarrow.__version__,
+            'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def compare(results, previous, tolerance):
+    """Scenarios whose rerun p50/p99 or peak RSS grew more than tolerance (as a fraction)."""
+    before = {(r['app'], r['rows'], r['sessions']): r for r in previous['results']}
+    regressions = []
+    for result in results:
+        old = before.get((result['app'], result['rows'], result['sessions']))
+        if old is None:
+            continue
+        for metric, new_value, old_value in [
+                ('rerun p50', result['rerun_ms']['p50'], old['rerun_ms']['p50']),
+                ('rerun p99', result['rerun_ms']['p99'], old['rerun_ms']['p99']),
+                ('peak RSS', result['peak_rss_mb'], old['peak_rss_mb'])]:
+            if new_value is not None and old_value and new_value > old_value * (1 + tolerance):
+                regressions.append('%s %i rows %i sessions: %s %.1f -> %.1f' % (
+                    result['app'], result['rows'], result['sessions'], metric, old_value, new_value))
+    return regressions
+
+
+def check_streamlit():
+    """Exits with a hint if the installed streamlit has no AppTest (e.g. the one pinned in GT/requirements.txt)."""
+    import streamlit
+    version = tuple(int(part) for part in re.findall(r'\d+', streamlit.__version__)[:2])
+    if version < MIN_STREAMLIT:
+        sys.exit('bench_apps.py needs streamlit >= %i.%i (found %s), install benchmarks/requirements-dev.txt'
+                 % (MIN_STREAMLIT + (streamlit.__version__,)))
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        app, sessions, reruns = sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+        print(json.dumps(run_sessions(app, sessions, reruns)))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--apps', nargs='+', choices=sorted(APPS), default=sorted(APPS))
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--reruns', type=int, default=20, help='reruns per session after the first run')
+    parser.add_argument('--output', help='JSON file for the results')
+    parser.add_argument('--compare', help='JSON file of a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+    check_streamlit()
+
+    results = []
+    print('%-4s %9s %8s %10s %10s %10s %10s %10s  %s' % ('app', 'rows', 'sessions', 'first (s)', 'p50 (ms)',
+                                                          'p99 (ms)', 'RSS0 (MB)', 'peak (MB)', 'slowest sections (p50 ms)'))
+    for app in args.apps:
+        for nrows in args.rows:
+            directory = tempfile.mkdtemp()
+            try:
+                env = WRITERS[app](directory, nrows)
+                for sessions in args.sessions:
+                    cache_dir = tempfile.mkdtemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+                    try:
+                        result = dict(app=app, rows=nrows, sessions=sessions,
+                                      **run_scenario(app, env, sessions, args.reruns, cache_dir))
+                    finally:
+                        shutil.rmtree(cache_dir)
+                    results.append(result)
+                    if 'rerun_ms' not in result:
+                        print('%-4s %9i %8i  failed: %s' % (app, nrows, sessions, result['errors']))
+                        continue
+                    sections = sorted(result['section_p50_ms'].items(), key=lambda item: -item[1])[:3]
+                    print('%-4s %9i %8i %10.2f %10.1f %10.1f %10.0f %10.0f  %s' % (
+                        app, nrows, sessions, result['first_run_s']['max'] or float('nan'),
+                        result['rerun_ms']['p50'] or float('nan'), result['rerun_ms']['p99'] or float('nan'),
+                        result['rss_before_mb'], result['peak_rss_mb'],
+                        ', '.join('%s %.1f' % (label[:24], ms) for label, ms in sections)))
+                    for error in result['errors']:
+                        print('     error: %s' % error[:120])
+            finally:
+                shutil.rmtree(directory)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': metadata(), 'results': results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('regression: ' + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Scaling benchmark for the multi-process preprocessing driver (Processing Scripts/batch_process.py).
+
+Builds a synthetic corpus of raw scrape files and runs process_batch with an increasing number of
+workers, printing the wall time of each stage and the speedup over a single worker. The GT csv files
+in the repo are already preprocessed (they don't have the raw locations/parameters columns), so the
+corpus is generated with the same synthetic raw dump used by bench_preprocessing.py.
+
+Usage: python benchmarks/bench_batch.py --files 32 --rows 100000 --workers 1 2 4 8 16
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from bench_preprocessing import make_raw_dump
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Processing Scripts'))
+import batch_process  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=32, help='# of raw scrape files in the corpus')
+    parser.add_argument('--rows', type=int, default=100000, help='# of rows per file')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunksize', type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.files):
+            paths.append(os.path.join(tmp, 'raw-%03i.csv' % i))
+            make_raw_dump(args.rows, seed=i).to_csv(paths[-1], index=False)
+
+        stages = None
+        baseline = None
+        for workers in args.workers:
+            _, timings = batch_process.process_batch(paths, os.path.join(tmp, 'out.csv'), workers, args.chunksize)
+            timings.pop('rows')
+            total = sum(elapsed for stage, elapsed in timings.items() if stage != 'parse (cpu)')
+            baseline = baseline or total
+            if stages is None:
+                stages = list(timings)
+                print('%8s ' % 'workers' + ' '.join('%15s' % stage for stage in stages) + ' %10s %8s' % ('total', 'speedup'))
+            print('%8i ' % workers + ' '.join('%15.3f' % timings[stage] for stage in stages)
+                  + ' %10.3f %7.2fx' % (total, baseline / total))
+
+
+if __name__ == '__main__':
+    main()
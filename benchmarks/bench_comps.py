@@ -0,0 +1,88 @@
+"""Latency of the comparable listings queries of GT/gt_comps.py on synthetic listings.
+
+baseline: a scan of the frame per query, filtering by Tipo/Bedrooms/Surface and sorting the
+          distances of the rows left (what a query costs without the index).
+index:    CompsIndex, k nearest and within a radius, with and without the filters.
+
+The queries are centered on random listings. Reports the time to build the index and its size, and
+the p50/p99 latency of every kind of query. The results of the index are checked against the scan.
+
+Usage: python benchmarks/bench_comps.py --rows 100000 1000000 --queries 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+import synthetic  # also puts GT/ on sys.path
+from gt_comps import CompsIndex  # noqa: E402
+
+K = 10
+RADIUS_M = 500
+
+
+def scan(df, xy, point, k=None, radius_m=None, tipo=None, bedrooms=None, surface=None):
+    """Positions of the comps (nearest first) by scanning every row."""
+    keep = np.ones(len(df), dtype=bool)
+    if tipo is not None:
+        keep &= df['Tipo'].values == tipo
+    if bedrooms is not None:
+        keep &= df['Bedrooms'].values == bedrooms
+    if surface is not None:
+        keep &= (df['Surface'].values >= surface[0]) & (df['Surface'].values <= surface[1])
+    rows = np.flatnonzero(keep)
+    distance = np.hypot(xy[rows, 0] - point[0], xy[rows, 1] - point[1])
+    if radius_m is not None:
+        rows, distance = rows[distance <= radius_m], distance[distance <= radius_m]
+    order = np.argsort(distance, kind='mergesort')
+    return rows[order[:k]] if k is not None else rows[order]
+
+
+def percentiles(times):
+    return np.percentile(times, 50) * 1000, np.percentile(times, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    print('%10s %-24s %10s %10s %10s %10s' % ('rows', 'query', 'scan p50', 'scan p99', 'index p50', 'index p99'))
+    for nrows in args.rows:
+        df = synthetic.make_listings(nrows)
+        start = time.perf_counter()
+        comps = CompsIndex(df)
+        print('%10i build: %.2f s, %.1f MB' % (nrows, time.perf_counter() - start, comps.nbytes / 2**20))
+        xy = comps.project(df['latitude'].values, df['longitude'].values)
+
+        rng = np.random.RandomState(0)
+        centers = df.iloc[rng.randint(0, nrows, args.queries)]
+        queries = []
+        for row in centers.itertuples():
+            surface = (0.75 * row.Surface, 1.25 * row.Surface)
+            queries.append((row.latitude, row.longitude, {'tipo': row.Tipo, 'bedrooms': row.Bedrooms, 'surface': surface}))
+
+        kinds = [
+            ('nearest', lambda q: comps.nearest(q[0], q[1], K)[0], lambda q, p: scan(df, xy, p, k=K)),
+            ('nearest + filters', lambda q: comps.nearest(q[0], q[1], K, **q[2])[0], lambda q, p: scan(df, xy, p, k=K, **q[2])),
+            ('within', lambda q: comps.within(q[0], q[1], RADIUS_M)[0], lambda q, p: scan(df, xy, p, radius_m=RADIUS_M)),
+            ('within + filters', lambda q: comps.within(q[0], q[1], RADIUS_M, **q[2])[0],
+             lambda q, p: scan(df, xy, p, radius_m=RADIUS_M, **q[2])),
+        ]
+        for name, query, baseline in kinds:
+            scan_times, index_times = [], []
+            for q in queries:
+                point = comps.project(q[0], q[1])[0]
+                start = time.perf_counter()
+                expected = baseline(q, point)
+                scan_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                result = query(q)
+                index_times.append(time.perf_counter() - start)
+                assert np.allclose(np.sort(np.hypot(*(xy[expected] - point).T)), result['distance_m'].values), name
+            print('%10i %-24s %10.2f %10.2f %10.2f %10.2f' % ((nrows, name) + percentiles(scan_times) + percentiles(index_times)))
+
+
+if __name__ == '__main__':
+    main()
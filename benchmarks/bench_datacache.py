@@ -0,0 +1,119 @@
+"""Memory of N processes serving the GT dashboard data: one private copy per process (st.cache)
+vs the shared cache of common/datacache.py (one memory mapped copy for the host).
+
+Every worker is a fresh process (spawn) that loads the sorted listings, the ListingIndex, the
+cube (saved once beforehand, as the app does) and the regression lines, and makes a few
+selections. The memory is read from /proc/self/smaps_rollup, minus what the worker used before
+loading the data (after a warm up on a few rows). RSS counts the shared pages in every process, PSS splits them between the
+processes that map them, so the sum of the PSS is what the host actually uses. Linux only.
+
+Usage: python benchmarks/bench_datacache.py --rows 1000000 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pyarrow as pa
+
+import synthetic  # also puts GT/ on sys.path
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from common.datacache import DataCache, estimate_size  # noqa: E402
+from gt_cube import AggregateCube, cube_path, load_or_build  # noqa: E402
+from gt_query import INDEX_KEYS, ListingIndex  # noqa: E402
+from gt_regression import fit_lines  # noqa: E402
+
+
+def memory_kb():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0][:-1].lower()] = int(parts[1])
+    return values
+
+
+def sorted_listings(nrows):
+    return synthetic.make_listings(nrows).sort_values(INDEX_KEYS, kind='mergesort').reset_index(drop=True)
+
+
+def warm_up():
+    """Runs the same code on a few rows, so the modules pandas/pyarrow load lazily aren't counted as data."""
+    data = sorted_listings(1000)
+    ListingIndex(pa.Table.from_pandas(data).to_pandas(split_blocks=True))
+    AggregateCube.build(data)
+    fit_lines(data, ['Tipo', 'Zone'])
+
+
+def serve(mode, nrows, directory, ready, done):
+    warm_up()
+    base = memory_kb()  # interpreter and libraries
+    start = time.perf_counter()
+    cache = DataCache(directory)
+    path = cache.path('bench_listings', str(nrows))  # the cube is saved next to it
+    if mode == 'private':
+        data = sorted_listings(nrows)
+        views = [ListingIndex(data), load_or_build(data, path), fit_lines(data, ['Tipo', 'Zone'])]
+    else:
+        data = cache.dataset('bench_listings', str(nrows), lambda: sorted_listings(nrows))
+        for _ in range(10):  # reruns
+            views = [cache.view('index', str(nrows), lambda: ListingIndex(data)),
+                     cache.view('cube', str(nrows), lambda: load_or_build(data, path)),
+                     cache.view('lines', str(nrows), lambda: fit_lines(data, ['Tipo', 'Zone']))]
+    stats = cache.stats()
+    index = views[0]
+    rows = sum(len(index.select(tipo, zone)) for tipo, zone in [(42021, 'Zona 10'), (42020, 'Zona 14')])
+    seconds = time.perf_counter() - start
+    memory = {key: value - base[key] for key, value in memory_kb().items()}
+    ready.put(dict(memory, seconds=seconds, rows=rows, stats=stats))
+    done.wait()  # all the workers are alive when the memory is read
+
+
+def run(mode, nrows, workers, directory):
+    ctx = multiprocessing.get_context('spawn')
+    ready, done = ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=serve, args=(mode, nrows, directory, ready, done)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    results = [ready.get() for _ in procs]
+    done.set()
+    for proc in procs:
+        proc.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    try:
+        cache = DataCache(directory)
+        data = cache.dataset('bench_listings', str(args.rows), lambda: sorted_listings(args.rows))
+        AggregateCube.build(data).save(cube_path(cache.path('bench_listings', str(args.rows))))
+        print('%i rows, dataset %.1f MB, %i workers' % (args.rows, estimate_size(data) / 2**20, args.workers))
+        del data, cache
+
+        for mode in ('private', 'shared'):
+            results = run(mode, args.rows, args.workers, directory)
+            rss = sum(r['rss'] for r in results) / 1024
+            pss = sum(r['pss'] for r in results) / 1024
+            seconds = sorted(r['seconds'] for r in results)
+            print('%-8s data RSS %7.1f MB  data PSS %7.1f MB  load %.2f-%.2f s'
+                  % (mode, rss, pss, seconds[0], seconds[-1]))
+            if mode == 'shared':
+                files = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 2**20
+                print('         shared files %.1f MB, stats of one worker: %s' % (files, results[-1]['stats']))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Cost of the raw data download of the GT app for the largest zone of synthetic listings.
+
+baseline: what the app did before GT/gt_export.py, the whole zone as CSV, base64-encoded into a data
+          URI link written to the page on every rerun, whether or not it's clicked.
+export:   nothing on a rerun (no bytes, no time), the file is generated in chunks (export_chunks)
+          only when it is requested.
+
+Reports the time, the peak memory allocated (tracemalloc) and the bytes added to the page per rerun,
+and for every export format the time, peak memory and size of the file when it's requested.
+
+Usage: python benchmarks/bench_export.py --rows 100000 1000000
+"""
+import argparse
+import base64
+import time
+import tracemalloc
+
+import synthetic  # also puts GT/ on sys.path
+from gt_export import FORMATS, export_chunks  # noqa: E402
+from gt_query import ListingIndex  # noqa: E402
+
+
+def get_table_download_link(df):
+    csv = df.to_csv(index=False)
+    b64 = base64.b64encode(csv.encode()).decode()
+    return f'<a href="data:file/csv;base64,{b64}" download="real_estate_data.csv">Descargar CSV</a>'
+
+
+def export(df, fmt):
+    return sum(len(chunk) for chunk in export_chunks(df, fmt))
+
+
+def measure(func, *args, repeat=3):
+    """Best time of repeat runs (s), peak memory allocated by one run (MB) and its result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak / 2**20, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    args = parser.parse_args()
+
+    print('%10s %10s %-16s %10s %10s %12s' % ('rows', 'zone rows', 'path', 'time (ms)', 'peak (MB)', 'bytes'))
+    for nrows in args.rows:
+        index = ListingIndex(synthetic.make_listings(nrows))
+        tipo, zone = max((key for key in index.ranges if len(key) == 2), key=lambda key: len(index.select(*key)))
+        data = index.select(tipo, zone)
+        rows = '%10i %10i' % (nrows, len(data))
+
+        seconds, peak, link = measure(get_table_download_link, data)
+        print('%s %-16s %10.1f %10.1f %12i' % (rows, 'baseline rerun', seconds * 1000, peak, len(link)))
+        for fmt in FORMATS:
+            seconds, peak, size = measure(export, data, fmt)
+            print('%s %-16s %10.1f %10.1f %12i' % (rows, 'export ' + fmt, seconds * 1000, peak, size))
+
+
+if __name__ == '__main__':
+    main()
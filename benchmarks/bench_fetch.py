@@ -0,0 +1,98 @@
+"""Serial vs concurrent download of the NYC collisions from a local mock of the Socrata API that
+adds latency to every response (benchmarks/mock_socrata.py).
+
+serial:      what NYC/nyc_ingest.py did before NYC/nyc_fetch.py, one blocking request per page to the
+             JSON endpoint with requests, each page through pd.DataFrame.from_records
+concurrent:  nyc_ingest.ingest, asyncio/aiohttp with N page requests in flight over pooled
+             connections, pages of the CSV endpoint parsed by pyarrow.csv into Arrow columns
+
+Both write the same store. A last run makes the mock fail every 5th request (503) to exercise the
+retries, its store is compared with the serial one.
+
+Usage: python benchmarks/bench_fetch.py --rows 500000 --page-size 10000 --latency 0.2 --concurrency 1 4 8 16
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import pyarrow as pa
+import requests
+
+import synthetic
+from mock_socrata import MockSocrata
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'NYC'))
+import nyc_ingest  # noqa: E402
+
+
+def page_params(mark, limit):
+    """Keyset page after mark, the (crash_date, collision_id) of the last row of the previous page."""
+    params = nyc_ingest.query_params(None)
+    if mark is not None:
+        crash_date, collision_id = mark
+        params['$where'] = "crash_date > '%s' OR (crash_date = '%s' AND collision_id > %i)" % (crash_date, crash_date, collision_id)
+    params['$limit'] = limit
+    return params
+
+
+def ingest_serial(store, url, page_size):
+    """Keyset pages fetched one after the other (into an empty store)."""
+    os.makedirs(store, exist_ok=True)
+    session = requests.Session()
+    mark = None
+    buffered, rows = [], 0
+    while True:
+        response = session.get(url, params=page_params(mark, page_size), timeout=60)
+        response.raise_for_status()
+        page = pd.DataFrame.from_records(response.json(), columns=nyc_ingest.COLUMNS)
+        if len(page):
+            buffered.append(page)
+            rows += len(page)
+            mark = (page['crash_date'].iloc[-1], int(page['collision_id'].iloc[-1]))
+        if len(page) < page_size:
+            break
+    df = pd.concat(buffered, ignore_index=True).astype('object')
+    nyc_ingest.write_part(store, pa.Table.from_pandas(df, schema=nyc_ingest.SCHEMA, preserve_index=False))
+    return rows
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--page-size', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0.2, help='delay of every response of the mock (s)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    df = synthetic.make_collisions(args.rows)[nyc_ingest.COLUMNS]
+    print('%i rows, %i rows per page, %.0f ms latency' % (args.rows, args.page_size, args.latency * 1000))
+    print('%-16s %10s %12s %10s' % ('path', 'seconds', 'rows/s', 'speedup'))
+    with tempfile.TemporaryDirectory() as tmp:
+        with MockSocrata(df, latency=args.latency) as server:
+            store = os.path.join(tmp, 'serial')
+            rows, baseline = timed(ingest_serial, store, server.json_url, args.page_size)
+            print('%-16s %10.2f %12.0f %10s' % ('serial', baseline, rows / baseline, '1.0x'))
+            for concurrency in args.concurrency:
+                result, seconds = timed(nyc_ingest.ingest, os.path.join(tmp, 'c%i' % concurrency), server.url,
+                                        page_size=args.page_size, concurrency=concurrency)
+                print('%-16s %10.2f %12.0f %9.1fx' % ('concurrency %i' % concurrency, seconds,
+                      result['rows'] / seconds, baseline / seconds))
+        with MockSocrata(df, latency=args.latency, fail_every=5) as server:
+            concurrency = max(args.concurrency)
+            result, seconds = timed(nyc_ingest.ingest, os.path.join(tmp, 'retries'), server.url,
+                                    page_size=args.page_size, concurrency=concurrency)
+            same = nyc_ingest.read_store(os.path.join(tmp, 'retries')).equals(nyc_ingest.read_store(store))
+            print('%-16s %10.2f %12.0f %10s  (%i requests, same rows as serial: %s)' % (
+                  'with 503s', seconds, result['rows'] / seconds, '', server.requests, same))
+
+
+if __name__ == '__main__':
+    main()
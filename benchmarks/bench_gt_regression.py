@@ -0,0 +1,79 @@
+"""Validates GT/gt_regression.py against statsmodels and times it against the app's previous path.
+
+check:   slope, intercept and R² of Price_USD ~ Surface for every (Tipo, Zone) of GT/Scrape_Sale.parquet,
+         compared with statsmodels' OLS (needs statsmodels). Exits with 1 if a relative difference is
+         above TOLERANCE.
+timing:  fit_lines for all the zones at once vs what a rerun did before for one zone, px.scatter with
+         trendline="ols" + get_trendline_results + the summary table through pd.read_html (needs lxml).
+
+Usage: python benchmarks/bench_gt_regression.py --rows 10000 1000000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import synthetic  # also puts GT/ on sys.path
+import gt_data  # noqa: E402
+from gt_regression import fit_lines  # noqa: E402
+
+KEYS = ['Tipo', 'Zone']
+TOLERANCE = 1e-9
+
+
+def check(df):
+    """Largest relative difference with statsmodels over all the zones with a defined fit."""
+    import statsmodels.api as sm
+    fits = fit_lines(df, KEYS)
+    worst = 0
+    for (tipo, zone), fit in fits.iterrows():
+        rows = df[(df['Tipo'] == tipo) & (df['Zone'] == zone)]
+        if np.isnan(fit['r_squared']):
+            continue
+        model = sm.OLS(rows['Price_USD'].values, sm.add_constant(rows['Surface'].values, has_constant='add')).fit()
+        for expected, value in [(model.params[1], fit['slope']), (model.params[0], fit['intercept']),
+                                (model.rsquared, fit['r_squared'])]:
+            worst = max(worst, abs(value - expected) / max(1, abs(expected)))
+    return len(fits), worst
+
+
+def trendline_baseline(rows):
+    import plotly.express as px
+    fig = px.scatter(rows, x='Surface', y='Price_USD', trendline='ols', color='Price_m2_USD')
+    summary = px.get_trendline_results(fig).px_fit_results.iloc[0].summary()
+    table = pd.read_html(summary.tables[0].as_html(), header=None, index_col=0)[0]
+    return table.loc['Dep. Variable:'][3]
+
+
+def best_of(func, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 1000000])
+    parser.add_argument('--skip-baseline', action='store_true', help="don't time the plotly/statsmodels path")
+    args = parser.parse_args()
+
+    zones, worst = check(gt_data.load_dataset(columns=gt_data.APP_COLUMNS))
+    print('statsmodels check: %i zones, max relative difference %.2e' % (zones, worst))
+    if not worst < TOLERANCE:
+        sys.exit('fit_lines differs from statsmodels by more than %.0e' % TOLERANCE)
+
+    print('%10s %18s %22s' % ('rows', 'all zones (ms)', 'trendline 1 zone (ms)'))
+    for nrows in args.rows:
+        df = synthetic.make_listings(nrows)
+        rows = df[(df['Tipo'] == 42021) & (df['Zone'] == 'Zona 15')]
+        baseline = np.nan if args.skip_baseline else best_of(trendline_baseline, rows) * 1000
+        print('%10i %18.2f %22.2f' % (nrows, best_of(fit_lines, df, KEYS) * 1000, baseline))
+
+
+if __name__ == '__main__':
+    main()
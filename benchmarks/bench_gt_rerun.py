@@ -0,0 +1,78 @@
+"""Microbenchmark of the filtering done by a typical rerun of the GT app.
+
+baseline: what the app did before GT/gt_query.py, a Tipo mask, three full copies of the result
+          (data_tot, data_stat, data_stat2), Zone masks and a Bedrooms query for the map.
+indexed:  ListingIndex.select, every selection is a view of the frame sorted by (Tipo, Zone, Bedrooms).
+
+Reports the time and the peak memory allocated (tracemalloc) per rerun on synthetic listings.
+
+Usage: python benchmarks/bench_gt_rerun.py --rows 10000 100000 1000000
+"""
+import argparse
+import time
+import tracemalloc
+
+import synthetic  # also puts GT/ on sys.path
+from gt_query import ListingIndex  # noqa: E402
+
+TIPO = 42021
+ZONE, ZONE_2 = 'Zona 15', 'Zona 10'
+BEDROOMS = 3
+
+
+def rerun_baseline(data):
+    data = data[data['Tipo'] == TIPO]
+    data_tot = data.copy()
+    data_stat = data.copy()
+    data_stat2 = data.copy()
+    data = data[data['Zone'] == ZONE]
+    data_bedrooms = data[data['Bedrooms'] == BEDROOMS]
+    points = data.query("Bedrooms == @BEDROOMS")[['latitude', 'longitude']]
+    data_tot = data_tot[data_tot['City'].isin(['Ciudad de Guatemala'])]
+    data_stat = data_stat[data_stat['Zone'] == ZONE]
+    data_stat2 = data_stat2[data_stat2['Zone'] == ZONE_2]
+    return len(data_bedrooms) + len(points) + len(data_tot) + len(data_stat) + len(data_stat2)
+
+
+def rerun_indexed(index):
+    data = index.select(TIPO, ZONE)
+    data_bedrooms = index.select(TIPO, ZONE, BEDROOMS)
+    points = data_bedrooms[['latitude', 'longitude']]
+    data_stat = index.select(TIPO, ZONE)
+    data_stat2 = index.select(TIPO, ZONE_2)
+    return len(data) + len(data_bedrooms) + len(points) + len(data_stat) + len(data_stat2)
+
+
+def measure(func, arg, repeat=5):
+    """Best time of repeat runs and the peak memory allocated by one run, in MB."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print('%10s %10s %12s %12s %12s %12s' % ('rows', 'index (s)', 'base (ms)', 'base (MB)', 'indexed (ms)', 'indexed (MB)'))
+    for nrows in args.rows:
+        df = synthetic.make_listings(nrows)
+        start = time.perf_counter()
+        index = ListingIndex(df)
+        build = time.perf_counter() - start
+        base_time, base_peak = measure(rerun_baseline, df)
+        indexed_time, indexed_peak = measure(rerun_indexed, index)
+        print('%10i %10.3f %12.2f %12.2f %12.3f %12.3f' % (nrows, build, base_time * 1000, base_peak,
+              indexed_time * 1000, indexed_peak))
+
+
+if __name__ == '__main__':
+    main()
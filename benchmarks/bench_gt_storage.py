@@ -0,0 +1,79 @@
+"""Cold-start load benchmark for the GT dataset: csv vs typed Parquet / Arrow IPC (GT/gt_data.py).
+
+GT/Scrape_Sale.csv is replicated to the requested number of rows and written in each format. Every
+load runs in a fresh python process (cold start) and reports the load time, the size of the loaded
+frame and the growth of the resident memory. The csv path is timed from local disk, the app used
+to download it over HTTP on top of that.
+
+Usage: python benchmarks/bench_gt_storage.py --rows 10000 1000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+GT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'GT')
+sys.path.insert(0, GT_DIR)
+import gt_data  # noqa: E402
+
+# Each snippet gets the file path as `path` and must leave the loaded frame in `data`
+LOADERS = {
+    'csv': "data = pd.read_csv(path); data = data.dropna(subset=['latitude', 'longitude']).drop(['Unnamed: 0'], axis=1)",
+    'parquet': "data = gt_data.load_dataset(path, columns=gt_data.APP_COLUMNS)",
+    'parquet (mmap)': "data = gt_data.load_dataset(path, columns=gt_data.APP_COLUMNS, memory_map=True)",
+    'arrow (mmap)': "data = gt_data.load_dataset(path, columns=gt_data.APP_COLUMNS, memory_map=True)",
+}
+CHILD = """
+import json, os, sys, time
+sys.path.insert(0, %(gt_dir)r)
+import pandas as pd
+import pyarrow.parquet, pyarrow.feather
+import gt_data
+path = %(path)r
+def rss():
+    # Current resident set size in MB (Linux)
+    return int(open('/proc/self/statm').read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+rss_before = rss()
+start = time.perf_counter()
+%(loader)s
+elapsed = time.perf_counter() - start
+rss_after = rss()
+print(json.dumps({'seconds': elapsed, 'frame_mb': data.memory_usage(deep=True).sum() / 2**20,
+                  'rss_mb': rss_after - rss_before}))
+"""
+
+
+def cold_load(loader, path):
+    code = CHILD % {'gt_dir': GT_DIR, 'path': path, 'loader': LOADERS[loader]}
+    return json.loads(subprocess.check_output([sys.executable, '-c', code]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 1000000])
+    args = parser.parse_args()
+
+    source = pd.read_csv(os.path.join(GT_DIR, 'Scrape_Sale.csv'))
+    print('%10s %16s %10s %10s %10s %10s' % ('rows', 'format', 'file (MB)', 'load (s)', 'frame (MB)', 'rss (MB)'))
+    for nrows in args.rows:
+        df = pd.concat([source] * (nrows // len(source) + 1), ignore_index=True)[:nrows]
+        df['Unnamed: 0'] = range(nrows)
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = {'csv': os.path.join(tmp, 'data.csv'), 'parquet': os.path.join(tmp, 'data.parquet'),
+                     'arrow': os.path.join(tmp, 'data.arrow')}
+            df.to_csv(paths['csv'], index=False)
+            gt_data.write_dataset(df, paths['parquet'])
+            gt_data.write_dataset(df, paths['arrow'])
+            for loader in LOADERS:
+                path = paths[loader.split()[0]]
+                result = cold_load(loader, path)
+                print('%10i %16s %10.2f %10.3f %10.1f %10.1f' % (nrows, loader, os.path.getsize(path) / 2**20,
+                      result['seconds'], result['frame_mb'], result['rss_mb']))
+
+
+if __name__ == '__main__':
+    main()
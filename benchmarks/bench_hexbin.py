@@ -0,0 +1,60 @@
+"""Payload and latency of the 3D maps: HexagonLayer with every point vs cells binned on the server
+(common/hexbin.py) drawn with a ColumnLayer.
+
+For each number of points (synthetic NYC collisions) reports the time to bin and style the cells, the
+time to serialize the deck to JSON (what Streamlit sends to the browser) and the size of that JSON.
+
+Usage: python benchmarks/bench_hexbin.py --rows 1000 20000 1000000 --radius 100
+"""
+import argparse
+import os
+import sys
+import time
+
+import pydeck as pdk
+
+import synthetic
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.hexbin import column_layer_props, hex_cells  # noqa: E402
+
+
+def deck(layer):
+    return pdk.Deck(map_style="mapbox://styles/mapbox/light-v9", layers=[layer],
+                    initial_view_state={"latitude": 40.7, "longitude": -73.9, "zoom": 11, "pitch": 50})
+
+
+def points_deck(data, radius):
+    return deck(pdk.Layer("HexagonLayer", data=data[['latitude', 'longitude']], get_position=['longitude', 'latitude'],
+                          radius=radius, extruded=True, elevation_scale=4, elevation_range=[0, 1000]))
+
+
+def cells_deck(data, radius):
+    cells = hex_cells(data['latitude'], data['longitude'], radius=radius)
+    return deck(pdk.Layer("ColumnLayer", elevation_scale=4, **column_layer_props(cells, radius, elevation_range=[0, 1000])))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 20000, 1000000])
+    parser.add_argument('--radius', type=float, default=100)
+    args = parser.parse_args()
+
+    print('%10s %12s %8s %12s %14s %12s' % ('points', 'layer', 'cells', 'build (ms)', 'to_json (ms)', 'JSON (KB)'))
+    for nrows in args.rows:
+        data = synthetic.make_collisions(nrows)[['latitude', 'longitude']].dropna().astype('float64')
+        for name, build in [('points', points_deck), ('server cells', cells_deck)]:
+            result, build_time = timed(build, data, args.radius)
+            payload, json_time = timed(result.to_json)
+            cells = len(result.layers[0].data)
+            print('%10i %12s %8i %12.1f %14.1f %12.1f' % (len(data), name, cells, build_time * 1000,
+                                                        json_time * 1000, len(payload) / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Backfill and incremental update of the NYC collisions store (NYC/nyc_ingest.py) against a local
+mock of the Socrata API (benchmarks/mock_socrata.py) serving synthetic collisions.
+
+For each backfill size:
+  1. the backfill is interrupted after half the rows (max_rows) and resumed, as after a crash
+  2. new rows are published and an incremental run adds only those
+  3. rows reported late (crash_date a few days before the high-water mark) are published and a run adds them
+  4. the store is checked: every collision once, each part in (crash_date, collision_id) order
+and the rows fetched (the lookback window is fetched again) and added, and the throughput (rows/s)
+of each run are reported.
+
+Usage: python benchmarks/bench_ingest.py --rows 1000000 2000000 [--latency 0.05]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pyarrow.parquet as pq
+
+import synthetic
+from mock_socrata import MockSocrata
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'NYC'))
+import nyc_ingest  # noqa: E402
+
+CHUNK_ROWS = 500000
+NEW_ROWS = 25000
+LATE_ROWS = 500
+
+
+def publish(server, nrows, seed, start_id, start_date, days):
+    """Adds synthetic rows to the mock in chunks (to bound the memory of the generation)."""
+    for chunk in range(0, nrows, CHUNK_ROWS):
+        size = min(CHUNK_ROWS, nrows - chunk)
+        df = synthetic.make_collisions(size, seed=seed + chunk, start_id=start_id + chunk,
+                                       start_date=start_date, days=days)
+        # Each chunk covers its own range of days so the rows stay sorted across chunks
+        server.add(df[nyc_ingest.COLUMNS])
+        start_date = str(np.datetime64(start_date) + days)
+
+
+def key_sorted(df):
+    ids = df['collision_id'].astype('int64').values
+    dates = df['crash_date'].values
+    return bool(((dates[1:] > dates[:-1]) | ((dates[1:] == dates[:-1]) & (ids[1:] > ids[:-1]))).all())
+
+
+def check_store(store, expected_rows):
+    df = nyc_ingest.read_store(store, columns=['crash_date', 'collision_id'])
+    parts = [pq.read_table(path, columns=['crash_date', 'collision_id']).to_pandas() for path in nyc_ingest.part_paths(store)]
+    return len(df) == expected_rows and df['collision_id'].is_unique and all(key_sorted(part) for part in parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 2000000])
+    parser.add_argument('--latency', type=float, default=0, help='delay of every response of the mock (s)')
+    parser.add_argument('--page-size', type=int, default=nyc_ingest.PAGE_SIZE)
+    args = parser.parse_args()
+
+    print('%10s %14s %10s %10s %10s %12s %8s' % ('rows', 'run', 'fetched', 'added', 'seconds', 'rows/s', 'check'))
+    for nrows in args.rows:
+        days = 60
+        with MockSocrata(latency=args.latency) as server, tempfile.TemporaryDirectory() as store:
+            publish(server, nrows, 0, 4000000, '2012-07-01', days)
+            runs = [('backfill 1/2', dict(max_rows=nrows // 2)), ('backfill 2/2', {})]
+            for name, kwargs in runs:
+                result = nyc_ingest.ingest(store, server.url, page_size=args.page_size, **kwargs)
+                print('%10i %14s %10i %10i %10.2f %12.0f' % (nrows, name, result['fetched'], result['rows'],
+                      result['seconds'], result['fetched'] / result['seconds']))
+            publish(server, NEW_ROWS, 1, 4000000 + nrows, '2030-01-01', days)
+            result = nyc_ingest.ingest(store, server.url, page_size=args.page_size)
+            print('%10i %14s %10i %10i %10.2f %12.0f' % (nrows, 'incremental', result['fetched'], result['rows'],
+                  result['seconds'], result['fetched'] / result['seconds']))
+            # Dated in the last days of the previous rows, with new collision_ids
+            publish(server, LATE_ROWS, 2, 4000000 + nrows + NEW_ROWS, '2030-02-20', 5)
+            result = nyc_ingest.ingest(store, server.url, page_size=args.page_size)
+            ok = result['rows'] == LATE_ROWS and check_store(store, nrows + NEW_ROWS + LATE_ROWS)
+            print('%10i %14s %10i %10i %10.2f %12.0f %8s' % (nrows, 'late rows', result['fetched'], result['rows'],
+                  result['seconds'], result['fetched'] / result['seconds'], 'ok' if ok else 'FAILED'))
+
+
+if __name__ == '__main__':
+    main()
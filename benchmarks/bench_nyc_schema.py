@@ -0,0 +1,57 @@
+"""Parse time and memory per row of the NYC collisions: the previous load_data vs the typed schema
+of NYC/nyc_data.py.
+
+baseline: the whole API frame (every column, as pd.DataFrame.from_records gives it), to_datetime
+          on crash_date and crash_time, astype(int) on the injury counts and astype(float) on the
+          coordinates
+typed:    parse_collisions on the columns the app uses (as read from the store)
+
+Usage: python benchmarks/bench_nyc_schema.py --rows 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+import synthetic
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'NYC'))
+from nyc_data import RAW_COLUMNS, parse_collisions  # noqa: E402
+
+
+def load_data_baseline(df):
+    df['crash_date'] = pd.to_datetime(df['crash_date']) #Parse dates
+    df['crash_time'] = pd.to_datetime(df['crash_time'], format = '%H:%M') #Parse time
+    data = df
+    data.dropna(subset=['latitude', 'longitude'], inplace = True) #Drop missing values (NAs)
+    data['number_of_persons_injured'] = data['number_of_persons_injured'].astype(int)
+    data['number_of_pedestrians_injured'] = data['number_of_pedestrians_injured'].astype(int)
+    data['number_of_cyclist_injured'] = data['number_of_cyclist_injured'].astype(int)
+    data['number_of_motorist_injured'] = data['number_of_motorist_injured'].astype(int)
+    data['latitude'] = data['latitude'].astype(float)
+    data['longitude'] = data['longitude'].astype(float)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    args = parser.parse_args()
+
+    print('%10s %10s %12s %14s %14s' % ('rows', 'path', 'parse (s)', 'bytes/row', 'frame (MB)'))
+    for nrows in args.rows:
+        # Objects, as the API frame has them (pandas >= 3 would otherwise infer its string dtype)
+        raw = synthetic.make_collisions(nrows).astype('object')
+        for name, parse, columns in [('baseline', load_data_baseline, list(raw.columns)),
+                                     ('typed', parse_collisions, RAW_COLUMNS)]:
+            df = raw[columns].copy()
+            start = time.perf_counter()
+            parsed = parse(df)
+            seconds = time.perf_counter() - start
+            size = parsed.memory_usage(deep=True).sum()
+            print('%10i %10s %12.3f %14.1f %14.1f' % (nrows, name, seconds, size / len(parsed), size / 2**20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Latency of each interaction of the NYC dashboard: filtering the frame on every rerun (before
+NYC/nyc_views.py) vs lookups in the precomputed CollisionViews.
+
+The collisions are synthetic, generated and parsed (NYC/nyc_data.py) in chunks, the rows without
+coordinates (~8%) are dropped by the parsing. The results of both paths are compared before timing
+them.
+
+Usage: python benchmarks/bench_nyc_views.py --rows 1000000 5000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import synthetic
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'NYC')]
+from common.hexbin import hex_cells  # noqa: E402
+from nyc_data import RAW_COLUMNS, parse_collisions  # noqa: E402
+from nyc_views import VICTIMS, CollisionViews  # noqa: E402
+
+CHUNK_ROWS = 500000
+HOUR, INJURED, VICTIM = 17, 2, 'Cyclists'
+
+
+def make_data(nrows):
+    chunks = [parse_collisions(synthetic.make_collisions(min(CHUNK_ROWS, nrows - start), seed=start)[RAW_COLUMNS])
+              for start in range(0, nrows, CHUNK_ROWS)]
+    return pd.concat(chunks, ignore_index=True)
+
+
+def hour_baseline(data, hour):
+    data = data[data['crash_minute'] // 60 == hour]
+    midpoint = (np.average(data['latitude']), np.average(data['longitude']))
+    cells = hex_cells(data['latitude'], data['longitude'], radius=100)
+    hist = np.histogram(data['crash_minute'] % 60, bins=60, range=(0, 60))[0]
+    return data, midpoint, cells, hist
+
+
+def hour_views(views, hour):
+    return views.hour(hour), views.hour_midpoints[hour], views.hour_cells[hour], views.minute_counts[hour]
+
+
+def injured_baseline(data, k):
+    return data.query("number_of_persons_injured >= @k")[['latitude', 'longitude']].dropna(how='any')
+
+
+def streets_baseline(data, victim):
+    # Ranks single crashes, as the section used to
+    col = VICTIMS[victim]
+    return data.query('%s >= 1' % col)[['on_street_name', col]].sort_values(by=[col], ascending=False).dropna(how='any')[:5]
+
+
+def streets_aggregated(data, victim):
+    # What the section should show, computed from the frame on every rerun
+    col = VICTIMS[victim]
+    totals = data.groupby('on_street_name', observed=True)[col].sum()
+    return totals[totals >= 1].sort_values(ascending=False, kind='mergesort')[:5]
+
+
+def best_of(func, *args, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 5000000])
+    args = parser.parse_args()
+
+    print('%10s %-26s %14s %14s' % ('rows', 'interaction', 'rerun (ms)', 'views (ms)'))
+    for nrows in args.rows:
+        data = make_data(nrows)
+        start = time.perf_counter()
+        views = CollisionViews(data)
+        build = time.perf_counter() - start
+
+        # Same results
+        rows, _, _, hist = hour_baseline(data, HOUR)
+        assert (hist == views.minute_counts[HOUR]).all() and len(rows) == len(views.hour(HOUR))
+        assert len(injured_baseline(data, INJURED)) == len(views.injured_at_least(INJURED))
+        expected = streets_aggregated(data, VICTIM)
+        assert (expected.values == views.top_streets[VICTIM][VICTIMS[VICTIM]].values).all()
+
+        print('%10i %-26s %14s %14.0f' % (len(data), 'build views (once)', '', build * 1000))
+        for name, baseline, lookup, arg in [
+                ('hour slider', hour_baseline, hour_views, HOUR),
+                ('injured slider', injured_baseline, CollisionViews.injured_at_least, INJURED),
+                ('street selectbox', streets_baseline, lambda views, victim: views.top_streets[victim], VICTIM),
+                ('street selectbox (totals)', streets_aggregated, lambda views, victim: views.top_streets[victim], VICTIM)]:
+            print('%10i %-26s %14.2f %14.4f' % (len(data), name, best_of(baseline, data, arg), best_of(lookup, views, arg)))
+
+
+if __name__ == '__main__':
+    main()
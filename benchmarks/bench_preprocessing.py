@@ -0,0 +1,222 @@
+"""Benchmark for the preprocessing of the raw scrape dumps.
+
+Generates synthetic raw dumps (same shape as the scraped json flattened with json_normalize),
+runs the current Preprocessing.process_dataset against the original per-row implementation and
+checks that both produce identical output.
+With --streaming it also compares the peak memory of process_dataset against the chunked
+Preprocessing.process_files on the same dump written to disk.
+With --fences it reports the accuracy of the outlier fences computed from merged per-chunk
+quantile sketches against the exact fences on the synthetic dumps (the bounds are checked by
+Processing Scripts/test_preprocessing.py).
+
+Usage: python benchmarks/bench_preprocessing.py --sizes 10000 100000 1000000 [--streaming | --fences]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from feature_engine import outliers as outr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Processing Scripts'))
+import Preprocessing  # noqa: E402
+
+
+ZONES = ['Zona %i' % i for i in (1, 4, 7, 9, 10, 11, 13, 14, 15, 16, 18)] + ['Zona 4 de Mixco']
+CITIES = ['Ciudad de Guatemala', 'Mixco', 'Villa Nueva']
+
+
+def make_raw_dump(nrows, seed=0):
+    """Creates a synthetic raw scrape dump with nrows listings.
+    Includes the cases the preprocessing has to handle: prices in Q, missing zones,
+    listings with less than four parameters, surfaces with "hasta" and duplicated listings.
+    """
+    rng = np.random.RandomState(seed)
+    lat = np.round(14.55 + rng.rand(nrows) * 0.15, 3)
+    lon = np.round(-90.60 + rng.rand(nrows) * 0.15, 3)
+    tipo = rng.choice([42020, 42021], nrows)
+    bedrooms = rng.randint(0, 7, nrows)
+    bathrooms = rng.randint(1, 6, nrows)
+    surface = np.round(rng.lognormal(5, 0.6, nrows)).astype(int)
+    price = np.round(surface * rng.lognormal(7.2, 0.4, nrows), 2)
+    currency = rng.choice(['US$', 'Q'], nrows, p=[0.8, 0.2])
+    price = np.where(currency == 'Q', np.round(price * 7.65), price)
+    zone = rng.choice(ZONES, nrows).astype(object)
+    zone[rng.rand(nrows) < 0.03] = np.nan
+
+    extra = ", ".join("{'id': 'extra_%i', 'name': 'Extra', 'value': '%i'}" % (i, i) for i in range(5))
+    parameters = []
+    for i in range(nrows):
+        surface_value = "hasta %i" % surface[i] if i % 97 == 0 else "%i" % surface[i]
+        params = ["{'id': 'type', 'value': %i}" % tipo[i],
+                  "{'id': 'rooms', 'name': 'Habitaciones', 'value': '%i'}" % bedrooms[i],
+                  "{'id': 'bathrooms', 'name': 'Baños', 'value': '%i'}" % bathrooms[i]]
+        if i % 53 != 0:
+            params.append("{'id': 'surface', 'name': 'Superficie', 'value': '%s', 'value_name': '%s m²'}" % (surface_value, surface_value))
+            params.append(extra)
+        parameters.append('[' + ', '.join(params) + ']')
+
+    df = pd.DataFrame({
+        'id': np.arange(nrows),
+        'created_at': '2021-01-05T18:58:16-06:00',
+        'title': 'Listing',
+        'images': '[]',
+        'display_date': '2021-01-06T00:58:14+0000',
+        'user_id': rng.randint(0, 5000, nrows),
+        'created_at_first': '2021-01-05T18:58:14-06:00',
+        'locations': ["[{'lat': %r, 'lon': %r}]" % (float(a), float(b)) for a, b in zip(lat, lon)],
+        'parameters': parameters,
+        'locations_resolved.ADMIN_LEVEL_3_name': rng.choice(CITIES, nrows),
+        'locations_resolved.SUBLOCALITY_LEVEL_1_name': zone,
+        'price.value.raw': price,
+        'price.value.currency.pre': currency,
+    })
+    # Relisted properties show up more than once in the dumps
+    dupes = df.sample(frac=0.05, random_state=seed)
+    return pd.concat([df, dupes], ignore_index=True)
+
+
+def process_dataset_baseline(df):
+    """Original per-row implementation of Preprocessing.process_dataset, kept as the reference."""
+    df['location_new'] = df.locations
+    df['location_new'] = df.location_new.map(lambda x: x.strip('[]'))
+
+    def string_to_dict(dict_string):
+        dict_string = dict_string.replace("'", '"')
+        return json.loads(dict_string)
+
+    df.location_new = df.location_new.apply(string_to_dict)
+    df['latitude'] = df.location_new.map(lambda x: x['lat'])
+    df['longitude'] = df.location_new.map(lambda x: x['lon'])
+    df[['1','2','3','4','5','6','7','8','9']] = df['parameters'].str.split(r'(?<=},)\s', expand=True)
+    df = df.rename(columns={"locations_resolved.ADMIN_LEVEL_3_name":"City","1": "Tipo", "2": "Bedrooms",
+                            "3":"Bathrooms", "4":"Surface"})
+    df = df.drop(['5','6','7','8','9'], axis=1)
+    df = df.dropna(subset=["Bedrooms","Bathrooms","Surface"])
+    df.Tipo = df.Tipo.map(lambda x: x.strip('[],'))
+    df.Bedrooms = df.Bedrooms.map(lambda x: x.strip('[],'))
+    df.Bathrooms = df.Bathrooms.map(lambda x: x.strip('[],'))
+    df.Surface = df.Surface.map(lambda x: x.strip('[],'))
+    df.Tipo = df.Tipo.apply(string_to_dict)
+    df.Bedrooms = df.Bedrooms.apply(string_to_dict)
+    df.Bathrooms = df.Bathrooms.apply(string_to_dict)
+    df.Surface = df.Surface.apply(string_to_dict)
+    df['Tipo'] = [d.get('value') for d in df["Tipo"]]
+    df['Bedrooms'] = [d.get('value') for d in df["Bedrooms"]]
+    df['Bathrooms'] = [d.get('value') for d in df["Bathrooms"]]
+    df['Surface'] = [d.get('value') for d in df["Surface"]]
+    for var in ['Bedrooms','Bathrooms']:
+        df[var] = df[var].astype('int64')
+    df['Zone'] = df['locations_resolved.SUBLOCALITY_LEVEL_1_name']
+    df = df.dropna(subset=['Zone'])
+    df['Zone_Val'] = df['Zone'].str.extract(r'(\d+)').astype(int)
+    df['Price_USD'] = df['price.value.raw']
+    df.loc[df['price.value.currency.pre'] == 'Q', 'Price_USD'] = df['Price_USD']/7.65
+    df['Price_USD'] = round(df['Price_USD'],2)
+    df = df[~df.Surface.str.contains("hasta")]
+    df['Surface'] = df['Surface'].astype('float64')
+    df['Price_m2_USD'] = round(df['Price_USD']/df['Surface'],2)
+    df = df.drop_duplicates(subset=['latitude','longitude','Price_USD'])
+    df = df[df['Surface'] >= 30]
+    capper_right = outr.OutlierTrimmer(distribution='skewed', tail='right', fold=2, variables=['Surface','Price_m2_USD'])
+    capper_right.fit(df)
+    df2 = capper_right.transform(df)
+    capper_left = outr.OutlierTrimmer(distribution='quantiles', tail='left', fold=0.02, variables=['Price_m2_USD'])
+    capper_left.fit(df)
+    df3 = capper_left.transform(df2)
+    return df3[Preprocessing.OUTPUT_COLUMNS]
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def peak_memory(func, *args):
+    """Runs func and returns its elapsed time and peak traced memory in MB."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_streaming(nrows, chunksize):
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_path = os.path.join(tmp, 'raw.csv')
+        make_raw_dump(nrows).to_csv(raw_path, index=False)
+        t_full, mem_full = peak_memory(lambda: Preprocessing.process_dataset(pd.read_csv(raw_path)).to_csv(os.path.join(tmp, 'full.csv')))
+        # Sketches as large as the dataset give the exact fences, so both outputs must match
+        t_chunk, mem_chunk = peak_memory(Preprocessing.process_files, [raw_path], os.path.join(tmp, 'chunked.csv'), chunksize, nrows*2)
+        pd.testing.assert_frame_equal(pd.read_csv(os.path.join(tmp, 'full.csv'), index_col=0),
+                                      pd.read_csv(os.path.join(tmp, 'chunked.csv'), index_col=0))
+    print('%10i %12.3f %12.1f %12.3f %12.1f' % (nrows, t_full, mem_full, t_chunk, mem_chunk))
+
+
+def check_fences(nrows, chunksize, k):
+    """Builds one FenceSketch per chunk, merges them and compares the fences with the exact ones.
+    The error is measured in rank: the fraction of listings that end up on the wrong side of the fence.
+    """
+    df = Preprocessing.parse_listings(make_raw_dump(nrows))
+    df = df.drop_duplicates(subset=Preprocessing.DEDUP_COLUMNS)
+    df = df[df['Surface'] >= 30]
+    exact = Preprocessing.compute_fences(np.quantile(df['Surface'], Preprocessing.FENCE_QUANTILES),
+                                         np.quantile(df['Price_m2_USD'], Preprocessing.FENCE_QUANTILES))
+    sketches = [Preprocessing.FenceSketch(k).update(df[i:i + chunksize]) for i in range(0, len(df), chunksize)]
+    sketch = sketches[0]
+    for other in sketches[1:]:
+        sketch.merge(other)
+    approx = sketch.fences()
+
+    for var in exact:
+        for side, (exact_fence, approx_fence) in zip(('lower', 'upper'), zip(exact[var], approx[var])):
+            if exact_fence is None:
+                continue
+            rank_error = abs((df[var] <= approx_fence).mean() - (df[var] <= exact_fence).mean())
+            print('%10i %14s %6s %12.2f %12.2f %11.4f' % (nrows, var, side, exact_fence, approx_fence, rank_error))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--skip-baseline', action='store_true', help='Only time the current implementation')
+    parser.add_argument('--streaming', action='store_true', help='Compare in-memory and chunked processing')
+    parser.add_argument('--fences', action='store_true', help='Check the accuracy of the sketched outlier fences')
+    parser.add_argument('--chunksize', type=int, default=50000)
+    parser.add_argument('--sketch-k', type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.fences:
+        print('%10s %14s %6s %12s %12s %11s' % ('rows', 'variable', 'tail', 'exact', 'sketch', 'rank error'))
+        for nrows in args.sizes:
+            check_fences(nrows, args.chunksize, args.sketch_k)
+        return
+
+    if args.streaming:
+        print('%10s %12s %12s %12s %12s' % ('rows', 'full (s)', 'full (MB)', 'chunked (s)', 'chunked (MB)'))
+        for nrows in args.sizes:
+            bench_streaming(nrows, args.chunksize)
+        return
+
+    print('%10s %14s %14s %9s' % ('rows', 'baseline (s)', 'current (s)', 'speedup'))
+    for nrows in args.sizes:
+        raw = make_raw_dump(nrows)
+        current, t_current = timeit(Preprocessing.process_dataset, raw.copy())
+        if args.skip_baseline:
+            print('%10i %14s %14.3f %9s' % (nrows, '-', t_current, '-'))
+            continue
+        baseline, t_baseline = timeit(process_dataset_baseline, raw.copy())
+        pd.testing.assert_frame_equal(current, baseline)
+        print('%10i %14.3f %14.3f %8.1fx' % (nrows, t_baseline, t_current, t_baseline / t_current))
+
+
+if __name__ == '__main__':
+    main()
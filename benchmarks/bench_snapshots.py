@@ -0,0 +1,97 @@
+"""Price trends of a type and zone over many GT snapshots: scanning every snapshot on a request vs the
+incrementally maintained series of GT/gt_snapshots.py.
+
+Synthetic monthly snapshots in the shape of Scrape_Sale.csv: each one relists part of the previous
+snapshot (some of them at a new price) and adds new listings. They are ingested one by one into a
+temporary store, the time of every ingestion is reported. The baseline reads and normalizes every
+snapshot, deduplicates the observations and computes the series, as a request would have to
+without the store. Both series are compared before timing the requests.
+
+Usage: python benchmarks/bench_snapshots.py --snapshots 12 --rows 100000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import synthetic  # also puts GT/ on sys.path
+import gt_snapshots  # noqa: E402
+
+TIPO, ZONE = 42021, 'Zona 10'
+
+
+def make_snapshots(directory, count, nrows, relist=0.6, reprice=0.1, seed=0):
+    """Writes count monthly snapshots of nrows listings, returns their paths."""
+    rng = np.random.RandomState(seed)
+    paths, previous = [], None
+    for i in range(count):
+        date = pd.Timestamp('2020-01-01') + pd.DateOffset(months=i)
+        df = synthetic.make_listings(nrows, seed=seed + i)
+        if previous is not None:
+            kept = previous.iloc[rng.rand(len(previous)) < relist].copy()
+            repriced = rng.rand(len(kept)) < reprice
+            kept.loc[repriced, 'Price_USD'] = (kept.loc[repriced, 'Price_USD'] * rng.uniform(0.9, 1.1, repriced.sum())).round()
+            df = pd.concat([kept, df.iloc[len(kept):]], ignore_index=True)
+        df['created_at'] = (date + pd.to_timedelta(rng.randint(0, 28, len(df)), unit='D')).strftime('%Y-%m-%dT12:00:00-06:00')
+        path = os.path.join(directory, 'Scrape_Sale_%s.csv' % date.strftime('%m-%d-%Y'))
+        df.to_csv(path)
+        paths.append(path)
+        previous = df
+    return paths
+
+
+def series_baseline(paths):
+    """Every snapshot read, normalized and deduplicated on each request: an observation is kept unless its
+    listing had the same price in the previous snapshot the listing was seen in (or earlier in its own one).
+    """
+    frames = [gt_snapshots.read_snapshot(path)[1].assign(i=i) for i, path in enumerate(paths)]
+    df = pd.concat(frames, ignore_index=True)
+    df = df.drop_duplicates(['listing_id', 'Price_USD', 'i'])
+    seen = df[['listing_id', 'i']].drop_duplicates()
+    seen['previous'] = seen.groupby('listing_id')['i'].shift()
+    df = df.merge(seen, on=['listing_id', 'i'], how='left')
+    repeated = df.merge(df[['listing_id', 'Price_USD', 'i']].rename(columns={'i': 'previous'}),
+                        on=['listing_id', 'Price_USD', 'previous'], how='left', indicator=True)['_merge'] == 'both'
+    return gt_snapshots.monthly_series(df[~repeated.values])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--snapshots', type=int, default=12)
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = make_snapshots(directory, args.snapshots, args.rows)
+        store = os.path.join(directory, 'store')
+        print('%10s %10s %10s %12s' % ('snapshot', 'rows', 'added', 'ingest (s)'))
+        for path in paths:
+            start = time.perf_counter()
+            result = gt_snapshots.ingest_snapshot(path, store)
+            print('%10s %10i %10i %12.2f' % (result['snapshot'].strftime('%Y-%m'), result['rows'], result['added'],
+                                             time.perf_counter() - start))
+
+        start = time.perf_counter()
+        baseline = series_baseline(paths)
+        baseline_time = time.perf_counter() - start
+        series = gt_snapshots.read_series(store)
+        baseline['month'] = pd.to_datetime(baseline['month'])
+        pd.testing.assert_frame_equal(series, baseline, check_dtype=False)
+
+        start = time.perf_counter()
+        for _ in range(100):
+            trend = series[(series['Tipo'] == TIPO) & (series['Zone'] == ZONE)]
+        lookup_time = (time.perf_counter() - start) / 100
+        print('request, scanning all the snapshots: %.2f s' % baseline_time)
+        print('request, lookup in the series:       %.3f ms (%i months)' % (lookup_time * 1000, len(trend)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
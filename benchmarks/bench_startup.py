@@ -0,0 +1,113 @@
+"""Startup profile of the Streamlit apps.
+
+imports:       standalone import time of each heavy module, in a fresh python process (-X importtime)
+first render:  in a fresh process, the time from the start of the app script to its first element
+               (what a new session sees first), to the end of the script, and the heavy modules the
+               script imported on the way. streamlit itself is imported before the clock starts, as
+               the server has it loaded before running the script. The script runs without a server
+               (Streamlit's bare mode), so elements aren't sent anywhere.
+
+The NYC app queries the NYC Open Data API when it starts, without network access only its first
+render is reported.
+
+Usage: python benchmarks/bench_startup.py [--apps gt nyc] [--repeat 3] [--json] [--budget SECONDS]
+With --budget the exit code is 1 if the first render of any app takes longer than SECONDS.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APPS = {'gt': os.path.join(ROOT, 'GT', 'real_estate_gt.py'), 'nyc': os.path.join(ROOT, 'NYC', 'nyc.py')}
+MODULES = ['streamlit', 'numpy', 'pandas', 'pyarrow', 'plotly.express', 'pydeck', 'sodapy', 'statsmodels.api',
+           'scipy.spatial', 'aiohttp']
+CHILD = """
+import json, os, runpy, sys, time
+import streamlit
+from streamlit.delta_generator import DeltaGenerator
+path = %(path)r
+heavy = %(modules)r
+times = {}
+enqueue = DeltaGenerator._enqueue
+def timed_enqueue(self, *args, **kwargs):
+    times.setdefault('first_render', time.perf_counter() - start)
+    return enqueue(self, *args, **kwargs)
+DeltaGenerator._enqueue = timed_enqueue
+sys.path.insert(0, os.path.dirname(path))
+loaded = set(sys.modules)
+error = None
+start = time.perf_counter()
+try:
+    runpy.run_path(path, run_name='__main__')
+    times['script'] = time.perf_counter() - start
+except BaseException as e:
+    error = '%%s: %%s' %% (type(e).__name__, e)
+imported = [name for name in heavy if name in sys.modules and name not in loaded]
+print(json.dumps({'times': times, 'imported': imported, 'error': error}))
+"""
+
+
+def import_time(module):
+    """Cumulative import time of module in a fresh process, in seconds."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True).stderr
+    # Lines look like "import time:  self [us] | cumulative | imported package", nested imports are indented
+    cumulative = re.findall(r'import time:\s+\d+ \|\s+(\d+) \| (\S.*)$', stderr, re.M)
+    return sum(int(us) for us, name in cumulative if name == module.strip()) / 1e6 or None
+
+
+def run_app(path):
+    code = CHILD % {'path': path, 'modules': MODULES}
+    out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                         universal_newlines=True, cwd=os.path.dirname(path)).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--apps', nargs='+', choices=sorted(APPS), default=sorted(APPS))
+    parser.add_argument('--repeat', type=int, default=3, help='fresh processes per measurement (median reported)')
+    parser.add_argument('--json', action='store_true', help='print a single JSON document instead of tables')
+    parser.add_argument('--budget', type=float, help='fail if the first render takes longer (seconds)')
+    args = parser.parse_args()
+
+    report = {'imports': {}, 'apps': {}}
+    for module in MODULES:
+        times = [import_time(module) for _ in range(args.repeat)]
+        report['imports'][module] = None if None in times else statistics.median(times)
+    for app in args.apps:
+        runs = [run_app(APPS[app]) for _ in range(args.repeat)]
+        result = {'imported': runs[-1]['imported'], 'error': runs[-1]['error']}
+        for key in ['first_render', 'script']:
+            values = [run['times'][key] for run in runs if key in run['times']]
+            result[key] = statistics.median(values) if values else None
+        report['apps'][app] = result
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print('%-16s %12s' % ('module', 'import (s)'))
+        for module, seconds in report['imports'].items():
+            print('%-16s %12s' % (module, 'n/a' if seconds is None else '%.3f' % seconds))
+        print()
+        print('%-6s %16s %12s  %s' % ('app', 'first render (s)', 'script (s)', 'heavy modules imported by the script'))
+        for app, result in report['apps'].items():
+            print('%-6s %16s %12s  %s' % (app, *['n/a' if result[key] is None else '%.3f' % result[key]
+                                              for key in ['first_render', 'script']], ', '.join(result['imported'])))
+            if result['error']:
+                print('       stopped by %s' % result['error'][:100])
+
+    if args.budget is not None:
+        slow = [app for app, result in report['apps'].items()
+                if result['first_render'] is None or result['first_render'] > args.budget]
+        if slow:
+            print('first render over budget (%.3f s): %s' % (args.budget, ', '.join(slow)), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
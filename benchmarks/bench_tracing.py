@@ -0,0 +1,94 @@
+"""Overhead of the rerun traces of common/tracing.py, disabled (the default) and enabled.
+
+marks:   time of a section mark and of a stage (entering and leaving its context), per call, with
+         APP_TRACE unset and set (the enabled marks read the RSS from /proc on every call).
+reruns:  the load test of bench_apps.py on the GT app with tracing off, on, and on with cProfile
+         (APP_TRACE_PROFILE_DIR): p50/p99 of the reruns and the # of traces written to the log.
+
+Usage: python benchmarks/bench_tracing.py --rows 10000 --sessions 1 4 --reruns 20
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import bench_apps
+
+sys.path.insert(0, bench_apps.ROOT)
+from common import tracing  # noqa: E402
+
+
+def per_call(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def measure_marks(calls):
+    """us per section mark and per stage, with tracing disabled and enabled."""
+    results = {}
+    for enabled in (False, True):
+        tracing.ENABLED = enabled
+        tracing.LOG_PATH = os.devnull
+        rerun = tracing.start_rerun('bench')
+
+        def section():
+            rerun.section('section')
+
+        def stage():
+            with tracing.stage('stage'):
+                pass
+        results[enabled] = per_call(section, calls), per_call(stage, calls)
+        if enabled:
+            del rerun.sections[:], rerun.stages[:]
+            rerun.finish()
+    tracing.ENABLED = False
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--reruns', type=int, default=20)
+    parser.add_argument('--calls', type=int, default=100000)
+    args = parser.parse_args()
+
+    marks = measure_marks(args.calls)
+    print('%-10s %12s %12s' % ('tracing', 'section (us)', 'stage (us)'))
+    for enabled, (section, stage) in marks.items():
+        print('%-10s %12.3f %12.3f' % ('on' if enabled else 'off', section, stage))
+    print()
+
+    directory = tempfile.mkdtemp()
+    try:
+        data_env = bench_apps.write_gt(directory, args.rows)
+        log = os.path.join(directory, 'traces.jsonl')
+        scenarios = [('off', {}), ('on', {'APP_TRACE': '1', 'APP_TRACE_LOG': log}),
+                     ('on+profile', {'APP_TRACE': '1', 'APP_TRACE_LOG': log,
+                                     'APP_TRACE_PROFILE_DIR': os.path.join(directory, 'profiles')})]
+        print('%-12s %8s %10s %10s %8s' % ('tracing', 'sessions', 'p50 (ms)', 'p99 (ms)', 'traces'))
+        for sessions in args.sessions:
+            for name, env in scenarios:
+                if os.path.exists(log):
+                    os.remove(log)
+                cache_dir = tempfile.mkdtemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+                try:
+                    result = bench_apps.run_scenario('gt', dict(data_env, **env), sessions, args.reruns, cache_dir)
+                finally:
+                    shutil.rmtree(cache_dir)
+                if result.get('errors'):
+                    print('%-12s %8i errors: %s' % (name, sessions, result['errors']))
+                    continue
+                traces = sum(1 for _ in open(log)) if os.path.exists(log) else 0
+                print('%-12s %8i %10.1f %10.1f %8i' % (name, sessions, result['rerun_ms']['p50'],
+                                                       result['rerun_ms']['p99'], traces))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
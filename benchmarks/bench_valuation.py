@@ -0,0 +1,79 @@
+"""Throughput of the batch valuation of GT/gt_valuation.py, in rows per second.
+
+fit:      fitting the per-zone models on the synthetic listings (done once per version of the data).
+baseline: valuing row by row, looking up the coefficients of each (Tipo, Zone) in a dict, on a
+          sample of the input (its rate is what a loop over the whole input would get).
+value:    ValuationModel.value on the whole input in memory.
+stream:   the CLI path (value_file), from an input file to an output file in chunks, CSV and Parquet.
+
+The estimates of the baseline are checked against value on the sample.
+
+Usage: python benchmarks/bench_valuation.py --rows 1000000 --sample 20000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import synthetic  # also puts GT/ on sys.path
+from gt_valuation import ADJUSTMENTS, FIT_COLUMNS, INPUT_COLUMNS, ValuationModel, value_file  # noqa: E402
+
+
+def value_rows(model, df):
+    """Row by row: the coefficients of the zone (or of the Tipo) from a dict, the estimate in Python."""
+    coefficients = {(row['Tipo'], row['Zone']): row for row in model.coefficients.to_dict('records')}
+    estimates = []
+    for row in df.itertuples(index=False):
+        c = coefficients.get((row.Tipo, row.Zone)) or coefficients.get((row.Tipo, None))
+        price_m2 = c['intercept'] + sum(c['slope_' + col] * (getattr(row, col) - c['mean_' + col]) for col in ADJUSTMENTS)
+        estimates.append(price_m2 * row.Surface)
+    return np.array(estimates)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='rows of the input (and of the listings fitted on)')
+    parser.add_argument('--sample', type=int, default=20000, help='rows valued by the baseline')
+    args = parser.parse_args()
+
+    listings = synthetic.make_listings(args.rows, columns=FIT_COLUMNS)
+    batch = synthetic.make_listings(args.rows, seed=1, columns=INPUT_COLUMNS)
+    batch['Zone'] = batch['Zone'].astype(str)
+    print('%-16s %10s %10s %14s' % ('path', 'rows', 'time (s)', 'rows/s'))
+
+    seconds, model = timed(ValuationModel.fit, listings)
+    print('%-16s %10i %10.2f %14s' % ('fit', len(listings), seconds, '-'))
+
+    sample = batch.iloc[:args.sample]
+    seconds, estimates = timed(value_rows, model, sample)
+    assert np.allclose(estimates, model.value(sample)['est_Price_USD'].values)
+    print('%-16s %10i %10.2f %14.0f' % ('baseline', len(sample), seconds, len(sample) / seconds))
+
+    seconds, _ = timed(model.value, batch)
+    print('%-16s %10i %10.2f %14.0f' % ('value', len(batch), seconds, len(batch) / seconds))
+
+    directory = tempfile.mkdtemp()
+    try:
+        for ext in ('csv', 'parquet'):
+            input_path = os.path.join(directory, 'input.' + ext)
+            if ext == 'csv':
+                batch.to_csv(input_path, index=False)
+            else:
+                batch.to_parquet(input_path, index=False)
+            seconds, rows = timed(value_file, input_path, os.path.join(directory, 'output.' + ext), model)
+            print('%-16s %10i %10.2f %14.0f' % ('stream ' + ext, rows, seconds, rows / seconds))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""Local stand-in for the Socrata API of the NYC collisions dataset, to test and benchmark the ingestion.
+
+Serves canned rows (a dataframe of strings sorted by crash_date, collision_id) at /resource/<id>.csv
+and /resource/<id>.json, answering the queries NYC/nyc_ingest.py makes: $limit, $offset and the
+$where of the lookback window (crash_date >= date) or of the keyset pages of the serial baseline
+(the rows are already in $order, a DESC $order serves them newest first, and $select isn't applied,
+it serves the columns it's given). Rows
+are encoded to CSV and JSON once when added, so serving a page is a slice of a buffer and the
+client dominates the timings. Nulls are empty CSV fields and are omitted from the JSON rows, like
+Socrata does. Rows added with an earlier crash_date than the last ones (reported late) are merged
+into the rows they belong with, re-encoding those.
+
+    with MockSocrata(df, latency=0.05) as server:
+        nyc_ingest.ingest(store, server.url)
+
+latency delays every response (seconds) and fail_every makes every n-th request fail with a 503.
+"""
+import io
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+WHERE_PATTERN = re.compile(r"crash_date > '([^']*)' OR \(crash_date = '[^']*' AND collision_id > (\d+)\)")
+SINCE_PATTERN = re.compile(r"crash_date >= '([^']*)'")
+
+
+def join_rows(rows):
+    """The encoded rows as one bytes buffer and the row offsets."""
+    encoded = [row.encode() for row in rows]
+    offsets = np.r_[0, np.cumsum([len(row) for row in encoded])]
+    return b''.join(encoded), offsets
+
+
+def encode_rows(df):
+    """JSON object of every row (without its null fields), see join_rows."""
+    rows = pd.Series('{', index=df.index)
+    for col in df.columns:
+        values = df[col]
+        text = values.astype(str).str.replace('\\', '\\\\', regex=False).str.replace('"', '\\"', regex=False)
+        rows += np.where(values.isnull(), '', '"%s":"' % col + text + '",')
+    return join_rows(rows.str[:-1] + '},')
+
+
+def encode_csv_rows(df):
+    """CSV line of every row (every value quoted, nulls empty), see join_rows."""
+    rows = None
+    for col in df.columns:
+        values = df[col]
+        field = pd.Series(np.where(values.isnull(), '', '"' + values.astype(str).str.replace('"', '""', regex=False) + '"'),
+                          index=df.index)
+        rows = field if rows is None else rows + ',' + field
+    return join_rows(rows + '\n' if rows is not None else [])
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing pooled connections, or giving up on a request, aren't errors here
+        pass
+
+
+class MockSocrata:
+    def __init__(self, df=None, latency=0, fail_every=0, resource='h9gi-nx95'):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.resource = resource
+        self.requests = 0
+        self.columns = None
+        self.blobs, self.offsets, self.dates, self.ids = {'json': [], 'csv': []}, {'json': [], 'csv': []}, [], []
+        self.lock = threading.Lock()
+        self.server = None
+        if df is not None:
+            self.add(df)
+
+    def add(self, df):
+        """Adds rows sorted by crash_date, collision_id (rows before the last ones served are merged in)."""
+        self.columns = self.columns or list(df.columns)
+        df = df[self.columns]
+        with self.lock:
+            # Chunks with rows after the first new one are decoded and sorted again with the new rows
+            first = (df['crash_date'].iloc[0].encode(), int(df['collision_id'].iloc[0]))
+            merge = len(self.ids)
+            while merge and (self.dates[merge - 1][-1], self.ids[merge - 1][-1]) > first:
+                merge -= 1
+            if merge < len(self.ids):
+                header = (','.join('"%s"' % col for col in self.columns) + '\n').encode()
+                stored = [pd.read_csv(io.BytesIO(header + blob), dtype=str, keep_default_na=False, na_values=[''])
+                          for blob in self.blobs['csv'][merge:]]
+                df = pd.concat(stored + [df], ignore_index=True).astype(object)
+                df = df.where(df.notnull(), None)
+                order = np.lexsort([df['collision_id'].astype('int64').values, df['crash_date'].values.astype('S')])
+                df = df.iloc[order].reset_index(drop=True)
+                for values in [self.blobs['json'], self.blobs['csv'], self.offsets['json'], self.offsets['csv'],
+                               self.dates, self.ids]:
+                    del values[merge:]
+            encoded = {'json': encode_rows(df), 'csv': encode_csv_rows(df)}
+            for fmt, (blob, offsets) in encoded.items():
+                self.blobs[fmt].append(blob)
+                self.offsets[fmt].append(offsets)
+            self.dates.append(df['crash_date'].values.astype('S'))
+            self.ids.append(df['collision_id'].astype('int64').values)
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.ids)
+
+    def page(self, mark, offset, limit, fmt='json', descending=False):
+        """JSON (or CSV) of the rows after the high-water mark (skipping offset rows), at most limit.
+        mark: (crash_date, collision_id), or (crash_date, None) for the rows from crash_date on
+        descending: the rows newest first (the mark isn't applied)
+        """
+        with self.lock:
+            chunks = list(zip(self.blobs[fmt], self.offsets[fmt], self.dates, self.ids))
+        out = []
+        for blob, offsets, dates, ids in reversed(chunks) if descending else []:
+            n = len(ids)
+            stop = n - offset
+            offset = max(0, offset - n)
+            start = max(0, stop - limit)
+            if start < stop:
+                out.extend(blob[offsets[i]:offsets[i + 1]] for i in range(stop - 1, start - 1, -1))
+                limit -= stop - start
+            if limit <= 0:
+                break
+        for blob, offsets, dates, ids in chunks if not descending else []:
+            n = len(ids)
+            start = 0
+            if mark is not None:
+                date = mark[0].encode()
+                lo, hi = np.searchsorted(dates, date, 'left'), np.searchsorted(dates, date, 'right')
+                start = lo + np.searchsorted(ids[lo:hi], mark[1], 'right') if lo < hi and mark[1] is not None else lo
+            start += offset
+            offset = max(0, start - n)
+            stop = min(n, start + limit)
+            if start < stop:
+                out.append(blob[offsets[start]:offsets[stop]])
+                limit -= stop - start
+            if limit <= 0:
+                break
+        body = b''.join(out)
+        if fmt == 'csv':
+            return (','.join('"%s"' % col for col in self.columns or []) + '\n').encode() + body
+        return b'[' + body[:-1] + b']' if body else b'[]'
+
+    def handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                with mock.lock:
+                    mock.requests += 1
+                    fail = mock.fail_every and mock.requests % mock.fail_every == 0
+                if mock.latency:
+                    time.sleep(mock.latency)
+                fmt = url.path.rsplit('.', 1)[-1]
+                if url.path not in ('/resource/%s.json' % mock.resource, '/resource/%s.csv' % mock.resource) or fail:
+                    self.send_response(404 if not fail else 503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                where = WHERE_PATTERN.match(query.get('$where', ''))
+                since = SINCE_PATTERN.match(query.get('$where', ''))
+                mark = (where.group(1), int(where.group(2))) if where else (since.group(1), None) if since else None
+                body = mock.page(mark, int(query.get('$offset', 0)), int(query.get('$limit', 1000)), fmt,
+                                 descending='DESC' in query.get('$order', '').upper())
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv' if fmt == 'csv' else 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%i/resource/%s.csv' % (self.server.server_address[1], self.resource)
+
+    @property
+    def json_url(self):
+        return self.url[:-len('.csv')] + '.json'
+
+    def start(self):
+        self.server = QuietServer(('127.0.0.1', 0), self.handler())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,87 @@
+"""Synthetic datasets for the benchmarks, at any number of rows.
+
+make_listings samples rows of the preprocessed GT dataset (GT/Scrape_Sale.parquet) and jitters the
+coordinates, surface and prices, so the distribution of Tipo/City/Zone/Bedrooms matches the real data.
+make_collisions generates NYC collisions as returned by the NYC Open Data API.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+GT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'GT')
+sys.path.insert(0, GT_DIR)
+import gt_data  # noqa: E402
+
+
+def make_listings(nrows, seed=0, columns=gt_data.APP_COLUMNS):
+    """Listings with the columns (and compact dtypes) of GT/Scrape_Sale.parquet."""
+    rng = np.random.RandomState(seed)
+    source = gt_data.load_dataset(gt_data.DATA_PATH, columns=columns)
+    df = source.iloc[rng.randint(0, len(source), nrows)].reset_index(drop=True)
+    if 'latitude' in df:
+        df['latitude'] += rng.normal(0, 0.002, nrows).astype('float32')
+        df['longitude'] += rng.normal(0, 0.002, nrows).astype('float32')
+    if 'Surface' in df:
+        scale = rng.uniform(0.9, 1.1, nrows)
+        df['Surface'] = (df['Surface'] * scale).round()
+        if 'Price_USD' in df:
+            df['Price_USD'] = (df['Price_USD'] * scale * rng.uniform(0.95, 1.05, nrows)).round()
+            if 'Price_m2_USD' in df:
+                df['Price_m2_USD'] = df['Price_USD'] / df['Surface']
+    return df
+
+
+# Boroughs with approximate centers and spread (degrees), used for the synthetic collisions
+BOROUGHS = {'BROOKLYN': (40.65, -73.95, 0.04), 'QUEENS': (40.72, -73.82, 0.06), 'MANHATTAN': (40.78, -73.97, 0.03),
+            'BRONX': (40.84, -73.88, 0.03), 'STATEN ISLAND': (40.59, -74.13, 0.04)}
+STREETS = ['BROADWAY', 'ATLANTIC AVENUE', 'NORTHERN BOULEVARD', 'QUEENS BOULEVARD', 'FLATBUSH AVENUE',
+           'BELT PARKWAY', 'LONG ISLAND EXPRESSWAY', 'GRAND CENTRAL PKWY', '3 AVENUE', '2 AVENUE',
+           'LINDEN BOULEVARD', 'EASTERN PARKWAY', 'OCEAN PARKWAY', 'BRUCKNER BOULEVARD', 'FDR DRIVE',
+           'MAJOR DEANS EXPRESSWAY', 'HYLAN BOULEVARD', 'JAMAICA AVENUE', 'FOSTER AVENUE', 'KINGS HIGHWAY']
+
+FACTORS = ['Unspecified', 'Driver Inattention/Distraction', 'Failure to Yield Right-of-Way', 'Following Too Closely',
+           'Backing Unsafely', 'Passing or Lane Usage Improper', 'Unsafe Speed', 'Traffic Control Disregarded']
+VEHICLES = ['Sedan', 'Station Wagon/Sport Utility Vehicle', 'Taxi', 'Pick-up Truck', 'Box Truck', 'Bus', 'Bike']
+
+
+def make_collisions(nrows, seed=0, start_id=4000000, start_date='2019-01-01', days=3*365):
+    """Collisions in the raw format of the NYC Open Data API (dataset h9gi-nx95): every value is a
+    string and missing values are None, as in pd.DataFrame.from_records of the API results.
+    Rows are ordered by crash_date (days from start_date on), collision_id increases with the row.
+    """
+    rng = np.random.RandomState(seed)
+    names = list(BOROUGHS)
+    borough = rng.randint(0, len(names), nrows)
+    centers = np.array([BOROUGHS[name] for name in names])[borough]
+    lat = centers[:, 0] + rng.normal(0, 1, nrows) * centers[:, 2]
+    lon = centers[:, 1] + rng.normal(0, 1, nrows) * centers[:, 2]
+    located = rng.rand(nrows) > 0.08
+    minutes = rng.randint(0, 24*60, nrows)
+    offsets = np.sort(rng.randint(0, days, nrows))
+    streets = np.array(STREETS + ['%i STREET' % i for i in range(1, 200)], dtype=object)
+    df = pd.DataFrame({
+        'crash_date': (np.datetime64(start_date) + offsets.astype('timedelta64[D]')).astype(str).astype(object) + 'T00:00:00.000',
+        'crash_time': pd.Series(minutes // 60).astype(str) + ':' + pd.Series(minutes % 60).astype(str).str.zfill(2),
+        'borough': np.array(names, dtype=object)[borough],
+        'latitude': np.where(located, np.round(lat, 6).astype(str), None),
+        'longitude': np.where(located, np.round(lon, 6).astype(str), None),
+        'on_street_name': np.where(rng.rand(nrows) > 0.25, streets[rng.zipf(1.6, nrows) % len(streets)], None),
+    })
+    victims = {'pedestrians': 0.05, 'cyclist': 0.03, 'motorist': 0.2}
+    injured = {victim: rng.binomial(3, p, nrows) for victim, p in victims.items()}
+    df['number_of_persons_injured'] = sum(injured.values()).astype(str)
+    df['number_of_persons_killed'] = '0'
+    for victim in victims:
+        df['number_of_%s_injured' % victim] = injured[victim].astype(str)
+        df['number_of_%s_killed' % victim] = '0'
+    df['collision_id'] = np.arange(start_id, start_id + nrows).astype(str)
+    # Some of the columns the dashboard doesn't use
+    df['zip_code'] = np.where(located, (10000 + rng.randint(0, 1500, nrows)).astype(str), None)
+    df['cross_street_name'] = np.where(rng.rand(nrows) > 0.4, streets[rng.randint(0, len(streets), nrows)], None)
+    df['off_street_name'] = np.where(rng.rand(nrows) > 0.8, streets[rng.randint(0, len(streets), nrows)], None)
+    for vehicle in ['1', '2']:
+        df['contributing_factor_vehicle_' + vehicle] = np.array(FACTORS, dtype=object)[rng.randint(0, len(FACTORS), nrows)]
+        df['vehicle_type_code' + vehicle] = np.array(VEHICLES, dtype=object)[rng.randint(0, len(VEHICLES), nrows)]
+    return df
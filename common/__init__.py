@@ -0,0 +1 @@
+"""Modules shared by the GT and NYC apps. The apps put the root of the repository on sys.path to import them."""
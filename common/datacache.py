@@ -0,0 +1,170 @@
+"""Host-wide, read-only data cache for the dashboards (replaces st.cache).
+
+Datasets are keyed by name and data version (e.g. the mtime of the source file), not by hashing
+their content. The first process on the host that needs a version builds it and writes it as an
+uncompressed Arrow IPC file in a shared directory (/dev/shm when there is one). Every process then
+memory maps that file, so the numeric columns of all the sessions and workers point to the same
+pages: memory stays near 1x the dataset instead of one copy per worker. The frames are read-only,
+writing to them raises.
+
+Views derived from a dataset (indexes, aggregates, ...) are kept per process in an LRU bounded by
+size, the memory of the datasets they point to isn't counted.
+
+    cache = shared_cache()
+    data = cache.dataset('gt_listings', version, build_frame)
+    index = cache.view('gt_index', version, lambda: ListingIndex(data))
+    cache.stats()  # hits, misses, evictions, bytes
+
+Settings (environment): DATA_CACHE_DIR (directory of the shared files), DATA_CACHE_VIEWS_MB (size
+of the view LRU, 256 MB by default).
+"""
+import glob
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from common.tracing import stage
+
+try:
+    import fcntl
+except ImportError:  # Windows, builds aren't serialized across processes
+    fcntl = None
+
+
+def default_dir():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+    return os.environ.get('DATA_CACHE_DIR', os.path.join(base, 'webapps-data-cache'))
+
+
+def version_key(*parts):
+    """Short, file name safe key for a data version made of several parts (paths, mtimes, # of rows...)."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+def estimate_size(obj, skip_ids=(), seen=None):
+    """Approximate memory of an object in bytes: frames, arrays and the attributes/items of
+    containers and plain objects, without the objects in skip_ids (or counting anything twice).
+    Objects that hold memory it can't see (e.g. KD-trees) report it in an nbytes attribute.
+    """
+    seen = set(skip_ids) if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes if obj.base is None else 0
+    if isinstance(getattr(obj, 'nbytes', None), int):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_size(k, skip_ids, seen) + estimate_size(v, skip_ids, seen)
+                                        for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(estimate_size(item, skip_ids, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        return sys.getsizeof(obj) + estimate_size(vars(obj), skip_ids, seen)
+    return sys.getsizeof(obj)
+
+
+class DataCache:
+    def __init__(self, directory=None, max_view_bytes=None):
+        self.directory = directory or default_dir()
+        if max_view_bytes is None:
+            max_view_bytes = int(float(os.environ.get('DATA_CACHE_VIEWS_MB', 256)) * 2**20)
+        self.max_view_bytes = max_view_bytes
+        self.datasets = {}
+        self.views = OrderedDict()  # key -> (view, size), least recently used first
+        self.view_bytes = 0
+        self.counters = {'dataset_hits': 0, 'dataset_loads': 0, 'dataset_builds': 0,
+                         'view_hits': 0, 'view_misses': 0, 'view_evictions': 0}
+        self.lock = threading.RLock()
+
+    def path(self, name, version):
+        return os.path.join(self.directory, '%s-%s.arrow' % (name, version))
+
+    def dataset(self, name, version, build):
+        """The dataset name at version, built with build() (a dataframe) by the first process that needs it."""
+        key = (name, version)
+        with self.lock:
+            if key in self.datasets:
+                self.counters['dataset_hits'] += 1
+                return self.datasets[key]
+            path = self.path(name, version)
+            with stage('dataset ' + name):
+                if not os.path.exists(path):
+                    self._build(name, version, build)
+                else:
+                    self.counters['dataset_loads'] += 1
+                df = feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+            # Older versions of the dataset aren't needed by this process anymore
+            for old in [k for k in self.datasets if k[0] == name]:
+                del self.datasets[old]
+            self.datasets[key] = df
+            return df
+
+    def _build(self, name, version, build):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(name, version)
+        with open(os.path.join(self.directory, name + '.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # Another process may be building the same version
+            if os.path.exists(path):
+                self.counters['dataset_loads'] += 1
+                return
+            self.counters['dataset_builds'] += 1
+            table = pa.Table.from_pandas(build(), preserve_index=False)
+            # A single record batch: columns in several chunks would be concatenated (copied) by to_pandas
+            feather.write_feather(table, path + '.tmp', compression='uncompressed', chunksize=max(table.num_rows, 1))
+            os.replace(path + '.tmp', path)
+            # Older versions: processes that still map them keep their pages until they unmap them
+            for old in glob.glob(os.path.join(self.directory, '%s-*.arrow' % name)):
+                if old != path:
+                    os.remove(old)
+
+    def view(self, name, version, build, size=None):
+        """The view name at version (built with build() on a miss), from the LRU of this process."""
+        key = (name, version)
+        with self.lock:
+            if key in self.views:
+                self.counters['view_hits'] += 1
+                self.views.move_to_end(key)
+                return self.views[key][0]
+            self.counters['view_misses'] += 1
+            with stage('view ' + name):
+                view = build()
+            if size is None:
+                size = estimate_size(view, skip_ids=[id(df) for df in self.datasets.values()])
+            self.views[key] = (view, size)
+            self.view_bytes += size
+            # Evict the least recently used views, the one just built stays even if it's bigger than the limit
+            while self.view_bytes > self.max_view_bytes and len(self.views) > 1:
+                _, (_, evicted) = self.views.popitem(last=False)
+                self.view_bytes -= evicted
+                self.counters['view_evictions'] += 1
+            return view
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, datasets=len(self.datasets), views=len(self.views), view_bytes=self.view_bytes,
+                        max_view_bytes=self.max_view_bytes)
+
+
+_shared = None
+
+
+def shared_cache():
+    """The cache of this process (module state survives the reruns of the Streamlit scripts)."""
+    global _shared
+    if _shared is None:
+        _shared = DataCache()
+    return _shared
@@ -0,0 +1,84 @@
+"""Server-side hexagonal binning for the 3D maps.
+
+pydeck's HexagonLayer sends every point to the browser and bins them there. Instead, the points are
+binned here with NumPy and only the cells (center and count) are sent, drawn with a ColumnLayer of
+hexagonal columns that look like the HexagonLayer ones:
+
+    cells = hex_cells(data['latitude'], data['longitude'], radius=100)
+    pdk.Layer("ColumnLayer", **column_layer_props(cells, radius=100, elevation_range=[0, 1000]))
+
+The grid is made of flat-top hexagons with the given radius (center to corner, in meters), laid over
+a local equirectangular projection of the coordinates, which is accurate at city scale.
+"""
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS = 6371008.8
+# Default colorRange of deck.gl's HexagonLayer (ColorBrewer YlOrRd, 6 classes)
+COLOR_RANGE = [[255, 255, 178], [254, 217, 118], [254, 178, 76], [253, 141, 60], [240, 59, 32], [189, 0, 38]]
+
+
+def hex_cells(latitude, longitude, radius, weights=None, origin=None):
+    """Bins the points in hexagons.
+    in:  latitudes, longitudes, hexagon radius in meters, optional weight of each point,
+         optional (latitude, longitude) of the projection origin (defaults to the mean of the points)
+    out: dataframe with the latitude and longitude of the center and the count of each non-empty cell,
+         plus the sum and mean of the weights if given
+    """
+    lat = np.asarray(latitude, dtype='float64')
+    lon = np.asarray(longitude, dtype='float64')
+    columns = ['latitude', 'longitude', 'count'] + (['weight_sum', 'weight_mean'] if weights is not None else [])
+    if len(lat) == 0:
+        return pd.DataFrame(columns=columns)
+    lat0, lon0 = origin if origin is not None else (lat.mean(), lon.mean())
+    meters = np.pi / 180 * EARTH_RADIUS
+    scale_x = meters * np.cos(np.radians(lat0))
+    x = (lon - lon0) * scale_x
+    y = (lat - lat0) * meters
+
+    # Axial coordinates of flat-top hexagons, rounded to the nearest hexagon in cube coordinates
+    q = 2/3 * x / radius
+    r = (-x/3 + np.sqrt(3)/3 * y) / radius
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+
+    # One integer key per cell
+    keys, inverse = np.unique(rq.astype('int64') * 2**32 + rr.astype('int64'), return_inverse=True)
+    cell_q = (keys + 2**31) // 2**32
+    cell_r = keys - cell_q * 2**32
+    counts = np.bincount(inverse)
+
+    # Centers rounded to 6 decimals (~0.1 m), it keeps the JSON sent to the browser short
+    cells = pd.DataFrame({
+        'latitude': np.round(lat0 + radius * np.sqrt(3) * (cell_r + cell_q/2) / meters, 6),
+        'longitude': np.round(lon0 + radius * 1.5 * cell_q / scale_x, 6),
+        'count': counts,
+    }, columns=columns[:3])
+    if weights is not None:
+        cells['weight_sum'] = np.bincount(inverse, np.asarray(weights, dtype='float64'))
+        cells['weight_mean'] = cells['weight_sum'] / counts
+    return cells
+
+
+def column_layer_props(cells, radius, elevation_range, value='count', color_range=COLOR_RANGE):
+    """ColumnLayer properties that draw each cell as a hexagonal column of the binning radius, with the
+    elevation and color scaled like the HexagonLayer does: elevation linear from the [min, max] of the
+    values to elevation_range, color quantized over the same domain. Both are sent as expressions over
+    the value of the cell, so the data is only the centers and the values.
+    """
+    values = cells[value].values.astype('float64')
+    lo, hi = (values.min(), values.max()) if len(values) else (0, 1)
+    span = hi - lo if hi > lo else 1
+    slope = (elevation_range[1] - elevation_range[0]) / span
+    elevation = '%.6g + (%s - %.6g) * %.6g' % (elevation_range[0], value, lo, slope)
+    # value < threshold 1 ? color 0 : value < threshold 2 ? color 1 : ... : last color
+    color = str(list(color_range[-1]))
+    for i in range(len(color_range) - 1, 0, -1):
+        color = '%s < %.6g ? %s : %s' % (value, lo + span * i / len(color_range), list(color_range[i - 1]), color)
+    return dict(data=cells, get_position=['longitude', 'latitude'], get_elevation=elevation, get_fill_color=color,
+                radius=radius, disk_resolution=6, extruded=True)
@@ -0,0 +1,199 @@
+"""Opt-in timing of the reruns of the dashboards, by section and by data stage.
+
+The scripts mark where each section starts, the data code wraps its stages (the builds of the data
+cache are stages already):
+
+    rerun = start_rerun('gt')
+    rerun.section('zone')
+    ...
+    with stage('fit_lines'):
+        ...
+    rerun.finish()
+
+Every finished rerun becomes a trace with the time and the RSS growth of each section and stage.
+Unless APP_TRACE is set (to anything but 0) start_rerun returns a rerun whose methods do nothing
+and stage a shared empty context manager, so the marks cost a method call.
+
+Settings (environment):
+  APP_TRACE              enables the traces
+  APP_TRACE_LOG          file the traces are appended to as JSON lines (default: the 'apptrace' logger, stderr)
+  APP_TRACE_PROM         file rewritten after every rerun with the totals in the Prometheus text format
+                         (e.g. for the textfile collector of node_exporter)
+  APP_TRACE_PROFILE_DIR  directory where the cProfile stats of the slowest reruns are kept
+  APP_TRACE_PROFILE_KEEP # of slowest reruns kept (5 by default)
+"""
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+
+ENABLED = os.environ.get('APP_TRACE', '0') not in ('', '0')
+LOG_PATH = os.environ.get('APP_TRACE_LOG')
+PROM_PATH = os.environ.get('APP_TRACE_PROM')
+PROFILE_DIR = os.environ.get('APP_TRACE_PROFILE_DIR')
+PROFILE_KEEP = int(os.environ.get('APP_TRACE_PROFILE_KEEP', 5))
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+logger = logging.getLogger('apptrace')
+
+
+def rss_bytes():
+    """Resident memory of the process (0 where /proc isn't available)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return 0
+
+
+class NullRerun:
+    def section(self, name):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_RERUN = NullRerun()
+NULL_STAGE = contextlib.nullcontext()
+_local = threading.local()  # the rerun of each script thread (a thread per session)
+
+
+class Rerun:
+    def __init__(self, app):
+        self.app = app
+        self.sections, self.stages = [], []
+        self.profile = cProfile.Profile() if PROFILE_DIR else None
+        if self.profile is not None:
+            self.profile.enable()
+        self.start = time.perf_counter()
+        self.current = None
+        self.section('start')
+
+    def section(self, name):
+        """Ends the current section and starts the next one (None: just ends it)."""
+        now, rss = time.perf_counter(), rss_bytes()
+        if self.current is not None:
+            previous, start, start_rss = self.current
+            self.sections.append({'name': previous, 'ms': (now - start) * 1000, 'rss_mb': (rss - start_rss) / 2**20})
+        self.current = (name, now, rss) if name is not None else None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start, start_rss = time.perf_counter(), rss_bytes()
+        try:
+            yield
+        finally:
+            self.stages.append({'name': name, 'ms': (time.perf_counter() - start) * 1000,
+                                'rss_mb': (rss_bytes() - start_rss) / 2**20})
+
+    def finish(self, complete=True):
+        self.section(None)
+        if self.profile is not None:
+            self.profile.disable()
+        if getattr(_local, 'rerun', None) is self:
+            _local.rerun = None
+        trace = {'app': self.app, 'time': time.time(), 'complete': complete,
+                 'ms': (time.perf_counter() - self.start) * 1000, 'rss_mb': rss_bytes() / 2**20,
+                 'sections': self.sections, 'stages': self.stages}
+        emit(trace, self.profile)
+        return trace
+
+
+def start_rerun(app):
+    """Starts the trace of a rerun of the app in this thread (a rerun that didn't finish is emitted as incomplete)."""
+    if not ENABLED:
+        return NULL_RERUN
+    previous = getattr(_local, 'rerun', None)
+    if previous is not None:
+        previous.finish(complete=False)
+    _local.rerun = Rerun(app)
+    return _local.rerun
+
+
+def stage(name):
+    """Context manager timing a stage of the current rerun (if it's traced)."""
+    rerun = getattr(_local, 'rerun', None) if ENABLED else None
+    return rerun.stage(name) if rerun is not None else NULL_STAGE
+
+
+class Totals:
+    """Counts and sums of the traces of the process, written in the Prometheus text format."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reruns = {}  # app -> [count, seconds]
+        self.parts = {}  # (kind, app, name) -> [count, seconds]
+        self.rss = 0
+
+    def add(self, trace):
+        with self.lock:
+            totals = self.reruns.setdefault(trace['app'], [0, 0.0])
+            totals[0] += 1
+            totals[1] += trace['ms'] / 1000
+            for kind in ('sections', 'stages'):
+                for part in trace[kind]:
+                    totals = self.parts.setdefault((kind[:-1], trace['app'], part['name']), [0, 0.0])
+                    totals[0] += 1
+                    totals[1] += part['ms'] / 1000
+            self.rss = trace['rss_mb'] * 2**20
+
+    def text(self):
+        with self.lock:
+            lines = ['# TYPE app_rerun_seconds summary']
+            for app, (count, seconds) in sorted(self.reruns.items()):
+                lines += ['app_rerun_seconds_sum{app="%s"} %f' % (app, seconds),
+                          'app_rerun_seconds_count{app="%s"} %i' % (app, count)]
+            for kind in ('section', 'stage'):
+                lines.append('# TYPE app_%s_seconds summary' % kind)
+                for (part_kind, app, name), (count, seconds) in sorted(self.parts.items()):
+                    if part_kind == kind:
+                        labels = 'app="%s",%s="%s"' % (app, kind, name.replace('\\', '\\\\').replace('"', '\\"'))
+                        lines += ['app_%s_seconds_sum{%s} %f' % (kind, labels, seconds),
+                                  'app_%s_seconds_count{%s} %i' % (kind, labels, count)]
+            lines += ['# TYPE app_resident_memory_bytes gauge', 'app_resident_memory_bytes %i' % self.rss]
+            return '\n'.join(lines) + '\n'
+
+
+totals = Totals()
+_slowest = []  # (ms, path) of the profiles kept, slowest first
+_write_lock = threading.Lock()
+
+
+def prometheus_text():
+    return totals.text()
+
+
+def keep_profile(trace, profile):
+    """Saves the profile if the rerun is one of the PROFILE_KEEP slowest so far, and drops the one it replaces."""
+    if len(_slowest) >= PROFILE_KEEP and trace['ms'] <= _slowest[-1][0]:
+        return
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, '%s-%i-%ims.prof' % (trace['app'], trace['time'] * 1000, trace['ms']))
+    profile.dump_stats(path)
+    _slowest.append((trace['ms'], path))
+    _slowest.sort(reverse=True)
+    for _, dropped in _slowest[PROFILE_KEEP:]:
+        os.remove(dropped)
+    del _slowest[PROFILE_KEEP:]
+
+
+def emit(trace, profile=None):
+    """Logs the trace, adds it to the totals (and rewrites APP_TRACE_PROM) and keeps the profile if it's slow."""
+    totals.add(trace)
+    with _write_lock:  # the sessions finish their reruns in their own threads
+        if not logger.handlers:
+            handler = logging.FileHandler(LOG_PATH) if LOG_PATH else logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        logger.info(json.dumps(trace))
+        if PROM_PATH:
+            with open(PROM_PATH + '.tmp', 'w') as f:
+                f.write(totals.text())
+            os.replace(PROM_PATH + '.tmp', PROM_PATH)
+        if profile is not None:
+            keep_profile(trace, profile)